@@ -1,6 +1,7 @@
 
 import dash
 from dash import html, dcc
+from dashboard.utils.loader import import_results_at_startup
 
 # Initialisation
 app = dash.Dash(__name__, use_pages=True,suppress_callback_exceptions=True)
@@ -26,4 +27,8 @@ app.layout = html.Div([
 ])
 
 if __name__ == '__main__':
+    # Une seule fois au démarrage : les callbacks ne font que lire le results store.
+    # Servi par plusieurs workers (gunicorn dashboard.app:server), lancer plutôt
+    # python -m src.benchmarks.results_store avant le démarrage.
+    import_results_at_startup()
     app.run(debug=True)
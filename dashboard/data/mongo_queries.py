@@ -3,16 +3,30 @@ from pymongo import MongoClient
 import pandas as pd
 import json
 
+# Couche de mapping de src/ : lancer depuis la racine du dépôt (python -m dashboard.data.mongo_queries)
+from src.storage_layouts import get_layout
+from src.rollups import ROLLUP_PIPELINES, rollup_collection_name
+
 client = MongoClient("mongodb://localhost:27017")
 db = client["trips_db"]
 col = db["fhvhv_trips_2021-10"]
 
+# Layout de stockage de la collection : "flat", "timeseries" ou "compact"
+COLLECTION_LAYOUT = "flat"
+layout = get_layout(COLLECTION_LAYOUT)
+
+# Lire les collections de rollup maintenues à l'import au lieu de scanner tous les trips
+USE_ROLLUPS = False
+
 date_today = date.today()
 
 
-def aggregate_to_json(pipeline, output_file, batch_size=100000):
+def aggregate_to_json(pipeline, output_file, batch_size=100000, source=None):
     """Helper function to aggregate and save to JSON file in batches"""
-    cursor = col.aggregate(pipeline, allowDiskUse=True) 
+    if source is None:
+        cursor = col.aggregate(layout["translate_pipeline"](pipeline), allowDiskUse=True)
+    else:
+        cursor = source.aggregate(pipeline, allowDiskUse=True)
     count = 0
     with open(output_file, "w", encoding="utf-8") as f:
         f.write("[\n") 
@@ -48,7 +62,7 @@ def get_average_trip_distance():
     pipeline = [
         {"$group": {"_id": None, "avgDistance": {"$avg": "$trip_miles"}}}
     ]
-    result = list(col.aggregate(pipeline))
+    result = list(col.aggregate(layout["translate_pipeline"](pipeline)))
     return result[0]["avgDistance"] if result else 0
 
 def get_average_trip_time():
@@ -56,16 +70,16 @@ def get_average_trip_time():
     pipeline = [
         {"$group": {"_id": None, "avgTime": {"$avg": "$trip_time"}}}
     ]
-    result = list(col.aggregate(pipeline))
+    result = list(col.aggregate(layout["translate_pipeline"](pipeline)))
     return result[0]["avgTime"] if result else 0
 
 def get_company_count():
     """Return the number of unique companies."""
-    return len(col.distinct("hvfhs_license_num"))
+    return len(col.distinct(layout["translate_field"]("hvfhs_license_num")))
 
 def cet_company_num():
     """Return the name of the company ."""
-    return col.distinct("hvfhs_license_num")
+    return col.distinct(layout["translate_field"]("hvfhs_license_num"))
 
 ###### DataFrames for visualizations ######
 get_trips_per_day_by_company = [
@@ -88,7 +102,6 @@ get_trips_per_day_by_company = [
         },
         {"$sort": {"Date": 1, "Company": 1}}
     ]
-aggregate_to_json(get_trips_per_day_by_company, f"dashboard/data/historical_data_json/trips_per_day_by_company_{date_today}.json")
 
 """total trip distance per day."""
 get_trips_distance_total_by_day = [
@@ -108,7 +121,6 @@ get_trips_distance_total_by_day = [
         },
         {"$sort": {"Date": 1}}
     ]
-aggregate_to_json(get_trips_distance_total_by_day, f"dashboard/data/historical_data_json/trips_distance_total_by_day_{date_today}.json")
 
 """ total trip distance and time per company.""" 
 get_trips_distance_time_by_company = [
@@ -129,7 +141,6 @@ get_trips_distance_time_by_company = [
         },
         {"$sort": {"Company": 1}}
     ]  
-aggregate_to_json(get_trips_distance_time_by_company, f"dashboard/data/historical_data_json/trips_distance_time_by_company_{date_today}.json")  
 
 """total profit per company."""
 total_profit_by_company = [
@@ -165,14 +176,12 @@ total_profit_by_company = [
         { "$sort": { "total_profit": -1 } }
     ]
 
-aggregate_to_json(total_profit_by_company, f"dashboard/data/historical_data_json/total_profit_by_company_{date_today}.json")
 
 """ total profit per company."""
 Average_Price_driver_company = [
     {"$group" : {"_id": "$hvfhs_license_num" , "AvgDriverPay": {"$avg" : "$driver_pay"}}}
 ]
 
-aggregate_to_json(Average_Price_driver_company, f"dashboard/data/historical_data_json/Average_Price_driver_company_{date_today}.json")
 
 """pickup and dropoff location IDs for all trips."""
 get_trips_locations = [
@@ -200,7 +209,26 @@ get_trips_locations = [
         }
     }
 ]
-aggregate_to_json(get_trips_locations, f"dashboard/data/historical_data_json/trips_locations_{date_today}.json")
+
+# Pipelines du dashboard, indexés par le préfixe du fichier JSON historique
+DASHBOARD_PIPELINES = {
+    "trips_per_day_by_company": get_trips_per_day_by_company,
+    "trips_distance_total_by_day": get_trips_distance_total_by_day,
+    "trips_distance_time_by_company": get_trips_distance_time_by_company,
+    "total_profit_by_company": total_profit_by_company,
+    "Average_Price_driver_company": Average_Price_driver_company,
+    "trips_locations": get_trips_locations,
+}
+
+def export_historical_data():
+    """Run every dashboard pipeline and save its result in historical_data_json."""
+    for name, pipeline in DASHBOARD_PIPELINES.items():
+        output_file = f"dashboard/data/historical_data_json/{name}_{date_today}.json"
+        if USE_ROLLUPS:
+            rollup, rollup_pipeline = ROLLUP_PIPELINES[name]
+            aggregate_to_json(rollup_pipeline, output_file, source=db[rollup_collection_name(col.name, rollup)])
+        else:
+            aggregate_to_json(pipeline, output_file)
 
 def load_json_data():
     total_trips = get_total_trips()
@@ -239,4 +267,5 @@ def load_json_data():
     #     json.dump(data_visualisation, f, ensure_ascii=False, indent=4)
 
 if __name__ == "__main__":
+    export_historical_data()
     load_json_data()
\ No newline at end of file
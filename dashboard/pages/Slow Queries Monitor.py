@@ -1,7 +1,7 @@
 import dash
 from dash import html, dcc, dash_table, Input, Output, State, ctx
-from utils.loader import load_benchmark,load_latest_benchmark
-from utils.charts import make_comparison_bar,make_query_card, make_kpi_card,build_double_donut_chart,build_bar_chart
+from dashboard.utils.loader import load_benchmark,load_latest_benchmark
+from dashboard.utils.charts import make_comparison_bar,make_query_card, make_kpi_card,build_double_donut_chart,build_bar_chart
 import json
 from dash_svg import Svg, Line, Polygon
 import os
@@ -3,6 +3,7 @@ import pandas as pd
 import json
 import os
 import re
+from src.benchmarks.results_store import import_json_results, latest_result
 
 # -- CORRECTION: Gestion des chemins absolus --
 # On récupère le dossier où se trouve loader.py (dashboard/utils)
@@ -42,8 +43,30 @@ def get_file(input_value):
         data = load_benchmark('../results/benchmarking/simple_index_2025-11-30_15-25-32.json')
     return data
    
+def import_results_at_startup():
+    """Import the JSON results not yet in the store, once, before the dashboard serves requests."""
+    try:
+        print(f"Imported {import_json_results()} result files into the results store")
+    except Exception as e:
+        print(f"Results store import failed: {e}")
+
+def load_latest_from_store(index_type):
+    """Latest result file from the SQLite results store (lecture seule, appelée par les callbacks)."""
+    try:
+        latest = latest_result(index_type)
+    except Exception as e:
+        print(f"Results store unavailable, falling back to results/benchmarking: {e}")
+        return None
+    if latest and latest[0] and os.path.exists(latest[0]):
+        return latest[0]
+    return None
+
 def load_latest_benchmark(index_type):
     print("Loading latest benchmark for index type:", index_type)
+    latest_file = load_latest_from_store(index_type)
+    if latest_file:
+        return latest_file, None
+
     folder = os.path.abspath(
         os.path.join(os.path.dirname(__file__), "..", "..", "results", "benchmarking")
     )
@@ -0,0 +1,154 @@
+"""
+Aggregation Pipeline Benchmarking
+---------------------------------
+
+Les requêtes les plus lourdes en production sont les pipelines $group du
+dashboard (dashboard/data/mongo_queries.py). Ce script :
+1. Charge DASHBOARD_PIPELINES et leur associe un index de support candidat
+2. Mesure l'explain("executionStats") BEFORE (index concurrents masqués ou $natural)
+   → temps par stage, débordement sur disque (usedDisk / spills), plan gagnant
+3. Rend l'index utilisable (démasqué ou créé) et le force avec hint()
+4. Mesure l'explain AFTER
+5. Sauvegarde before/after au même format que les requêtes find (results/benchmarking)
+   + le détail par stage dans results/aggregation
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+from src.logger import logger
+from src.benchmarks.benchmarks_app import (
+    BEFORE_MODE, CACHE_MODE, KEEP_CREATED_INDEXES, MEASURE_INDEX_COSTS, MEASURED_RUNS, WARMUP_RUNS,
+    benchmark_query, collection, db, ensure_index, hide_conflicting_indexes, restore_indexes,
+    save_metrics, snapshot_indexes, unhide,
+)
+from src.benchmarks.index_costs import insert_rate, load_replay_batch, measure_index_cost, scratch_name
+from src.benchmarks.results_store import start_run
+from src.storage_layouts import get_layout
+from dashboard.data.mongo_queries import DASHBOARD_PIPELINES
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "aggregation"))
+
+# Index de support par pipeline : clé de $group en tête, puis tous les champs lus
+# par le pipeline, pour que le plan forcé soit couvert (pas de FETCH). Un seul champ
+# manquant suffit à relire chaque document : l'index ne sert alors qu'à l'ordre du $group.
+PROFIT_FIELDS = ("base_passenger_fare", "tolls", "bcf", "sales_tax", "congestion_surcharge",
+                 "airport_fee", "tips", "driver_pay")
+SUPPORTING_INDEXES = {
+    "trips_per_day_by_company": {"pickup_datetime": 1, "hvfhs_license_num": 1},
+    "trips_distance_total_by_day": {"pickup_datetime": 1, "trip_miles": 1},
+    "trips_distance_time_by_company": {"hvfhs_license_num": 1, "trip_miles": 1, "trip_time": 1},
+    # 9 champs : couvrant, mais presque aussi gros que les données lues ; taille et
+    # pénalité d'insert relevées par measure_index_cost pour juger si le gain vaut le coût
+    "total_profit_by_company": {"hvfhs_license_num": 1, **{field: 1 for field in PROFIT_FIELDS}},
+    "Average_Price_driver_company": {"hvfhs_license_num": 1, "driver_pay": 1},
+    "trips_locations": {"PULocationID": 1, "DOLocationID": 1},
+}
+
+
+def aggregation_candidates(pipelines=DASHBOARD_PIPELINES, indexes=SUPPORTING_INDEXES, layout="flat"):
+    """Dashboard pipelines as benchmark candidates ({"name", "pipeline", "index"})."""
+    translate = get_layout(layout)["translate_pipeline"]
+    return [
+        {"name": f"agg_{name}", "pipeline": translate(pipeline), "index": indexes[name]}
+        for name, pipeline in pipelines.items()
+        if name in indexes
+    ]
+
+
+def stage_summary(result):
+    """Compact per-stage view of a benchmark_query result."""
+    return {
+        "executionTimeMillis": result["executionTimeMillis"],
+        "indexName": result["indexName"],
+        "planStages": result["planStages"],
+        "usedDisk": result.get("usedDisk"),
+        "cacheMode": result.get("cacheMode"),
+        "cache": result.get("cache"),
+        "stages": result.get("pipelineStages", []),
+    }
+
+
+def _log_stages(label, result):
+    logger.info(f"⏱ {label} = {result['executionTimeMillis']} ms (warm median), "
+                f"plan {result['planStages']}, usedDisk={result.get('usedDisk')}")
+    for stage in result.get("pipelineStages", []):
+        spill = f" spills={stage.get('spills')}" if stage.get("usedDisk") else ""
+        logger.info(f"    {stage['stage']:<24} {stage['selfMillis']} ms self, "
+                    f"{stage['nReturned']} docs{spill}")
+
+
+def run_aggregation_benchmark(candidates=None, coll=collection, warmup=WARMUP_RUNS, trials=MEASURED_RUNS,
+                              before_mode=BEFORE_MODE, keep_created=KEEP_CREATED_INDEXES,
+                              measure_costs=MEASURE_INDEX_COSTS, cache_mode=CACHE_MODE):
+    """Benchmark every dashboard pipeline before/after its supporting index."""
+    candidates = candidates if candidates is not None else aggregation_candidates()
+    logger.info(f"🚀 Benchmarking {len(candidates)} aggregation pipelines...")
+
+    snapshot = snapshot_indexes(coll)
+    created, report, replay = [], [], {}
+    run_id = start_run("aggregation", coll.database)
+    try:
+        for candidate in candidates:
+            name = candidate["name"]
+            index_param = candidate["index"]
+            logger.info(f"\n=== TEST {name} ===")
+
+            if before_mode == "hide":
+                hidden = hide_conflicting_indexes(index_param, coll)
+                before_candidate = candidate
+            else:
+                hidden = []
+                before_candidate = dict(candidate, hint={"$natural": 1})
+
+            before = benchmark_query(before_candidate, coll, warmup=warmup, trials=trials, cache_mode=cache_mode)
+            _log_stages("BEFORE", before)
+
+            index_name, was_created, build_seconds = ensure_index(index_param, coll)
+            if was_created:
+                created.append(index_name)
+
+            # Sans filtre ni tri, le planner garde le COLLSCAN : l'index de support est forcé
+            after = benchmark_query(dict(candidate, hint=index_param), coll, warmup=warmup, trials=trials,
+                                    cache_mode=cache_mode)
+            _log_stages("AFTER", after)
+
+            cost = None
+            if measure_costs:
+                if not replay:
+                    replay["docs"] = load_replay_batch(coll)
+                    replay["baseline"] = insert_rate(db, scratch_name(coll), replay["docs"])
+                cost = measure_index_cost(coll, index_param, index_name, build_seconds,
+                                          replay["docs"], replay["baseline"])
+
+            save_metrics(name, before, after, index_param, cost, run_id)
+            report.append({
+                "query_name": name,
+                "pipeline": candidate["pipeline"],
+                "index_param": index_param,
+                "before": stage_summary(before),
+                "after": stage_summary(after),
+            })
+            unhide(hidden, coll)
+    finally:
+        restore_indexes(snapshot, created, coll, keep_created=keep_created)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(RESULTS_DIR, f"aggregation_stages_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, default=str)
+
+    logger.info(f"✔ Saved per-stage aggregation report → {path}")
+    return report
+
+
+if __name__ == "__main__":
+    # python -m src.benchmarks.aggregation_benchmark [pipeline_name ...]
+    names = sys.argv[1:]
+    selected = [c for c in aggregation_candidates() if not names or c["name"][len("agg_"):] in names]
+    logger.info("===== STARTING AGGREGATION BENCHMARK =====")
+    run_aggregation_benchmark(selected)
+    logger.info("===== FINISHED =====")
@@ -4,21 +4,32 @@ Automatic Slow Query Detection & Index Benchmarking
 
 Ce script :
 1. Exécute 10 requêtes candidates
-2. Mesure l'explain() BEFORE index
+2. Mesure l'explain() BEFORE index (run cold + runs warm répétés, cf. stats.py),
+   dans un état de cache contrôlé (CACHE_MODE : default / warm / cold, cf. cache_state.py)
 3. Sauvegarde les temps d'exécution (execution_time.json)
-4. Si une requête est lente → crée un index adapté
+4. Si une requête est lente → utilise l'index adapté (démasqué, ou créé s'il manque)
 5. Mesure l'explain() AFTER index
-6. Sauvegarde metrics avant/après dans JSON
+6. Sauvegarde metrics avant/après dans JSON (+ coût de l'index : taille, build, inserts)
 7. Optimisé pour collections volumineuses
 
 Auteur : Optimisé par ChatGPT
 """
 
 from src.mongo_import import connect_to_mongo
+from bson import decode
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
 import json
+import time
 from datetime import datetime
 import os
+import sys
 from src.logger import logger
+from src.benchmarks.stats import summarize
+from src.benchmarks.index_costs import load_replay_batch, insert_rate, measure_index_cost, scratch_name, tradeoff
+from src.benchmarks.results_store import record_result, start_run
+from src.benchmarks.cache_state import cache_delta, cache_stats, forget_warm, prepare_cache
+from src.benchmarks.explain_utils import is_covered, plan_stages
 
 # -------------------------------------------------------------------
 # CONFIG
@@ -29,6 +40,19 @@ RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "benchm
 DB_NAME = "trips_db"
 COLLECTION_NAME = "fhvhv_trips_2021-10"
 
+# Essais par requête : le premier run (cold) est gardé à part,
+# WARMUP_RUNS runs sont ignorés, puis MEASURED_RUNS runs sont mesurés (warm)
+WARMUP_RUNS = 2
+MEASURED_RUNS = 10
+
+# Exécutions réelles côté client (curseur entièrement vidé) après les explain
+CLIENT_RUNS = 3
+# None = défaut du driver (101 documents puis lots de 16 Mo)
+DRAIN_BATCH_SIZE = None
+
+# État du cache avant chaque requête : "default", "warm" ou "cold" (cf. cache_state.py)
+CACHE_MODE = "default"
+
 db = connect_to_mongo(DB_NAME)
 collection = db[COLLECTION_NAME]
 
@@ -145,42 +169,276 @@ def detect_index_type(index_param):
 
 
 # -------------------------------------------------------------------
-# 3 — EXPLAIN OPTIMISÉ
+# 3 — EXPLAIN FIDÈLE AU CANDIDAT
 # -------------------------------------------------------------------
+# Options d'un candidat exécutées telles quelles (en plus de "query" ou "pipeline") :
+# sort, projection, limit, skip, hint, collation, maxTimeMS.
+# "index" n'est PAS un hint : c'est l'index à créer si la requête est lente.
+FIND_OPTIONS = ("sort", "projection", "limit", "skip", "hint", "collation", "maxTimeMS")
+AGGREGATE_OPTIONS = ("hint", "collation", "maxTimeMS")
+EXPLAIN_VERBOSITY = "executionStats"
+
+
+def _hint(hint):
+    # {"a": 1} ou [("a", 1)] -> document ; un nom d'index reste une chaîne
+    if isinstance(hint, (list, tuple)):
+        return dict(hint)
+    return hint
+
+
+def build_command(candidate, coll):
+    """Build the find / aggregate command that runs the candidate exactly as declared."""
+    if "pipeline" in candidate:
+        command = {"aggregate": coll.name, "pipeline": candidate["pipeline"], "cursor": {},
+                   "allowDiskUse": candidate.get("allowDiskUse", True)}
+        options = AGGREGATE_OPTIONS
+    else:
+        command = {"find": coll.name, "filter": candidate.get("query", {})}
+        options = FIND_OPTIONS
+    for option in options:
+        if candidate.get(option) is not None:
+            command[option] = _hint(candidate[option]) if option == "hint" else candidate[option]
+    return command
+
+
+def open_cursor(candidate, coll=collection, batch_size=None):
+    """Execute the candidate for real (same options as build_command) and return the cursor."""
+    if "pipeline" in candidate:
+        kwargs = {k: candidate[k] for k in AGGREGATE_OPTIONS if candidate.get(k) is not None}
+        if batch_size:
+            kwargs["batchSize"] = batch_size
+        return coll.aggregate(candidate["pipeline"], allowDiskUse=candidate.get("allowDiskUse", True), **kwargs)
+
+    cursor = coll.find(candidate.get("query", {}), candidate.get("projection"))
+    if candidate.get("sort"):
+        cursor = cursor.sort(list(candidate["sort"].items()))
+    if candidate.get("skip"):
+        cursor = cursor.skip(candidate["skip"])
+    if candidate.get("limit"):
+        cursor = cursor.limit(candidate["limit"])
+    if candidate.get("hint") is not None:
+        hint = candidate["hint"]
+        cursor = cursor.hint(list(hint.items()) if isinstance(hint, dict) else hint)
+    if candidate.get("collation"):
+        cursor = cursor.collation(candidate["collation"])
+    if candidate.get("maxTimeMS"):
+        cursor = cursor.max_time_ms(candidate["maxTimeMS"])
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    return cursor
+
+
+def _summarize_plans(stats):
+    """executionStats of every candidate plan (verbosity allPlansExecution)."""
+    return [
+        {
+            "nReturned": p.get("nReturned"),
+            "totalKeysExamined": p.get("totalKeysExamined"),
+            "totalDocsExamined": p.get("totalDocsExamined"),
+            "executionTimeMillisEstimate": p.get("executionStages", {}).get("executionTimeMillisEstimate"),
+            "stages": plan_stages(p.get("executionStages"))[0],
+        }
+        for p in stats.get("allPlansExecution", [])
+    ]
+
+
+# Statistiques de débordement sur disque des stages $group / $sort / $bucketAuto ...
+SPILL_FIELDS = ("usedDisk", "spills", "spilledDataStorageSize", "spilledBytes", "spilledRecords")
+
+
+def _spill_stats(node):
+    return {k: node[k] for k in SPILL_FIELDS if k in node}
+
 
-def run_explain(query, coll=collection):
+def _execution_stage_times(node):
+    """Per-node time of an executionStages tree: cumulative estimate and self time (minus children)."""
+    result, todo = [], [node] if node else []
+    while todo:
+        current = todo.pop(0)
+        children = ([current["inputStage"]] if current.get("inputStage") else []) + current.get("inputStages", [])
+        total = current.get("executionTimeMillisEstimate")
+        child_total = sum(c.get("executionTimeMillisEstimate") or 0 for c in children)
+        result.append(dict({
+            "stage": current.get("stage"),
+            "nReturned": current.get("nReturned"),
+            "executionTimeMillisEstimate": total,
+            "selfMillis": max(0, total - child_total) if total is not None else None,
+        }, **_spill_stats(current)))
+        todo.extend(children)
+    return result
+
+
+def _pipeline_stages(explain_data, stats):
+    """
+    Per-stage report of an aggregate explain.
+
+    - partie poussée dans le moteur de requête (SBE ou $cursor) : arbre executionStages
+    - stages exécutés ensuite ("stages" de l'explain) : temps cumulé -> temps propre par différence
     """
-    Explain optimisé :
-    - limit(10000) pour éviter les scans complets
-    - .explain() sans paramètre (compatibilité pyMongo)
+    stages = _execution_stage_times(stats.get("executionStages"))
+    previous = stats.get("executionTimeMillis") or 0
+    for entry in explain_data.get("stages", [])[1:]:
+        name = next((k for k in entry if k.startswith("$")), None)
+        total = entry.get("executionTimeMillisEstimate")
+        stages.append(dict({
+            "stage": name,
+            "nReturned": entry.get("nReturned"),
+            "executionTimeMillisEstimate": total,
+            "selfMillis": max(0, total - previous) if total is not None else None,
+        }, **_spill_stats(entry)))
+        previous = total if total is not None else previous
+    return stages
+
+
+def run_explain(candidate, coll=collection, verbosity=EXPLAIN_VERBOSITY):
     """
-    cursor = coll.find(query)
-    explain_data = cursor.explain()
+    Explain du candidat exécuté tel que déclaré (find ou aggregate) :
+    - db.command("explain", ..., verbosity=...) : executionStats ou allPlansExecution
+    - pas de limit implicite : la requête complète est mesurée
+    """
+    explain_data = coll.database.command("explain", build_command(candidate, coll), verbosity=verbosity)
 
     stats = explain_data.get("executionStats", {})
     planner = explain_data.get("queryPlanner", {})
 
-    return {
+    # Vues / time-series / agrégations : les stats du curseur sont sous stages[0].$cursor
+    if not stats and explain_data.get("stages"):
+        cursor_stage = explain_data["stages"][0].get("$cursor", {})
+        stats = cursor_stage.get("executionStats", {})
+        planner = cursor_stage.get("queryPlanner", {})
+
+    # Moteur SBE : le plan est sous winningPlan.queryPlan
+    winning_plan = planner.get("winningPlan", {})
+    winning_plan = winning_plan.get("queryPlan", winning_plan)
+    winning_stages, index_name = plan_stages(winning_plan)
+
+    result = {
         "executionTimeMillis": stats.get("executionTimeMillis"),
         "optimizationTimeMillis": planner.get("optimizationTimeMillis"),
         "totalDocsExamined": stats.get("totalDocsExamined"),
         "totalKeysExamined": stats.get("totalKeysExamined"),
         "nReturned": stats.get("nReturned"),
         "executionStages": stats.get("executionStages"),
-        "indexName": (
-            planner.get("winningPlan", {})
-                   .get("inputStage", {})
-                   .get("indexName")
-        )
+        "indexName": index_name,
+        "planStages": winning_stages,
+        # Tri bloquant en mémoire (SORT) vs ordre fourni par l'index
+        "hasBlockingSort": "SORT" in winning_stages,
+        # Requête couverte d'après le plan : totalDocsExamined == 0 vaut aussi pour un IXSCAN sans résultat
+        "isCovered": is_covered(winning_stages),
+        "rejectedPlans": len(planner.get("rejectedPlans", [])),
+        "verbosity": verbosity,
     }
+    if "pipeline" in candidate:
+        stages = _pipeline_stages(explain_data, stats)
+        # Temps total = temps cumulé du dernier stage (le $cursor seul n'inclut pas $group / $sort)
+        totals = [s["executionTimeMillisEstimate"] for s in stages if s["executionTimeMillisEstimate"] is not None]
+        if explain_data.get("stages") and totals:
+            result["executionTimeMillis"] = max([result["executionTimeMillis"] or 0] + totals)
+        result["pipelineStages"] = stages
+        result["usedDisk"] = any(s.get("usedDisk") for s in stages)
+    if verbosity == "allPlansExecution":
+        result["allPlansExecution"] = _summarize_plans(stats)
+    return result
+
+def measure_client(candidate, coll=collection, batch_size=DRAIN_BATCH_SIZE):
+    """
+    Exécute réellement le candidat et vide le curseur, comme un client du dashboard.
+
+    Les documents sont reçus en RawBSONDocument : on compte les octets reçus sans
+    décoder, puis le décodage (bson.decode) est chronométré à part.
+    - clientWallMillis       : ouverture du curseur -> dernier document décodé
+    - timeToFirstBatchMillis : ouverture -> premier document disponible
+    - decodeMillis           : temps de décodage BSON -> dict
+    - transferMillis         : reste (serveur + réseau + driver)
+    """
+    raw_coll = coll.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+    first_batch, decode_s, n_bytes, n_docs = None, 0.0, 0, 0
+
+    start = time.perf_counter()
+    for doc in open_cursor(candidate, raw_coll, batch_size):
+        if first_batch is None:
+            first_batch = time.perf_counter() - start
+        raw = doc.raw
+        n_bytes += len(raw)
+        n_docs += 1
+        decode_start = time.perf_counter()
+        decode(raw)
+        decode_s += time.perf_counter() - decode_start
+    elapsed = time.perf_counter() - start
+
+    return {
+        "clientWallMillis": elapsed * 1000,
+        "timeToFirstBatchMillis": (first_batch if first_batch is not None else elapsed) * 1000,
+        "decodeMillis": decode_s * 1000,
+        "transferMillis": (elapsed - decode_s) * 1000,
+        "bytesReceived": n_bytes,
+        "nReturned": n_docs,
+        "batchSize": batch_size,
+    }
+
+def benchmark_query(candidate, coll=collection, warmup=WARMUP_RUNS, trials=MEASURED_RUNS,
+                    verbosity=EXPLAIN_VERBOSITY, client_runs=CLIENT_RUNS, batch_size=DRAIN_BATCH_SIZE,
+                    cache_mode=CACHE_MODE):
+    """
+    Exécute la requête plusieurs fois :
+    - cache  : état du cache préparé selon `cache_mode` (cf. cache_state.py)
+    - cold   : premier run (sélection de plan ; cache froid seulement en mode "cold")
+    - warmup : runs ignorés
+    - warm   : `trials` runs mesurés, résumés par src.benchmarks.stats
+
+    - client : `client_runs` exécutions réelles avec curseur vidé (measure_client)
+
+    Renvoie le dernier explain warm, avec executionTimeMillis = médiane warm,
+    plus les sections "cold", "warm" et "client" séparées, le mode de cache
+    et les octets lus dans le cache WiredTiger pendant le run cold et les runs warm.
+    """
+    prepare_cache(cache_mode, coll)
+
+    stats_start = cache_stats(coll.database)
+    cold = run_explain(candidate, coll, verbosity)
+    stats_cold = cache_stats(coll.database)
+    for _ in range(warmup):
+        run_explain(candidate, coll, verbosity)
+
+    stats_warm = cache_stats(coll.database)
+    samples, last = [], cold
+    for _ in range(trials):
+        last = run_explain(candidate, coll, verbosity)
+        samples.append(last["executionTimeMillis"])
+    stats_end = cache_stats(coll.database)
+
+    warm = summarize(samples)
+    result = dict(last)
+    if warm["n"]:
+        result["executionTimeMillis"] = warm["median"]
+    result["cold"] = {k: cold[k] for k in ("executionTimeMillis", "totalDocsExamined", "totalKeysExamined", "indexName")}
+    result["warm"] = dict(warm, warmup_runs=warmup, samples=samples)
+    result["cacheMode"] = cache_mode
+    result["cache"] = {
+        "cold": cache_delta(stats_start, stats_cold),
+        "warm": cache_delta(stats_warm, stats_end),
+    }
+
+    if client_runs:
+        runs = [measure_client(candidate, coll, batch_size) for _ in range(client_runs)]
+        result["client"] = {
+            "wall": summarize([r["clientWallMillis"] for r in runs]),
+            "timeToFirstBatch": summarize([r["timeToFirstBatchMillis"] for r in runs]),
+            "decode": summarize([r["decodeMillis"] for r in runs]),
+            "bytesReceived": runs[-1]["bytesReceived"],
+            "nReturned": runs[-1]["nReturned"],
+            "batchSize": batch_size,
+            "runs": runs,
+        }
+    return result
 
 # -------------------------------------------------------------------
 # 4 — Save BEFORE execution time for ALL queries
 # -------------------------------------------------------------------
-def save_execution_times():
+def save_execution_times(warmup=WARMUP_RUNS, trials=MEASURED_RUNS, cache_mode=CACHE_MODE):
     """
     Sauvegarde les temps BEFORE index
-    dans execution_time.json
+    dans execution_time.json (médiane warm + temps cold séparé)
     """
     os.makedirs(RESULTS_DIR, exist_ok=True)
     results = []
@@ -193,17 +451,22 @@ def save_execution_times():
         index_param = q["index"]
         index_type = detect_index_type(index_param)
 
-        explain_res = run_explain(query)
+        explain_res = benchmark_query(q, warmup=warmup, trials=trials, cache_mode=cache_mode)
         exec_time = explain_res["executionTimeMillis"]
 
         results.append({
             "query_name": name,
             "query": query,
             "executionTimeMillis": exec_time,
+            "cold": explain_res["cold"],
+            "warm": explain_res["warm"],
+            "clientWallMillis": explain_res.get("client", {}).get("wall", {}).get("median"),
+            "cacheMode": cache_mode,
+            "bytesReadIntoCacheCold": explain_res["cache"]["cold"]["bytesReadIntoCache"],
             "index_type": index_type
         })
 
-        logger.info(f"→ {name}: {exec_time} ms ({index_type})")
+        logger.info(f"→ {name}: {exec_time} ms warm median, {explain_res['cold']['executionTimeMillis']} ms cold ({index_type})")
 
     # SAVE FILE
     path = os.path.join(RESULTS_DIR, "execution_time.json")
@@ -216,9 +479,11 @@ def save_execution_times():
 # -------------------------------------------------------------------
 # 5 — SAVE METRICS BEFORE/AFTER INDEX
 # -------------------------------------------------------------------
-def save_metrics(name, before, after, index_param):
+def save_metrics(name, before, after, index_param, cost=None, run_id=None):
     """
     Sauvegarde les metrics BEFORE/AFTER dans JSON
+    (+ coût de l'index : taille, build, pénalité d'insert)
+    et les ajoute au results store SQLite (cf. results_store.py)
     """
     os.makedirs(RESULTS_DIR, exist_ok=True)
 
@@ -226,96 +491,209 @@ def save_metrics(name, before, after, index_param):
     filename = f"{name}_{timestamp}.json"
     path = os.path.join(RESULTS_DIR, filename)
 
+    # run_id : regroupe les fichiers d'un même run (cf. regression_check.run_files)
+    try:
+        run_id = run_id or start_run("benchmarking", db)
+    except Exception as e:
+        logger.error(f"save_metrics() : could not register a run in the results store: {e}")
+
     data = {
         "query_name": name,
+        "run_id": run_id,
         "index_param": index_param,
         "index_type": detect_index_type(index_param),
+        "cache_mode": before.get("cacheMode"),
         "results": {
             "before": before,
             "after": after
         }
     }
 
+    if cost is not None:
+        data["cost"] = cost
+        data["tradeoff"] = tradeoff(before, after, cost)
+
     with open(path, "w") as f:
         json.dump(data, f, indent=4)
 
     logger.info(f"✔ Saved benchmark → {path}")
 
+    try:
+        record_result(data, run_id, source_file=path)
+    except Exception as e:
+        logger.error(f"save_metrics() : could not append {name} to the results store: {e}")
+
 
 # -------------------------------------------------------------------
-# 6 — DROP INDEXES intelligently
+# 6 — MASQUER LES INDEX (au lieu de les supprimer)
 # -------------------------------------------------------------------
+# "hide"    : hideIndex (collMod) des index concurrents, le planner choisit parmi les autres
+# "natural" : aucun index touché, le BEFORE est forcé en COLLSCAN par hint $natural
+BEFORE_MODE = "hide"
+# False : les index créés pendant le run sont supprimés à la fin (état d'origine restauré)
+KEEP_CREATED_INDEXES = False
+# Mesure taille / build / pénalité d'insert de chaque index utilisé (cf. index_costs.py)
+MEASURE_INDEX_COSTS = True
+
+
+def snapshot_indexes(coll=collection):
+    """{name: {"key": [...], "hidden": bool}} of the current indexes."""
+    return {
+        name: {"key": list(meta["key"]), "hidden": bool(meta.get("hidden", False))}
+        for name, meta in coll.index_information().items()
+    }
 
-def drop_conflicting_indexes(index_param):
+
+def find_index(index_param, coll=collection):
+    """Name of the existing index with exactly these keys, or None."""
+    keys = list(index_param.items())
+    for name, meta in snapshot_indexes(coll).items():
+        if meta["key"] == keys:
+            return name
+    return None
+
+
+def set_index_hidden(name, hidden, coll=collection):
+    coll.database.command("collMod", coll.name, index={"name": name, "hidden": hidden})
+    # Index visibles modifiés : le mode "warm" doit relire l'index avant la mesure suivante
+    forget_warm(coll)
+
+
+def hide_conflicting_indexes(index_param, coll=collection):
     """
-    Supprime TOUS les index qui pourraient interférer avec le benchmark.
-    
-    Si on veut tester un index composé {A:1, B:1}, on doit supprimer
+    Masque TOUS les index qui pourraient interférer avec le benchmark.
+
+    Si on veut tester un index composé {A:1, B:1}, on doit masquer
     non seulement les index commençant par A, mais aussi ceux commençant par B,
     car MongoDB pourrait les utiliser pour optimiser partiellement la requête.
+    Un index masqué reste maintenu : le démasquer est instantané, sans rebuild.
+    Renvoie les noms des index masqués.
     """
-    try:
-        info = collection.index_information()
-        
-        # On récupère TOUS les champs du futur index (ex: ['PULocationID', 'trip_time'])
-        target_fields = list(index_param.keys())
-
-        for index_name, meta in info.items():
-            if index_name == "_id_":
-                continue
+    target_fields = list(index_param.keys())
+    hidden = []
+    for index_name, meta in snapshot_indexes(coll).items():
+        if index_name == "_id_" or meta["hidden"]:
+            continue
+        existing_root = meta["key"][0][0]  # Le premier champ de l'index existant
+        if existing_root in target_fields:
+            logger.warning(f"🙈 Hiding interfering index '{index_name}' (starts with '{existing_root}')...")
+            set_index_hidden(index_name, True, coll)
+            hidden.append(index_name)
+    return hidden
 
-            existing_keys = meta["key"] 
-            existing_root = existing_keys[0][0] # Le premier champ de l'index existant
 
-            # Si l'index existant commence par N'IMPORTE QUEL champ de notre futur index,
-            # on le supprime. C'est la seule façon de garantir un COLLSCAN pur.
-            if existing_root in target_fields:
-                logger.warning(f"🧹 Dropping interfering index '{index_name}' (starts with '{existing_root}')...")
-                collection.drop_index(index_name)
+def ensure_index(index_param, coll=collection):
+    """
+    Make the target index usable: unhide it if it exists, build it only when missing.
+    Returns (name, created, build_seconds).
+    """
+    name = find_index(index_param, coll)
+    if name is not None:
+        set_index_hidden(name, False, coll)
+        logger.info(f"✔ Index {name} already exists → unhidden, no rebuild")
+        return name, False, None
+    logger.warning(f"⚠ Creating missing index {index_param}")
+    start = time.perf_counter()
+    name = coll.create_index(list(index_param.items()))
+    build_seconds = time.perf_counter() - start
+    forget_warm(coll)
+    return name, True, build_seconds
+
+
+def unhide(names, coll=collection):
+    for name in names:
+        set_index_hidden(name, False, coll)
+
+
+def restore_indexes(snapshot, created, coll=collection, keep_created=KEEP_CREATED_INDEXES):
+    """Restore the hidden flags of the snapshot and drop the indexes created during the run."""
+    current = snapshot_indexes(coll)
+    for name, meta in snapshot.items():
+        if name in current and current[name]["hidden"] != meta["hidden"]:
+            set_index_hidden(name, meta["hidden"], coll)
+    if not keep_created:
+        for name in created:
+            if name in current and name not in snapshot:
+                logger.info(f"🧹 Dropping index {name} created by the benchmark")
+                coll.drop_index(name)
+    forget_warm(coll)
+    logger.info("✔ Original index state restored")
 
-    except Exception as e:
-        logger.error(f"Error checking indexes: {e}")
-        
 # -------------------------------------------------------------------
 # 7 — MAIN: Slow Query Detection
 # -------------------------------------------------------------------
-def run_slow_query_detection(threshold_ms=200):
+def run_slow_query_detection(threshold_ms=200, warmup=WARMUP_RUNS, trials=MEASURED_RUNS,
+                             before_mode=BEFORE_MODE, keep_created=KEEP_CREATED_INDEXES,
+                             measure_costs=MEASURE_INDEX_COSTS, cache_mode=CACHE_MODE):
     logger.info("🚀 Starting slow query detection...")
 
-    # Step 1 — Save ALL BEFORE execution times
-    save_execution_times()
-
-    # Step 2 — Process each query
-    for q in SLOW_QUERY_CANDIDATES:
-        name = q["name"]
-        query = q["query"]
-        index_param = q["index"]
-
-        logger.info(f"\n=== TEST {name} ===")
-
-        # 1. D'ABORD on nettoie
-        drop_conflicting_indexes(index_param) 
-
-        # 2. ENSUITE on mesure (on est sûr que c'est lent maintenant)
-        before = run_explain(query)
-        time_before = before["executionTimeMillis"]
+    # L'état des index est restauré à la fin du run, même en cas d'erreur
+    snapshot = snapshot_indexes()
+    created = []
+    run_id = start_run("benchmarking", db)
+    # Lot rejoué et débit d'insert sans index secondaire : calculés une fois, au premier index mesuré
+    replay = {}
+    try:
+        # Step 1 — Save ALL BEFORE execution times
+        save_execution_times(warmup, trials, cache_mode)
+
+        # Step 2 — Process each query
+        for q in SLOW_QUERY_CANDIDATES:
+            name = q["name"]
+            index_param = q["index"]
+
+            logger.info(f"\n=== TEST {name} ===")
+
+            # 1. D'ABORD on neutralise les index concurrents (sans rien supprimer)
+            if before_mode == "hide":
+                hidden = hide_conflicting_indexes(index_param)
+                before_candidate = q
+            else:
+                hidden = []
+                before_candidate = dict(q, hint={"$natural": 1})
+
+            # 2. ENSUITE on mesure (on est sûr que c'est lent maintenant)
+            # Décision lent / rapide sur la médiane warm, pas sur un run isolé
+            before = benchmark_query(before_candidate, warmup=warmup, trials=trials, cache_mode=cache_mode)
+            time_before = before["executionTimeMillis"]
+
+            logger.info(f"⏱ BEFORE = {time_before} ms (warm median, p95 {before['warm'].get('p95')} ms, cold {before['cold']['executionTimeMillis']} ms)")
+            logger.info(f"💾 cache mode {cache_mode}: {before['cache']['cold']['bytesReadIntoCache']} bytes read into cache by the cold run, "
+                        f"{before['cache']['warm']['bytesReadIntoCache']} by the warm runs")
+
+            if time_before <= threshold_ms:
+                logger.info(f"→ Query {name} is FAST (<{threshold_ms} ms). Skipped.")
+                unhide(hidden)
+                continue
 
-        logger.info(f"⏱ BEFORE = {time_before} ms")
+            logger.warning(f"⚠ SLOW QUERY → Using index {index_param}")
 
-        if time_before <= threshold_ms:
-            logger.info(f"→ Query {name} is FAST (<{threshold_ms} ms). Skipped.")
-            continue
+            index_name, was_created, build_seconds = ensure_index(index_param)
+            if was_created:
+                created.append(index_name)
 
-        logger.warning(f"⚠ SLOW QUERY → Creating index {index_param}")
+            after = benchmark_query(q, warmup=warmup, trials=trials, cache_mode=cache_mode)
 
-        collection.create_index(list(index_param.items()))
+            logger.info(f"⏱ AFTER = {after['executionTimeMillis']} ms (warm median, p95 {after['warm'].get('p95')} ms, cold {after['cold']['executionTimeMillis']} ms)")
+            if "client" in after:
+                logger.info(f"⏱ CLIENT = {before['client']['wall'].get('median', 0):.0f} ms → {after['client']['wall'].get('median', 0):.0f} ms "
+                            f"({after['client']['bytesReceived'] / 1e6:.1f} MB received)")
 
-        after = run_explain(query)
+            cost = None
+            if measure_costs:
+                if not replay:
+                    replay["docs"] = load_replay_batch(collection)
+                    replay["baseline"] = insert_rate(db, scratch_name(collection), replay["docs"])
+                cost = measure_index_cost(collection, index_param, index_name, build_seconds,
+                                          replay["docs"], replay["baseline"])
 
-        logger.info(f"⏱ AFTER = {after['executionTimeMillis']} ms")
+            # Save BEFORE/AFTER comparison
+            save_metrics(name, before, after, index_param, cost, run_id)
 
-        # Save BEFORE/AFTER comparison
-        save_metrics(name, before, after, index_param)
+            # Les index masqués pour cette requête redeviennent visibles pour la suivante
+            unhide(hidden)
+    finally:
+        restore_indexes(snapshot, created, keep_created=keep_created)
 
     logger.info("🏁 Slow query detection finished.")
 
@@ -324,6 +702,8 @@ def run_slow_query_detection(threshold_ms=200):
 # 8 — RUN SCRIPT
 # -------------------------------------------------------------------
 if __name__ == "__main__":
-    logger.info("===== STARTING BENCHMARK ENGINE =====")
-    run_slow_query_detection(threshold_ms=200)
+    # python -m src.benchmarks.benchmarks_app [default|warm|cold]
+    mode = sys.argv[1] if len(sys.argv) > 1 else CACHE_MODE
+    logger.info(f"===== STARTING BENCHMARK ENGINE (cache mode: {mode}) =====")
+    run_slow_query_detection(threshold_ms=200, cache_mode=mode)
     logger.info("===== FINISHED =====")
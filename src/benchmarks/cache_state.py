@@ -0,0 +1,162 @@
+"""
+État du cache WiredTiger pendant les benchmarks
+-----------------------------------------------
+
+Un COLLSCAN servi depuis le cache WiredTiger et le même COLLSCAN lu sur disque
+diffèrent d'un ordre de grandeur. Modes de cache d'un benchmark :
+
+- "default" : rien n'est préparé (comportement historique)
+- "warm"    : collection et index lus entièrement avant les mesures
+              (une fois par collection tant qu'aucun run cold n'a eu lieu)
+- "cold"    : avant chaque requête, redémarrage du mongod (MONGOD_RESTART_COMMAND)
+              ou, à défaut, éviction du cache par réduction temporaire de cache_size,
+              puis planCacheClear
+
+Les octets lus dans le cache ("bytes read into cache" de serverStatus) sont
+relevés avant et après chaque requête pour savoir si la mesure a touché le disque.
+"""
+
+import os
+import subprocess
+import time
+from src.logger import logger
+
+CACHE_MODES = ("default", "warm", "cold")
+
+# Ex. "docker compose restart mongod" ou "sudo systemctl restart mongod"
+RESTART_COMMAND = os.environ.get("MONGOD_RESTART_COMMAND")
+# Optionnel : vider aussi le page cache de l'OS, ex. "sudo sh -c 'sync; echo 3 > /proc/sys/vm/drop_caches'"
+DROP_OS_CACHE_COMMAND = os.environ.get("DROP_OS_CACHE_COMMAND")
+RESTART_TIMEOUT_S = 120
+# Taille minimale acceptée par WiredTiger : le cache est réduit à cette taille puis restauré
+EVICTION_CACHE_SIZE = "256M"
+EVICTION_WAIT_S = 5
+
+# Collections déjà chauffées depuis le dernier passage en mode cold ou le dernier
+# changement de leurs index visibles (cf. forget_warm)
+_warmed = set()
+
+
+# -------------------------------------------------------------------
+# 1 — Statistiques du cache
+# -------------------------------------------------------------------
+def cache_stats(db):
+    """WiredTiger cache counters from serverStatus (None when unavailable)."""
+    try:
+        cache = db.command("serverStatus").get("wiredTiger", {}).get("cache", {})
+    except Exception as e:
+        logger.warning(f"cache_stats() : serverStatus unavailable: {e}")
+        cache = {}
+    return {
+        "bytesReadIntoCache": cache.get("bytes read into cache"),
+        "pagesReadIntoCache": cache.get("pages read into cache"),
+        "bytesInCache": cache.get("bytes currently in the cache"),
+        "maxBytes": cache.get("maximum bytes configured"),
+    }
+
+
+def cache_delta(before, after):
+    """Read-in bytes / pages between two cache_stats snapshots."""
+    def diff(key):
+        if before.get(key) is None or after.get(key) is None:
+            return None
+        return after[key] - before[key]
+
+    return {
+        "bytesReadIntoCache": diff("bytesReadIntoCache"),
+        "pagesReadIntoCache": diff("pagesReadIntoCache"),
+        "bytesInCacheBefore": before.get("bytesInCache"),
+        "bytesInCacheAfter": after.get("bytesInCache"),
+    }
+
+
+# -------------------------------------------------------------------
+# 2 — Warm : lecture complète de la collection et des index
+# -------------------------------------------------------------------
+def warm_collection(coll):
+    """Pull the collection and every index into the cache (touch n'existe plus depuis 4.2)."""
+    start = time.perf_counter()
+    # COLLSCAN complet sans rien renvoyer au client
+    list(coll.find({"__warm_probe__": True}).hint([("$natural", 1)]))
+    for name, meta in coll.index_information().items():
+        # Un index masqué ne peut pas être forcé par hint ; un index partiel ne couvre pas le filtre {}
+        if meta.get("hidden") or "partialFilterExpression" in meta:
+            logger.info(f"warm_collection() : skipping hidden/partial index {name}")
+            continue
+        # Parcours complet de l'index (comptage couvert, pas de FETCH)
+        coll.count_documents({}, hint=name)
+    _warmed.add(coll.full_name)
+    logger.info(f"🔥 Warmed {coll.full_name} and its indexes in {time.perf_counter() - start:.1f} s")
+
+
+def forget_warm(coll):
+    """An index of `coll` was created, unhidden, hidden or dropped: warm it again before the next measure."""
+    _warmed.discard(coll.full_name)
+
+
+# -------------------------------------------------------------------
+# 3 — Cold : redémarrage ou éviction, puis planCacheClear
+# -------------------------------------------------------------------
+def _run(command):
+    # Commandes fournies par l'opérateur (variables d'environnement) : exécutées via le shell
+    subprocess.run(command, shell=True, check=True, capture_output=True)
+
+
+def wait_for_server(db, timeout=RESTART_TIMEOUT_S):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            db.client.admin.command("ping")
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"mongod did not come back within {timeout} s")
+            time.sleep(1)
+
+
+def restart_server(db, command=RESTART_COMMAND):
+    logger.info(f"♻ Restarting mongod: {command}")
+    _run(command)
+    wait_for_server(db)
+
+
+def evict_cache(db, size=EVICTION_CACHE_SIZE, wait=EVICTION_WAIT_S):
+    """Force eviction by shrinking the WiredTiger cache, then restore its configured size."""
+    configured = cache_stats(db)["maxBytes"]
+    if configured is None:
+        raise RuntimeError("evict_cache() : WiredTiger cache size unknown, set MONGOD_RESTART_COMMAND instead")
+    try:
+        db.client.admin.command("setParameter", 1, wiredTigerEngineRuntimeConfig=f"cache_size={size}")
+        time.sleep(wait)
+    finally:
+        # Même interrompue, l'éviction ne doit pas laisser le serveur avec un cache de 256 Mo
+        db.client.admin.command("setParameter", 1,
+                                wiredTigerEngineRuntimeConfig=f"cache_size={int(configured) // (1024 * 1024)}M")
+    logger.info(f"🧊 Evicted WiredTiger cache (shrunk to {size}, restored to {int(configured) / 1e9:.1f} GB)")
+
+
+def make_cold(coll, restart_command=RESTART_COMMAND, drop_os_cache_command=DROP_OS_CACHE_COMMAND):
+    """Put the server in a cold state for `coll`."""
+    db = coll.database
+    if restart_command:
+        restart_server(db, restart_command)
+    else:
+        evict_cache(db)
+    if drop_os_cache_command:
+        _run(drop_os_cache_command)
+    # Plan de requête à resélectionner, comme après un redémarrage
+    db.command("planCacheClear", coll.name)
+    _warmed.clear()
+
+
+def prepare_cache(mode, coll):
+    """Apply a cache mode before measuring a query on `coll`."""
+    if mode in (None, "default"):
+        return
+    if mode == "cold":
+        make_cold(coll)
+    elif mode == "warm":
+        if coll.full_name not in _warmed:
+            warm_collection(coll)
+    else:
+        raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
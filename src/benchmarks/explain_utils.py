@@ -0,0 +1,34 @@
+"""
+Lecture des plans d'explain
+---------------------------
+
+Fonctions sans dépendance (ni pymongo ni connexion) sur les arbres de plan
+renvoyés par explain() : utilisées à la mesure (benchmarks_app), à la
+comparaison avec la référence (regression_check) et au stockage des
+résultats (results_store).
+"""
+
+# Étages qui lisent les clés d'index sans toucher aux documents
+INDEX_ONLY_STAGES = ("IXSCAN", "COUNT_SCAN", "DISTINCT_SCAN")
+
+
+def plan_stages(plan):
+    """Flatten a plan tree into [stage, ...] and the first index name found."""
+    stages, index_name = [], None
+    todo = [plan] if plan else []
+    while todo:
+        node = todo.pop(0)
+        if node.get("stage"):
+            stages.append(node["stage"])
+        index_name = index_name or node.get("indexName")
+        if node.get("inputStage"):
+            todo.append(node["inputStage"])
+        todo.extend(node.get("inputStages", []))
+    return stages, index_name
+
+
+def is_covered(stages):
+    """Covered plan: keys read from an index and no FETCH (PROJECTION_COVERED when a projection applies)."""
+    if "FETCH" in stages:
+        return False
+    return "PROJECTION_COVERED" in stages or any(s in stages for s in INDEX_ONLY_STAGES)
@@ -0,0 +1,242 @@
+"""
+Index Advisor (règle ESR)
+-------------------------
+
+Pour chaque requête du catalogue :
+1. Analyse la forme de la requête : champs d'égalité, de tri, de plage, projection
+2. Génère des index candidats (ordonnés par le profil de cardinalité s'il existe) :
+   - ESR : Equality -> Sort -> Range
+   - variante couvrante : ESR + champs projetés (DocsExamined = 0)
+   - variante sans tri (E -> R) et index simples
+   - index hashed sur un champ d'égalité (pas sur un champ à faible cardinalité)
+   - l'index écrit à la main dans SLOW_QUERY_CANDIDATES
+3. Évalue chaque candidat en le forçant avec hint() (plus un COLLSCAN de référence)
+4. Classe les candidats : docs/keys examinés, tri bloquant, latence, taille d'index
+5. Signale quand l'index écrit à la main n'est pas le meilleur choix
+6. Sauvegarde le rapport dans results/advisor
+"""
+
+import json
+import os
+from datetime import datetime
+from src.logger import logger
+from src.benchmarks.benchmarks_app import SLOW_QUERY_CANDIDATES, benchmark_query, collection
+from src.benchmarks.cache_state import forget_warm
+from src.benchmarks.index_costs import index_size
+from src.profiler import load_profile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "advisor"))
+
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$regex", "$exists", "$not"}
+ADVISOR_WARMUP = 1
+ADVISOR_TRIALS = 3
+# En dessous, un index hashed répartit mal les clés (hvfhs_license_num : 4 valeurs)
+HASHED_MIN_DISTINCT = 1000
+
+
+# -------------------------------------------------------------------
+# 1 — Forme de la requête
+# -------------------------------------------------------------------
+def query_shape(candidate):
+    """Split a find candidate into equality, sort, range and projected fields."""
+    equality, ranges = [], []
+    for field, condition in candidate.get("query", {}).items():
+        if field.startswith("$"):
+            # $or / $and / $expr : hors du périmètre de la règle ESR
+            continue
+        if isinstance(condition, dict) and any(op in RANGE_OPERATORS for op in condition):
+            ranges.append(field)
+        else:
+            # valeur directe, $eq ou $in : égalité au sens ESR
+            equality.append(field)
+
+    sort = list((candidate.get("sort") or {}).items())
+    projection = candidate.get("projection") or {}
+    projected = [f for f, v in projection.items() if v and f != "_id"]
+    covers_id = projection.get("_id", 1) != 0
+    return {
+        "equality": equality,
+        "sort": sort,
+        "range": ranges,
+        # Une requête n'est couvrable que si _id est exclu de la projection
+        "projected": projected if projection and not covers_id else [],
+    }
+
+
+# -------------------------------------------------------------------
+# 2 — Génération des candidats
+# -------------------------------------------------------------------
+def _append(keys, field, direction=1):
+    if field not in {f for f, _ in keys}:
+        keys.append((field, direction))
+
+
+def _distinct(profile, field):
+    stats = (profile or {}).get("fields", {}).get(field)
+    return stats["distinct"] if stats else None
+
+
+def generate_candidates(candidate, profile=None):
+    """Return [(label, [(field, direction), ...]), ...] without duplicates."""
+    shape = query_shape(candidate)
+    generated = []
+    if profile:
+        # Égalités les plus sélectives en tête de l'index
+        shape["equality"].sort(key=lambda f: -(_distinct(profile, f) or 0))
+
+    esr = []
+    for field in shape["equality"]:
+        _append(esr, field)
+    for field, direction in shape["sort"]:
+        _append(esr, field, direction)
+    for field in shape["range"]:
+        _append(esr, field)
+    if esr:
+        generated.append(("esr", esr))
+
+    if shape["projected"]:
+        covering = list(esr)
+        for field in shape["projected"]:
+            _append(covering, field)
+        generated.append(("esr_covering", covering))
+
+    if shape["sort"]:
+        # E -> R : plus sélectif mais tri bloquant en mémoire
+        er = []
+        for field in shape["equality"] + shape["range"]:
+            _append(er, field)
+        if er:
+            generated.append(("equality_range", er))
+
+    for field in shape["equality"] + shape["range"]:
+        generated.append((f"single_{field}", [(field, 1)]))
+    for field in shape["equality"]:
+        distinct = _distinct(profile, field)
+        if distinct is not None and distinct < HASHED_MIN_DISTINCT:
+            continue
+        generated.append((f"hashed_{field}", [(field, "hashed")]))
+
+    if candidate.get("index"):
+        generated.append(("hand_written", list(candidate["index"].items())))
+
+    unique, seen = [], {}
+    for label, keys in generated:
+        key = tuple(keys)
+        if key in seen:
+            # Même index sous plusieurs noms : on garde le premier, on retient l'alias
+            seen[key]["aliases"].append(label)
+            continue
+        entry = {"label": label, "keys": keys, "aliases": []}
+        seen[key] = entry
+        unique.append(entry)
+    return unique
+
+
+# -------------------------------------------------------------------
+# 3 — Évaluation par hint()
+# -------------------------------------------------------------------
+def _index_name(coll, keys):
+    for name, meta in coll.index_information().items():
+        if list(meta["key"]) == list(keys):
+            return name
+    return None
+
+
+def evaluate_index(candidate, keys, coll=collection, warmup=ADVISOR_WARMUP, trials=ADVISOR_TRIALS):
+    """Force `keys` with hint() and measure the candidate query."""
+    hinted = dict(candidate, hint=dict(keys))
+    result = benchmark_query(hinted, coll, warmup=warmup, trials=trials, client_runs=0)
+    return {
+        "executionTimeMillis": result["executionTimeMillis"],
+        "p95": result["warm"].get("p95"),
+        "totalKeysExamined": result["totalKeysExamined"],
+        "totalDocsExamined": result["totalDocsExamined"],
+        "nReturned": result["nReturned"],
+        "hasBlockingSort": result["hasBlockingSort"],
+        "isCovered": result["isCovered"],
+        "planStages": result["planStages"],
+    }
+
+
+def rank_key(entry):
+    m = entry["metrics"]
+    examined = (m.get("totalKeysExamined") or 0) + (m.get("totalDocsExamined") or 0)
+    return (examined, m.get("hasBlockingSort", True), m.get("executionTimeMillis") or float("inf"),
+            entry.get("indexSizeBytes") or 0)
+
+
+def advise_query(candidate, coll=collection, profile=None):
+    """Generate, build (if missing), evaluate and rank the index candidates of one query."""
+    report = {"query_name": candidate["name"], "shape": query_shape(candidate), "candidates": []}
+    if profile:
+        report["distinct"] = {f: _distinct(profile, f) for f in report["shape"]["equality"] + report["shape"]["range"]}
+
+    baseline = evaluate_index(candidate, [("$natural", 1)], coll)
+    report["collscan"] = baseline
+    logger.info(f"→ {candidate['name']} COLLSCAN: {baseline['executionTimeMillis']} ms")
+
+    for entry in generate_candidates(candidate, profile):
+        keys = entry["keys"]
+        name = _index_name(coll, keys)
+        created = name is None
+        try:
+            if created:
+                name = coll.create_index(keys)
+                forget_warm(coll)
+            entry["indexName"] = name
+            entry["indexSizeBytes"] = index_size(coll, name)
+            entry["metrics"] = evaluate_index(candidate, keys, coll)
+            logger.info(f"  {entry['label']:<28} {entry['metrics']['executionTimeMillis']} ms "
+                        f"keys={entry['metrics']['totalKeysExamined']} docs={entry['metrics']['totalDocsExamined']}")
+        except Exception as e:
+            entry["error"] = str(e)
+            logger.error(f"advise_query() : {candidate['name']} {keys} failed: {e}")
+        finally:
+            # Les index créés pour l'évaluation sont supprimés, ceux qui existaient restent
+            if created and entry.get("indexName"):
+                coll.drop_index(entry["indexName"])
+                forget_warm(coll)
+        entry["keys"] = [[f, d] for f, d in keys]
+        report["candidates"].append(entry)
+
+    ranked = sorted((e for e in report["candidates"] if "metrics" in e), key=rank_key)
+    for rank, entry in enumerate(ranked, start=1):
+        entry["rank"] = rank
+    report["candidates"] = ranked + [e for e in report["candidates"] if "metrics" not in e]
+
+    if ranked:
+        best = ranked[0]
+        hand = next((e for e in ranked if e["label"] == "hand_written" or "hand_written" in e["aliases"]), None)
+        report["recommended"] = {"label": best["label"], "keys": best["keys"]}
+        report["hand_written_rank"] = hand["rank"] if hand else None
+        report["hand_written_is_best"] = hand is best
+        if hand is not None and hand is not best:
+            report["note"] = (f"hand-written index {candidate['index']} ranks #{hand['rank']}: "
+                              f"{best['label']} {dict((f, d) for f, d in best['keys'])} examines "
+                              f"{rank_key(best)[0]} keys+docs vs {rank_key(hand)[0]}")
+            logger.warning(f"⚠ {candidate['name']}: {report['note']}")
+    return report
+
+
+def run_index_advisor(coll=collection, candidates=SLOW_QUERY_CANDIDATES, profile=None):
+    """Run the advisor over the catalog (find candidates) and save the recommendation report."""
+    profile = profile or load_profile()
+    if profile is None:
+        logger.warning("run_index_advisor() : no field profile (python -m src.profiler), candidates unordered")
+    reports = [advise_query(c, coll, profile) for c in candidates if "query" in c]
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(RESULTS_DIR, f"index_advisor_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(reports, f, indent=4, default=str)
+
+    logger.info(f"✔ Saved index advisor report → {path}")
+    return reports
+
+
+if __name__ == "__main__":
+    logger.info("===== STARTING INDEX ADVISOR =====")
+    run_index_advisor()
+    logger.info("===== FINISHED =====")
@@ -0,0 +1,112 @@
+"""
+Coût des index : taille, temps de build, pénalité d'écriture
+------------------------------------------------------------
+
+Un index accélère les lectures mais chaque insert doit aussi mettre à jour
+ses clés. Pour chaque index évalué :
+1. Taille sur disque (collStats.indexSizes)
+2. Temps de build (sur la collection réelle si le moteur le crée, sinon
+   sur une collection scratch contenant le lot de référence)
+3. Débit d'insert d'un lot fixe de trips, avec et sans l'index, dans une
+   collection scratch (la collection de production n'est jamais modifiée)
+"""
+
+import copy
+import time
+from src.logger import logger
+from src.benchmarks.stats import summarize
+
+# Lot fixe rejoué : les N premiers trips dans l'ordre naturel
+REPLAY_BATCH_SIZE = 50_000
+INSERT_REPEATS = 3
+INSERT_CHUNK = 10_000
+
+
+def scratch_name(coll):
+    return f"{coll.name}_index_cost_scratch"
+
+
+def load_replay_batch(coll, n=REPLAY_BATCH_SIZE):
+    """Fixed batch of trips (natural order, without _id) replayed by every measurement."""
+    return list(coll.find({}, {"_id": 0}).hint([("$natural", 1)]).limit(n))
+
+
+def index_size(coll, name):
+    stats = coll.database.command("collStats", coll.name)
+    return stats.get("indexSizes", {}).get(name)
+
+
+def insert_rate(db, name, docs, indexes=(), repeats=INSERT_REPEATS):
+    """Median docs/s when inserting `docs` into a fresh collection that already carries `indexes`."""
+    rates = []
+    for _ in range(repeats):
+        db.drop_collection(name)
+        scratch = db[name]
+        for keys in indexes:
+            scratch.create_index(list(keys.items()))
+        # insert_many ajoute _id aux documents : on insère des copies
+        batch = copy.deepcopy(docs)
+        start = time.perf_counter()
+        for i in range(0, len(batch), INSERT_CHUNK):
+            scratch.insert_many(batch[i:i + INSERT_CHUNK], ordered=False)
+        elapsed = time.perf_counter() - start
+        rates.append(len(batch) / elapsed if elapsed else 0.0)
+    db.drop_collection(name)
+    return summarize(rates)
+
+
+def scratch_build_time(db, name, docs, index_param):
+    """Seconds to build the index on a scratch collection holding the replay batch."""
+    db.drop_collection(name)
+    db[name].insert_many(copy.deepcopy(docs), ordered=False)
+    start = time.perf_counter()
+    db[name].create_index(list(index_param.items()))
+    elapsed = time.perf_counter() - start
+    db.drop_collection(name)
+    return elapsed
+
+
+def measure_index_cost(coll, index_param, index_name=None, build_seconds=None, replay_docs=None,
+                       baseline=None):
+    """
+    Storage and write cost of one index.
+
+    build_seconds : temps de build mesuré sur la collection réelle (None si l'index existait déjà)
+    baseline      : résultat de insert_rate sans index secondaire (recalculé si absent)
+    """
+    db = coll.database
+    name = scratch_name(coll)
+    docs = replay_docs if replay_docs is not None else load_replay_batch(coll)
+    baseline = baseline or insert_rate(db, name, docs)
+    with_index = insert_rate(db, name, docs, [index_param])
+
+    base_rate, index_rate = baseline.get("median"), with_index.get("median")
+    penalty = (1 - index_rate / base_rate) * 100 if base_rate and index_rate else None
+    cost = {
+        "indexName": index_name,
+        "indexSizeBytes": index_size(coll, index_name) if index_name else None,
+        "buildTimeSeconds": build_seconds,
+        "buildTimeScratchSeconds": scratch_build_time(db, name, docs, index_param),
+        "replayBatchSize": len(docs),
+        "insertDocsPerSecBaseline": base_rate,
+        "insertDocsPerSecWithIndex": index_rate,
+        "insertPenaltyPct": penalty,
+    }
+    logger.info(f"💰 {index_param}: size={cost['indexSizeBytes']} B, "
+                f"insert penalty={penalty if penalty is None else round(penalty, 1)} %")
+    return cost
+
+
+def tradeoff(before, after, cost):
+    """Read benefit of an index next to its write and storage cost."""
+    read_gain = None
+    if before.get("executionTimeMillis") is not None and after.get("executionTimeMillis") is not None:
+        read_gain = before["executionTimeMillis"] - after["executionTimeMillis"]
+    return {
+        "readGainMillis": read_gain,
+        "readSpeedup": (before["executionTimeMillis"] / after["executionTimeMillis"]
+                        if read_gain is not None and after["executionTimeMillis"] else None),
+        "insertPenaltyPct": cost.get("insertPenaltyPct"),
+        "indexSizeMB": cost["indexSizeBytes"] / 1e6 if cost.get("indexSizeBytes") else None,
+        "buildTimeSeconds": cost.get("buildTimeSeconds"),
+    }
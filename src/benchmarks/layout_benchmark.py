@@ -0,0 +1,165 @@
+"""
+Storage Layout Benchmark
+------------------------
+
+Compare le layout plat (un document par trip) avec un layout alternatif :
+1. Importe les mêmes fichiers NDJSON dans les deux collections (optionnel)
+2. Mesure le stockage (collStats), l'empreinte cache et le débit d'import
+3. Mesure le temps d'un COLLSCAN complet
+4. Exécute SLOW_QUERY_CANDIDATES + pipelines du dashboard sur chaque layout
+5. Sauvegarde la comparaison dans results/layouts
+"""
+
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from src.logger import logger
+from src.mongo_import import connect_to_mongo, import_json_to_mongodb
+from src.benchmarks.benchmarks_app import SLOW_QUERY_CANDIDATES, run_explain, measure_client, DB_NAME, COLLECTION_NAME
+from src.storage_layouts import get_layout
+from src.stage_cache import StageCache
+from dashboard.data.mongo_queries import DASHBOARD_PIPELINES
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "layouts"))
+
+
+def staged_json_files():
+    """NDJSON files of the most recently used "convert" entry of the stage cache."""
+    convert_dir = StageCache().latest("convert")
+    if convert_dir is None:
+        raise FileNotFoundError("No converted NDJSON in the stage cache: run runApplication with STAGED = True first.")
+    return sorted(glob.glob(os.path.join(convert_dir, "trips_*.json")))
+
+def collection_storage(db, collection_name):
+    """Return storage metrics from collStats."""
+    stats = db.command("collStats", collection_name)
+    cache = stats.get("wiredTiger", {}).get("cache", {})
+    return {
+        "count": stats.get("count"),
+        "size": stats.get("size"),
+        "avgObjSize": stats.get("avgObjSize"),
+        "storageSize": stats.get("storageSize"),
+        "totalIndexSize": stats.get("totalIndexSize"),
+        "indexSizes": stats.get("indexSizes"),
+        # Empreinte de la collection dans le cache WiredTiger au moment de la mesure
+        "cacheBytes": cache.get("bytes currently in the cache"),
+    }
+
+
+def collscan_time(coll):
+    """Explain a full collection scan (filter matching nothing, forced $natural)."""
+    try:
+        explain_data = coll.find({"__collscan_probe__": True}).hint([("$natural", 1)]).explain()
+    except Exception as e:
+        logger.error(f"collscan_time() : COLLSCAN explain failed on {coll.name}: {e}")
+        return None
+    stats = explain_data.get("executionStats", {})
+    return {
+        "executionTimeMillis": stats.get("executionTimeMillis"),
+        "totalDocsExamined": stats.get("totalDocsExamined"),
+    }
+
+
+def time_import(json_files, collection_name, layout, db_name=DB_NAME):
+    """Drop the collection, import json_files with the given layout and return the import rate."""
+    db = connect_to_mongo(db_name)
+    db.drop_collection(collection_name)
+
+    start = time.perf_counter()
+    for json_file in json_files:
+        import_json_to_mongodb(json_file, db_name, collection_name, layout=layout)
+    elapsed = time.perf_counter() - start
+
+    docs = db[collection_name].estimated_document_count()
+    logger.info(f"time_import() : {collection_name} ({layout}) imported in {elapsed:.1f}s")
+    return {
+        "seconds": elapsed,
+        "documents": docs,
+        "docs_per_second": docs / elapsed if elapsed else None,
+    }
+
+
+def benchmark_candidates(coll, translate_candidate, candidates=SLOW_QUERY_CANDIDATES):
+    """Explain and run every catalog query on one layout."""
+    results = {}
+    for candidate in candidates:
+        translated = translate_candidate(candidate)
+        # Le layout bucket répond aux requêtes find par une agrégation ($unwind des buckets) :
+        # run_explain / measure_client exécutent find ou aggregate selon le candidat traduit
+        explain_res = run_explain(translated, coll)
+
+        # Temps côté client : les trips renvoyés, quel que soit le layout
+        client = measure_client(translated, coll)
+        wall_ms = client["clientWallMillis"]
+
+        results[candidate["name"]] = {
+            "query": translated.get("query", translated.get("pipeline")),
+            "executionTimeMillis": explain_res["executionTimeMillis"],
+            "totalDocsExamined": explain_res["totalDocsExamined"],
+            "totalKeysExamined": explain_res["totalKeysExamined"],
+            "nReturned": explain_res["nReturned"],
+            "wallTimeMillis": wall_ms,
+            "timeToFirstBatchMillis": client["timeToFirstBatchMillis"],
+            "decodeMillis": client["decodeMillis"],
+            "bytesReceived": client["bytesReceived"],
+            "tripsReturned": client["nReturned"],
+        }
+        logger.info(f"→ {coll.name} {candidate['name']}: {explain_res['executionTimeMillis']} ms (wall {wall_ms:.0f} ms)")
+    return results
+
+
+def benchmark_pipelines(coll, translate_pipeline, pipelines=DASHBOARD_PIPELINES):
+    """Run every dashboard pipeline to completion and time it."""
+    results = {}
+    for name, pipeline in pipelines.items():
+        start = time.perf_counter()
+        n_docs = sum(1 for _ in coll.aggregate(translate_pipeline(pipeline), allowDiskUse=True))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        results[name] = {"wallTimeMillis": elapsed_ms, "nReturned": n_docs}
+        logger.info(f"→ {coll.name} {name}: {elapsed_ms:.0f} ms")
+    return results
+
+
+def compare_layouts(layout, layout_collection, json_files=None, reimport=False,
+                    flat_collection=f"{COLLECTION_NAME}_flat"):
+    """Benchmark the flat collection against `layout` and save the comparison."""
+    collections = {"flat": flat_collection, layout: layout_collection}
+    # reimport supprime les collections comparées : jamais la collection de production
+    if reimport and COLLECTION_NAME in collections.values():
+        raise ValueError(f"compare_layouts() : reimport would drop the production collection {COLLECTION_NAME}")
+    db = connect_to_mongo(DB_NAME)
+    report = {"layout": layout, "collections": collections, "layouts": {}}
+
+    for name, collection_name in collections.items():
+        storage_layout = get_layout(name)
+        entry = {}
+        if reimport:
+            entry["import"] = time_import(json_files or staged_json_files(), collection_name, name)
+        coll = db[collection_name]
+        entry["collscan"] = collscan_time(coll)
+        entry["storage"] = collection_storage(db, collection_name)
+        entry["queries"] = benchmark_candidates(coll, storage_layout["translate_candidate"])
+        entry["pipelines"] = benchmark_pipelines(coll, storage_layout["translate_pipeline"])
+        report["layouts"][name] = entry
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(RESULTS_DIR, f"{layout}_vs_flat_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, default=str)
+
+    logger.info(f"✔ Saved layout comparison → {path}")
+    return report
+
+
+if __name__ == "__main__":
+    # python -m src.benchmarks.layout_benchmark [timeseries|compact|bucket]
+    layout = sys.argv[1] if len(sys.argv) > 1 else "timeseries"
+    logger.info(f"===== STARTING {layout.upper()} LAYOUT BENCHMARK =====")
+    # Collections dédiées : la collection de production n'est jamais supprimée
+    compare_layouts(layout, f"{COLLECTION_NAME}_{layout}", reimport=True)
+    logger.info("===== FINISHED =====")
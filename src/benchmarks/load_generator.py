@@ -0,0 +1,192 @@
+"""
+Concurrent Load Generator
+-------------------------
+
+Le moteur de benchmark mesure une requête à la fois sur un serveur au repos.
+Ici N clients (threads) exécutent en parallèle un mélange pondéré des requêtes
+du catalogue, pendant une durée ou un nombre d'opérations fixés :
+
+1. Chaque client tire une requête selon WORKLOAD_MIX et vide le curseur
+2. Latence par requête (percentiles + histogramme), erreurs et timeouts
+3. Débit global (ops/s) pour N = 1, 2, 4, ... clients
+4. Avec les index du catalogue, puis sans index (hint $natural, rien n'est supprimé)
+5. Sauvegarde de la courbe de montée en charge dans results/load
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from pymongo.errors import ExecutionTimeout, PyMongoError
+from src.logger import logger
+from src.benchmarks.benchmarks_app import (
+    KEEP_CREATED_INDEXES, SLOW_QUERY_CANDIDATES, collection, ensure_index, open_cursor, restore_indexes,
+    snapshot_indexes,
+)
+from src.benchmarks.stats import summarize
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "load"))
+
+# Poids relatifs des requêtes (les lookups du dashboard dominent, les scans lourds sont rares)
+WORKLOAD_MIX = {
+    "q1_simple_outlier": 1,
+    "q2_simple_sort": 1,
+    "q3_simple_lookup": 4,
+    "q4_hashed_license": 1,
+    "q5_hashed_puloc": 2,
+    "q6_compound_esr_sort": 4,
+    "q7_compound_covered": 2,
+    "q8_compound_multi_filter": 4,
+    "q9_compound_date_sort": 1,
+    "q10_complex_user_request": 2,
+}
+CLIENT_COUNTS = (1, 2, 4, 8, 16)
+DURATION_S = 30
+# Une opération plus longue compte comme timeout
+OP_MAX_TIME_MS = 30_000
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def _weighted_candidates(mix, candidates=SLOW_QUERY_CANDIDATES):
+    by_name = {c["name"]: c for c in candidates}
+    names = [name for name in mix if name in by_name]
+    return [by_name[name] for name in names], [mix[name] for name in names]
+
+
+def _without_indexes(candidate):
+    """Force a collection scan without touching the indexes."""
+    return dict(candidate, hint={"$natural": 1})
+
+
+def _client(coll, candidates, weights, state, latencies, seed):
+    rng = random.Random(seed)
+    while True:
+        with state["lock"]:
+            if state["max_ops"] and state["issued"] >= state["max_ops"]:
+                return
+            state["issued"] += 1
+        if time.perf_counter() >= state["deadline"]:
+            return
+
+        candidate = rng.choices(candidates, weights)[0]
+        start = time.perf_counter()
+        try:
+            for _ in open_cursor(candidate, coll):
+                pass
+            outcome = "ok"
+        except ExecutionTimeout:
+            outcome = "timeout"
+        except PyMongoError as e:
+            outcome = "error"
+            logger.error(f"load_generator : {candidate['name']} failed: {e}")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with state["lock"]:
+            latencies.setdefault(candidate["name"], []).append((outcome, elapsed_ms))
+
+
+def latency_histogram(values):
+    """Counts per latency bucket (ms), last bucket = above the highest bound."""
+    edges = (0,) + LATENCY_BUCKETS_MS + (float("inf"),)
+    counts, _ = np.histogram(values, bins=edges)
+    return {f"<={bound}" if bound != float("inf") else f">{LATENCY_BUCKETS_MS[-1]}": int(c)
+            for bound, c in zip(edges[1:], counts)}
+
+
+def run_load(clients, coll=collection, mix=WORKLOAD_MIX, duration_s=DURATION_S, operations=None,
+             use_indexes=True, seed=0):
+    """Run `clients` concurrent clients for duration_s seconds (or `operations` operations)."""
+    candidates, weights = _weighted_candidates(mix)
+    candidates = [dict(c, maxTimeMS=OP_MAX_TIME_MS) for c in candidates]
+    if not use_indexes:
+        candidates = [_without_indexes(c) for c in candidates]
+
+    state = {"lock": threading.Lock(), "issued": 0, "max_ops": operations,
+             "deadline": float("inf")}
+    latencies = {}
+    threads = [threading.Thread(target=_client, name=f"client-{i}",
+                                args=(coll, candidates, weights, state, latencies, seed + i))
+               for i in range(clients)]
+
+    start = time.perf_counter()
+    state["deadline"] = start + duration_s if duration_s else float("inf")
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    per_query, total_ok, total_errors, total_timeouts = {}, 0, 0, 0
+    for name, ops in latencies.items():
+        ok = [ms for outcome, ms in ops if outcome == "ok"]
+        errors = sum(1 for outcome, _ in ops if outcome == "error")
+        timeouts = sum(1 for outcome, _ in ops if outcome == "timeout")
+        per_query[name] = {
+            "operations": len(ops),
+            "errors": errors,
+            "timeouts": timeouts,
+            "latency_ms": summarize(ok),
+            "histogram": latency_histogram(ok),
+        }
+        total_ok += len(ok)
+        total_errors += errors
+        total_timeouts += timeouts
+
+    result = {
+        "clients": clients,
+        "use_indexes": use_indexes,
+        "elapsed_s": elapsed,
+        "operations": total_ok + total_errors + total_timeouts,
+        "ops_per_s": total_ok / elapsed if elapsed else 0.0,
+        "errors": total_errors,
+        "timeouts": total_timeouts,
+        "queries": per_query,
+    }
+    logger.info(f"→ {clients} client(s), indexes={use_indexes}: {result['ops_per_s']:.1f} ops/s, "
+                f"{total_errors} errors, {total_timeouts} timeouts")
+    return result
+
+
+def ensure_catalog_indexes(created, coll=collection, candidates=SLOW_QUERY_CANDIDATES):
+    """Make the catalog indexes under test usable; the names of those built are appended to `created`."""
+    for candidate in candidates:
+        name, was_created, _ = ensure_index(candidate["index"], coll)
+        if was_created:
+            created.append(name)
+
+
+def run_scaling_curve(coll=collection, client_counts=CLIENT_COUNTS, duration_s=DURATION_S, operations=None,
+                      mix=WORKLOAD_MIX, keep_created=KEEP_CREATED_INDEXES):
+    """Throughput vs number of clients, with and without the catalog indexes; saved in results/load."""
+    report = {"collection": coll.name, "mix": mix, "duration_s": duration_s, "operations": operations, "runs": []}
+    snapshot = snapshot_indexes(coll)
+    created = []
+    try:
+        ensure_catalog_indexes(created, coll)
+        for use_indexes in (True, False):
+            for clients in client_counts:
+                report["runs"].append(run_load(clients, coll, mix, duration_s, operations, use_indexes))
+    finally:
+        # Index créés ou démasqués pour la charge : état d'origine restauré
+        restore_indexes(snapshot, created, coll, keep_created=keep_created)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(RESULTS_DIR, f"scaling_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    logger.info(f"✔ Saved load scaling curve → {path}")
+    return report
+
+
+if __name__ == "__main__":
+    # python -m src.benchmarks.load_generator [duration_s]
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else DURATION_S
+    logger.info("===== STARTING LOAD GENERATOR =====")
+    run_scaling_curve(duration_s=duration)
+    logger.info("===== FINISHED =====")
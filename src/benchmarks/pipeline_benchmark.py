@@ -0,0 +1,133 @@
+"""
+Staged vs Direct Pipeline Benchmark
+-----------------------------------
+
+Compare les deux modes de runApplication :
+- staged : Parquet -> nettoyage -> NDJSON sur disque -> relecture -> import
+- direct : Parquet -> nettoyage -> import, sans fichier intermédiaire
+
+Pour chaque mode : temps total, octets lus/écrits sur disque par le processus
+(/proc/self/io, sinon blocs de getrusage) et taille des artefacts intermédiaires.
+Les I/O du mongod (autre processus) ne sont pas comptées : elles sont
+identiques dans les deux modes.
+
+Le mode staged importe avec un seul écrivain séquentiel : le direct est donc
+mesuré deux fois, avec un worker par étage (effet de la suppression des fichiers
+intermédiaires seule) puis avec ses options de concurrence (effet des workers).
+Les options de chaque mode sont enregistrées dans le rapport.
+"""
+
+import json
+import os
+import resource
+import shutil
+import time
+from datetime import datetime
+from src.logger import logger
+from src.ingest_scheduler import drop_collection_with_rollups
+from src.mongo_import import connect_to_mongo
+from src import runApplication
+from src.stage_cache import StageCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "pipeline"))
+STAGING_DIR = "data/cache/bench_staged"
+
+
+def read_process_io():
+    """Return cumulative disk bytes read/written by this process."""
+    try:
+        with open("/proc/self/io", encoding="utf-8") as f:
+            io = dict(line.strip().split(": ") for line in f if ": " in line)
+        return {"read_bytes": int(io["read_bytes"]), "write_bytes": int(io["write_bytes"])}
+    except (OSError, KeyError):
+        # Hors Linux : blocs de 512 octets comptés par getrusage
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {"read_bytes": usage.ru_inblock * 512, "write_bytes": usage.ru_oublock * 512}
+
+
+def measure(run):
+    """Run a callable and return its wall time and disk I/O delta."""
+    io_before = read_process_io()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    io_after = read_process_io()
+    return {
+        "wall_s": elapsed,
+        "disk_read_bytes": io_after["read_bytes"] - io_before["read_bytes"],
+        "disk_write_bytes": io_after["write_bytes"] - io_before["write_bytes"],
+    }
+
+
+def _run_direct(db, input_path, collection_name, options, layout, rollups):
+    drop_collection_with_rollups(db, collection_name, rollups)
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+    cache = StageCache(STAGING_DIR)
+    direct = measure(lambda: runApplication.run_direct_pipeline(input_path, collection_name, db.name, layout, rollups,
+                                                                options=options, cache=cache))
+    direct.update(options=options, staging_bytes=0, documents=db[collection_name].estimated_document_count())
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+    return direct
+
+
+def compare_pipeline_modes(input_path=runApplication.INPUT_PATH, db_name=runApplication.DB_NAME,
+                           collection_name=runApplication.COLLECTION_NAME, layout=runApplication.STORAGE_LAYOUT,
+                           rollups=runApplication.MAINTAIN_ROLLUPS, options=None):
+    """
+    Run the staged and the direct pipeline into scratch collections and save the comparison.
+    Les collections de test sont <collection_name>_bench_staged / _bench_direct.
+    """
+    options = options or runApplication.DIRECT_OPTIONS
+    db = connect_to_mongo(db_name)
+    report = {"input_path": input_path, "input_bytes": os.path.getsize(input_path), "db": db_name,
+              "layout": layout, "rollups": rollups, "modes": {}}
+
+    # --- staged : cache vide pour forcer nettoyage + conversion ---
+    staged_collection = f"{collection_name}_bench_staged"
+    drop_collection_with_rollups(db, staged_collection, rollups)
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+    cache = StageCache(STAGING_DIR)
+    staged = measure(lambda: runApplication.run_staged_pipeline(input_path, staged_collection, cache=cache,
+                                                                db_name=db_name, layout=layout, rollups=rollups))
+    # Nettoyage pandas puis import séquentiel : un seul worker par étape
+    staged["options"] = {"clean_workers": 1, "insert_workers": 1}
+    staged["staging_bytes"] = sum(size for _, size, _ in cache.entries())
+    staged["documents"] = db[staged_collection].estimated_document_count()
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+    report["modes"]["staged"] = staged
+    logger.info(f"→ staged: {staged['wall_s']:.1f}s, {staged['disk_write_bytes'] / 1e9:.2f} GB written")
+
+    # --- direct, un worker par étage puis avec les options de concurrence ---
+    direct_collection = f"{collection_name}_bench_direct"
+    sequential = dict(options, clean_workers=1, serialize_workers=1, insert_workers=1)
+    for mode, mode_options in (("direct_sequential", sequential), ("direct", options)):
+        report["modes"][mode] = direct = _run_direct(db, input_path, direct_collection, mode_options, layout, rollups)
+        logger.info(f"→ {mode}: {direct['wall_s']:.1f}s, {direct['disk_write_bytes'] / 1e9:.2f} GB written")
+
+    def ratio(slow, fast):
+        fast_s = report["modes"][fast]["wall_s"]
+        return report["modes"][slow]["wall_s"] / fast_s if fast_s else None
+
+    # Suppression des fichiers intermédiaires à concurrence égale, puis gain des workers
+    report["staging_speedup"] = ratio("staged", "direct_sequential")
+    report["concurrency_speedup"] = ratio("direct_sequential", "direct")
+    report["speedup"] = ratio("staged", "direct")
+
+    for scratch in (staged_collection, direct_collection):
+        drop_collection_with_rollups(db, scratch, rollups)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(RESULTS_DIR, f"staged_vs_direct_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    logger.info(f"✔ Saved pipeline comparison → {path}")
+    return report
+
+
+if __name__ == "__main__":
+    logger.info("===== STARTING STAGED VS DIRECT PIPELINE BENCHMARK =====")
+    compare_pipeline_modes()
+    logger.info("===== FINISHED =====")
@@ -0,0 +1,232 @@
+"""
+Parametrized Query Templates
+----------------------------
+
+Chaque requête du catalogue teste une seule valeur (PULocationID: 132,
+dispatching_base_num: "B02800", trip_time >= 4000). Le gain d'un index dépend
+surtout de la sélectivité : ici chaque template est exécuté sur de nombreuses
+valeurs tirées de la distribution réelle du champ :
+
+- uniform   : valeurs distinctes tirées uniformément
+- quantiles : valeurs aux quantiles de fréquence (rares -> fréquentes),
+              ou seuils aux quantiles de la distribution pour les plages
+- extremes  : valeurs les plus rares / les plus fréquentes, ou min / max
+
+Pour chaque valeur : latence avec l'index (hint) et en COLLSCAN (hint $natural),
+en fonction du nombre de documents renvoyés. Le graphique montre à partir de
+quelle taille de résultat l'index ne paie plus.
+"""
+
+import json
+import os
+import random
+import sys
+from datetime import datetime
+import plotly.graph_objects as go
+from src.logger import logger
+from src.benchmarks.benchmarks_app import (
+    benchmark_query, collection, ensure_index, snapshot_indexes, restore_indexes,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "templates"))
+
+VALUE = "__value__"
+
+QUERY_TEMPLATES = [
+    {
+        "name": "t_puloc_eq",
+        "field": "PULocationID",
+        "kind": "equality",
+        "query": {"PULocationID": VALUE},
+        "index": {"PULocationID": 1},
+    },
+    {
+        "name": "t_base_eq",
+        "field": "dispatching_base_num",
+        "kind": "equality",
+        "query": {"dispatching_base_num": VALUE},
+        "index": {"dispatching_base_num": 1},
+    },
+    {
+        "name": "t_trip_time_gte",
+        "field": "trip_time",
+        "kind": "range",
+        "query": {"trip_time": {"$gte": VALUE}},
+        "index": {"trip_time": 1},
+    },
+    {
+        "name": "t_trip_miles_gte_sort",
+        "field": "trip_miles",
+        "kind": "range",
+        "query": {"trip_miles": {"$gte": VALUE}},
+        "sort": {"trip_miles": -1},
+        "index": {"trip_miles": 1},
+    },
+]
+
+STRATEGIES = ("uniform", "quantiles", "extremes")
+VALUES_PER_STRATEGY = 8
+TEMPLATE_WARMUP = 1
+TEMPLATE_TRIALS = 3
+
+
+# -------------------------------------------------------------------
+# 1 — Distribution des valeurs et échantillonnage
+# -------------------------------------------------------------------
+def value_distribution(field, coll=collection):
+    """[(value, count), ...] sorted by value, from one $group pass."""
+    pipeline = [
+        {"$group": {"_id": f"${field}", "n": {"$sum": 1}}},
+        {"$match": {"_id": {"$ne": None}}},
+        {"$sort": {"_id": 1}},
+    ]
+    return [(d["_id"], d["n"]) for d in coll.aggregate(pipeline, allowDiskUse=True)]
+
+
+def _quantile_positions(k):
+    return [i / (k - 1) for i in range(k)] if k > 1 else [0.5]
+
+
+def sample_values(distribution, kind, strategy, k=VALUES_PER_STRATEGY, seed=0):
+    """Pick k parameter values from a (value, count) distribution."""
+    if not distribution:
+        return []
+    values = [v for v, _ in distribution]
+
+    if strategy == "uniform":
+        rng = random.Random(seed)
+        return sorted(rng.sample(values, min(k, len(values))), key=values.index)
+
+    if kind == "equality":
+        # Valeurs classées de la plus rare à la plus fréquente
+        by_frequency = [v for v, _ in sorted(distribution, key=lambda item: item[1])]
+        if strategy == "extremes":
+            half = max(1, k // 2)
+            return list(dict.fromkeys(by_frequency[:half] + by_frequency[-half:]))
+        positions = _quantile_positions(k)
+        return list(dict.fromkeys(by_frequency[round(p * (len(by_frequency) - 1))] for p in positions))
+
+    # Plage ($gte) : seuils aux quantiles de la distribution pondérée par les effectifs
+    if strategy == "extremes":
+        return list(dict.fromkeys([values[0], values[-1]]))
+    total = sum(n for _, n in distribution)
+    thresholds, cumulative, positions = [], 0, iter(_quantile_positions(k))
+    target = next(positions)
+    for value, n in distribution:
+        cumulative += n
+        while target is not None and cumulative >= target * total:
+            thresholds.append(value)
+            target = next(positions, None)
+    return list(dict.fromkeys(thresholds))
+
+
+def instantiate(template, value):
+    """Replace the VALUE placeholder in the template's query."""
+    def fill(node):
+        if isinstance(node, dict):
+            return {k: fill(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [fill(v) for v in node]
+        return value if node == VALUE else node
+
+    candidate = {k: v for k, v in template.items() if k not in ("field", "kind")}
+    candidate["name"] = f"{template['name']}={value}"
+    candidate["query"] = fill(template["query"])
+    return candidate
+
+
+# -------------------------------------------------------------------
+# 2 — Exécution
+# -------------------------------------------------------------------
+def _measure(candidate, coll):
+    result = benchmark_query(candidate, coll, warmup=TEMPLATE_WARMUP, trials=TEMPLATE_TRIALS, client_runs=0)
+    return result["executionTimeMillis"], result["nReturned"]
+
+
+def run_template(template, coll=collection, strategies=STRATEGIES, k=VALUES_PER_STRATEGY):
+    """Run one template over sampled values, with the index and as a COLLSCAN."""
+    distribution = value_distribution(template["field"], coll)
+    logger.info(f"→ {template['name']}: {len(distribution)} distinct values of {template['field']}")
+
+    rows = []
+    for strategy in strategies:
+        for value in sample_values(distribution, template["kind"], strategy, k):
+            candidate = instantiate(template, value)
+            with_index_ms, n_returned = _measure(dict(candidate, hint=template["index"]), coll)
+            collscan_ms, _ = _measure(dict(candidate, hint={"$natural": 1}), coll)
+            rows.append({
+                "template": template["name"],
+                "strategy": strategy,
+                "value": value,
+                "nReturned": n_returned,
+                "selectivity": n_returned / sum(n for _, n in distribution) if distribution else None,
+                "indexMillis": with_index_ms,
+                "collscanMillis": collscan_ms,
+            })
+            logger.info(f"  {strategy:<9} {template['field']}={value}: {n_returned} docs, "
+                        f"index {with_index_ms} ms vs collscan {collscan_ms} ms")
+    return rows
+
+
+def break_even(rows):
+    """Smallest result size at which the index is no faster than the COLLSCAN (None if never)."""
+    losing = [r["nReturned"] for r in rows
+              if r["indexMillis"] is not None and r["collscanMillis"] is not None
+              and r["indexMillis"] >= r["collscanMillis"]]
+    return min(losing) if losing else None
+
+
+def plot_latency_vs_size(rows, path):
+    """Latency vs result-set size, one index / collscan pair of traces per template."""
+    fig = go.Figure()
+    for template in dict.fromkeys(r["template"] for r in rows):
+        points = sorted((r for r in rows if r["template"] == template), key=lambda r: r["nReturned"] or 0)
+        x = [r["nReturned"] for r in points]
+        fig.add_trace(go.Scatter(x=x, y=[r["indexMillis"] for r in points], mode="lines+markers",
+                                 name=f"{template} (index)"))
+        fig.add_trace(go.Scatter(x=x, y=[r["collscanMillis"] for r in points], mode="lines+markers",
+                                 name=f"{template} (collscan)", line={"dash": "dash"}))
+    fig.update_layout(title="Latency vs result-set size", xaxis_title="documents returned",
+                      yaxis_title="executionTimeMillis (warm median)", xaxis_type="log", yaxis_type="log")
+    fig.write_html(path)
+    return path
+
+
+def run_query_templates(coll=collection, templates=QUERY_TEMPLATES):
+    """Run every template, save the measurements and the latency/size chart in results/templates."""
+    snapshot = snapshot_indexes(coll)
+    created, rows = [], []
+    try:
+        for template in templates:
+            index_name, was_created, _ = ensure_index(template["index"], coll)
+            if was_created:
+                created.append(index_name)
+            rows.extend(run_template(template, coll))
+    finally:
+        restore_indexes(snapshot, created, coll)
+
+    report = {
+        "collection": coll.name,
+        "templates": {t["name"]: {"break_even_nReturned": break_even([r for r in rows if r["template"] == t["name"]])}
+                      for t in templates},
+        "measurements": rows,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(RESULTS_DIR, f"templates_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, default=str)
+    chart = plot_latency_vs_size(rows, os.path.join(RESULTS_DIR, f"templates_{timestamp}.html"))
+
+    logger.info(f"✔ Saved template results → {path} (chart → {chart})")
+    return report
+
+
+if __name__ == "__main__":
+    # python -m src.benchmarks.query_templates [template_name ...]
+    names = sys.argv[1:]
+    selected = [t for t in QUERY_TEMPLATES if not names or t["name"] in names]
+    logger.info("===== STARTING QUERY TEMPLATES =====")
+    run_query_templates(templates=selected)
+    logger.info("===== FINISHED =====")
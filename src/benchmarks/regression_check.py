@@ -0,0 +1,299 @@
+"""
+Benchmark Regression Check
+--------------------------
+
+Compare un run de benchmark (fichiers <query>_<timestamp>.json de
+results/benchmarking) à un run de référence épinglé (results/baseline) :
+
+Un run = les fichiers portant le même run_id (écrit par save_metrics) ; par
+défaut le plus récent, ou celui donné par --run-id. Les anciens fichiers sans
+run_id ne sont utilisés que si aucun fichier n'en a (dernier fichier par requête).
+
+1. `pin`   : copie les fichiers d'un run dans le dossier de référence
+2. `check` : pour chaque requête et chaque phase (before / after)
+   - latence : test de Mann-Whitney sur les échantillons warm + tolérance relative
+     et absolue sur la médiane (un run sans échantillons n'a que la tolérance)
+   - totalKeysExamined / totalDocsExamined : tolérance relative
+   - plan gagnant : indexName ou planStages différents
+   - requête de la référence absente du run (ignorée car FAST, plantage...) : échec,
+     sauf avec --allow-missing
+3. Affiche un diff lisible, sauvegarde le rapport dans results/regression
+   et renvoie un code de sortie non nul en cas de régression, de changement de plan
+   ou de requête manquante
+
+    python -m src.benchmarks.regression_check pin [--run-id ID]
+    python -m src.benchmarks.regression_check check [--baseline DIR] [--current DIR] [--run-id ID] [--allow-missing]
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+from datetime import datetime
+from src.logger import logger
+from src.benchmarks.stats import mann_whitney_u
+from src.benchmarks.explain_utils import plan_stages
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CURRENT_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "benchmarking"))
+BASELINE_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "baseline"))
+RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "regression"))
+
+# Régression de latence : significative (p < ALPHA) ET au-delà des deux tolérances
+ALPHA = 0.05
+LATENCY_TOLERANCE_PCT = 10.0
+LATENCY_TOLERANCE_MS = 5.0
+EXAMINED_TOLERANCE_PCT = 10.0
+PHASES = ("before", "after")
+
+RUN_FILE_RE = re.compile(r"^(?P<query>.+)_(?P<timestamp>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.json$")
+
+
+# -------------------------------------------------------------------
+# 1 — Chargement des runs
+# -------------------------------------------------------------------
+def _run_id(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("run_id")
+
+
+def run_files(directory, run_id=None):
+    """{query_name: path} of one run in `directory`: `run_id`, or the most recent run by default."""
+    runs = {}  # run_id -> {query: (timestamp, path)}
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        match = RUN_FILE_RE.match(os.path.basename(path))
+        if not match:
+            continue
+        query, timestamp = match.group("query"), match.group("timestamp")
+        files = runs.setdefault(_run_id(path), {})
+        if query not in files or timestamp > files[query][0]:
+            files[query] = (timestamp, path)
+    if not runs:
+        return {}
+
+    if run_id is None:
+        identified = [r for r in runs if r is not None]
+        if identified:
+            run_id = max(identified, key=lambda r: max(timestamp for timestamp, _ in runs[r].values()))
+        else:
+            logger.warning(f"run_files() : no run_id in {directory}, using the newest file of each query")
+    if run_id not in runs:
+        raise FileNotFoundError(f"No result of run {run_id} in {directory}")
+    return {query: path for query, (_, path) in runs[run_id].items()}
+
+
+def load_run(directory, run_id=None):
+    run = {}
+    for query, path in run_files(directory, run_id).items():
+        with open(path, "r", encoding="utf-8") as f:
+            run[query] = json.load(f)
+        run[query]["_file"] = os.path.basename(path)
+    return run
+
+
+def pin_baseline(source=CURRENT_DIR, baseline=BASELINE_DIR, run_id=None):
+    """Replace the baseline with the files of one run of `source` (the most recent by default)."""
+    files = run_files(source, run_id)
+    if not files:
+        raise FileNotFoundError(f"No benchmark result in {source}")
+    if os.path.isdir(baseline):
+        shutil.rmtree(baseline)
+    os.makedirs(baseline)
+    for path in files.values():
+        shutil.copy2(path, baseline)
+    logger.info(f"📌 Pinned {len(files)} queries from {source} → {baseline}")
+    return files
+
+
+# -------------------------------------------------------------------
+# 2 — Comparaison
+# -------------------------------------------------------------------
+def _samples(phase):
+    samples = (phase.get("warm") or {}).get("samples")
+    if samples:
+        return samples
+    # Anciens runs : un seul explain
+    return [phase["executionTimeMillis"]] if phase.get("executionTimeMillis") is not None else []
+
+
+def _pct_change(current, baseline):
+    if current is None or baseline is None:
+        return None
+    if baseline == 0:
+        return 0.0 if current == 0 else float("inf")
+    return (current - baseline) / baseline * 100
+
+
+def compare_latency(current, baseline, alpha=ALPHA, tolerance_pct=LATENCY_TOLERANCE_PCT,
+                    tolerance_ms=LATENCY_TOLERANCE_MS):
+    cur, base = _samples(current), _samples(baseline)
+    cur_median, base_median = current.get("executionTimeMillis"), baseline.get("executionTimeMillis")
+    change_pct = _pct_change(cur_median, base_median)
+    beyond_tolerance = (change_pct is not None and change_pct > tolerance_pct
+                        and cur_median - base_median > tolerance_ms)
+    testable = len(cur) > 1 and len(base) > 1
+    test = mann_whitney_u(cur, base) if testable else None
+    significant = test["p_value"] < alpha if testable else True
+    return {
+        "baselineMillis": base_median,
+        "currentMillis": cur_median,
+        "changePct": change_pct,
+        "pValue": test["p_value"] if test else None,
+        "tested": testable,
+        "regressed": bool(beyond_tolerance and significant),
+    }
+
+
+def compare_examined(current, baseline, tolerance_pct=EXAMINED_TOLERANCE_PCT):
+    result = {}
+    for key in ("totalKeysExamined", "totalDocsExamined"):
+        change = _pct_change(current.get(key), baseline.get(key))
+        result[key] = {
+            "baseline": baseline.get(key),
+            "current": current.get(key),
+            "changePct": change,
+            "regressed": change is not None and change > tolerance_pct,
+        }
+    return result
+
+
+def plan_of(phase):
+    """indexName / planStages of a phase; older runs only stored the executionStages tree."""
+    if phase.get("planStages") is not None:
+        return {"indexName": phase.get("indexName"), "planStages": phase["planStages"]}
+    stages, index_name = plan_stages(phase.get("executionStages"))
+    return {"indexName": phase.get("indexName", index_name), "planStages": stages or None}
+
+
+def compare_plan(current, baseline):
+    base_plan, cur_plan = plan_of(baseline), plan_of(current)
+    # Anciens runs sans planStages : on ne compare que ce qui existe des deux côtés
+    changed = any(base_plan[k] is not None and cur_plan[k] is not None and base_plan[k] != cur_plan[k]
+                  for k in base_plan)
+    return {"baseline": base_plan, "current": cur_plan, "changed": changed}
+
+
+def compare_runs(current_run, baseline_run, allow_missing=False, **tolerances):
+    """Per-query, per-phase comparison of two runs; baseline queries missing from the current run fail."""
+    report = {"queries": {}, "missing": sorted(set(baseline_run) - set(current_run)),
+              "new": sorted(set(current_run) - set(baseline_run))}
+    for query in sorted(set(current_run) & set(baseline_run)):
+        entry = {"baselineFile": baseline_run[query]["_file"], "currentFile": current_run[query]["_file"]}
+        for phase in PHASES:
+            cur = current_run[query].get("results", {}).get(phase)
+            base = baseline_run[query].get("results", {}).get(phase)
+            if cur is None or base is None:
+                continue
+            latency = compare_latency(cur, base, **tolerances)
+            examined = compare_examined(cur, base)
+            plan = compare_plan(cur, base)
+            entry[phase] = {
+                # Latences comparées entre modes de cache différents (cf. cache_state.py) : à lire avec prudence
+                "cacheMode": {"baseline": base.get("cacheMode"), "current": cur.get("cacheMode")},
+                "latency": latency,
+                "examined": examined,
+                "plan": plan,
+                "failed": latency["regressed"] or plan["changed"] or any(e["regressed"] for e in examined.values()),
+            }
+        entry["failed"] = any(entry.get(p, {}).get("failed") for p in PHASES)
+        report["queries"][query] = entry
+    report["failed"] = sorted(q for q, e in report["queries"].items() if e["failed"])
+    if not allow_missing:
+        report["failed"] = sorted(report["failed"] + report["missing"])
+    return report
+
+
+# -------------------------------------------------------------------
+# 3 — Diff lisible
+# -------------------------------------------------------------------
+def _fmt_pct(value):
+    return "n/a" if value is None else f"{value:+.1f}%"
+
+
+def format_diff(report):
+    lines = []
+    for query, entry in report["queries"].items():
+        status = "REGRESSED" if entry["failed"] else "ok"
+        lines.append(f"{'✖' if entry['failed'] else '✔'} {query}: {status}")
+        for phase in PHASES:
+            if phase not in entry:
+                continue
+            comparison = entry[phase]
+            latency = comparison["latency"]
+            p_value = "n/a" if latency["pValue"] is None else f"{latency['pValue']:.4f}"
+            mark = " ← regression" if latency["regressed"] else ""
+            lines.append(f"    {phase:<6} latency  {latency['baselineMillis']} → {latency['currentMillis']} ms "
+                         f"({_fmt_pct(latency['changePct'])}, p={p_value}){mark}")
+            modes = comparison["cacheMode"]
+            if modes["baseline"] != modes["current"]:
+                lines.append(f"    {phase:<6} cache mode {modes['baseline']} → {modes['current']} (latencies not comparable)")
+            for key, examined in comparison["examined"].items():
+                if examined["baseline"] != examined["current"]:
+                    mark = " ← regression" if examined["regressed"] else ""
+                    lines.append(f"    {phase:<6} {key:<18} {examined['baseline']} → {examined['current']} "
+                                 f"({_fmt_pct(examined['changePct'])}){mark}")
+            if comparison["plan"]["changed"]:
+                base, cur = comparison["plan"]["baseline"], comparison["plan"]["current"]
+                lines.append(f"    {phase:<6} plan     {base['indexName']} {base['planStages']} → "
+                             f"{cur['indexName']} {cur['planStages']} ← plan changed")
+    for query in report["missing"]:
+        mark = "?" if query not in report.get("failed", []) else "✖"
+        lines.append(f"{mark} {query}: in baseline, missing from current run")
+    for query in report["new"]:
+        lines.append(f"+ {query}: new query, no baseline")
+    return "\n".join(lines)
+
+
+def run_regression_check(baseline=BASELINE_DIR, current=CURRENT_DIR, run_id=None, allow_missing=False,
+                         **tolerances):
+    """Compare one run of `current` with the pinned `baseline`, save the report and return it."""
+    baseline_run, current_run = load_run(baseline), load_run(current, run_id)
+    if not baseline_run:
+        raise FileNotFoundError(f"No pinned baseline in {baseline}: run `regression_check pin` first.")
+    report = compare_runs(current_run, baseline_run, allow_missing, **tolerances)
+    report.update({"baseline": baseline, "current": current, "tolerances": tolerances, "allowMissing": allow_missing,
+                   "runId": next((r.get("run_id") for r in current_run.values()), None)})
+
+    print(format_diff(report))
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(RESULTS_DIR, f"regression_check_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, default=str)
+    logger.info(f"✔ Saved regression report → {path}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare benchmark results with a pinned baseline.")
+    parser.add_argument("command", choices=["pin", "check"])
+    parser.add_argument("--baseline", default=BASELINE_DIR, help="pinned baseline directory")
+    parser.add_argument("--current", default=CURRENT_DIR, help="directory of the run to check / to pin")
+    parser.add_argument("--run-id", help="run to check / to pin (default: the most recent run)")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="do not fail on baseline queries missing from the checked run")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="significance level of the Mann-Whitney test")
+    parser.add_argument("--tolerance-pct", type=float, default=LATENCY_TOLERANCE_PCT,
+                        help="allowed increase of the median latency (%%)")
+    parser.add_argument("--tolerance-ms", type=float, default=LATENCY_TOLERANCE_MS,
+                        help="allowed increase of the median latency (ms)")
+    args = parser.parse_args(argv)
+
+    if args.command == "pin":
+        pin_baseline(args.current, args.baseline, args.run_id)
+        return 0
+
+    report = run_regression_check(args.baseline, args.current, args.run_id, args.allow_missing, alpha=args.alpha,
+                                  tolerance_pct=args.tolerance_pct, tolerance_ms=args.tolerance_ms)
+    if report["failed"]:
+        logger.error(f"✖ {len(report['failed'])} queries regressed, changed plan or are missing: {', '.join(report['failed'])}")
+        return 1
+    logger.info("✔ No regression against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""
+Benchmark Results Store (SQLite)
+--------------------------------
+
+Tous les runs de benchmark sont ajoutés à une seule base SQLite
+(results/results.db) au lieu d'être retrouvés par os.listdir + regex :
+
+- runs          : run_id, date, source (benchmarking / aggregation / sharding),
+                  empreinte de l'environnement (serveur, machine, Python)
+- query_results : une ligne par requête et par run (index testé, fichier JSON
+                  d'origine, document complet pour le dashboard)
+- phase_metrics : résumé before / after (latence, keys/docs examinés, plan)
+- trials        : une ligne par essai warm
+
+Index sur (query_name, created_at) et (run_id) : historique d'une requête
+en quelques millisecondes. import_json_results() importe les fichiers JSON
+existants de results/benchmarking et results/sharding (idempotent).
+"""
+
+import glob
+import hashlib
+import json
+import os
+import platform
+import re
+import sqlite3
+import sys
+import uuid
+from datetime import datetime
+from src.benchmarks.explain_utils import plan_stages
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_ROOT = os.path.abspath(os.path.join(BASE_DIR, "../..", "results"))
+STORE_PATH = os.path.join(RESULTS_ROOT, "results.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    source TEXT NOT NULL,
+    env_fingerprint TEXT NOT NULL,
+    env_json TEXT
+);
+CREATE TABLE IF NOT EXISTS query_results (
+    result_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    query_name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    index_param TEXT,
+    index_type TEXT,
+    source_file TEXT UNIQUE,
+    document TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phase_metrics (
+    result_id INTEGER NOT NULL REFERENCES query_results(result_id),
+    phase TEXT NOT NULL,
+    execution_time_ms REAL,
+    cold_time_ms REAL,
+    p95_ms REAL,
+    keys_examined INTEGER,
+    docs_examined INTEGER,
+    n_returned INTEGER,
+    index_name TEXT,
+    plan_stages TEXT,
+    has_blocking_sort INTEGER,
+    is_covered INTEGER,
+    used_disk INTEGER,
+    cache_mode TEXT,
+    cache_read_bytes INTEGER,
+    PRIMARY KEY (result_id, phase)
+);
+CREATE TABLE IF NOT EXISTS trials (
+    result_id INTEGER NOT NULL REFERENCES query_results(result_id),
+    phase TEXT NOT NULL,
+    trial INTEGER NOT NULL,
+    execution_time_ms REAL,
+    PRIMARY KEY (result_id, phase, trial)
+);
+CREATE INDEX IF NOT EXISTS idx_results_query_time ON query_results(query_name, created_at);
+CREATE INDEX IF NOT EXISTS idx_results_run ON query_results(run_id);
+CREATE INDEX IF NOT EXISTS idx_runs_time ON runs(created_at);
+"""
+
+# Colonnes ajoutées après la création du schéma : ajoutées aux bases existantes à l'ouverture
+MIGRATIONS = {
+    "phase_metrics": [("cache_mode", "TEXT"), ("cache_read_bytes", "INTEGER")],
+}
+
+TIMESTAMP_RE = re.compile(r"_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.json$")
+
+
+def connect(path=STORE_PATH, readonly=False):
+    """Open the store; readonly=True neither creates nor migrates it (lectures du dashboard)."""
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    for table, columns in MIGRATIONS.items():
+        existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, kind in columns:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+    return conn
+
+
+# -------------------------------------------------------------------
+# 1 — Runs et environnement
+# -------------------------------------------------------------------
+def environment(db=None):
+    """Environment of a run: client machine and, when available, the MongoDB server."""
+    env = {
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+    if db is not None:
+        try:
+            info = db.command("buildInfo")
+            status = db.command("serverStatus")
+            env["mongodb"] = info.get("version")
+            env["storageEngine"] = status.get("storageEngine", {}).get("name")
+            env["cacheSizeBytes"] = status.get("wiredTiger", {}).get("cache", {}).get("maximum bytes configured")
+        except Exception:
+            env["mongodb"] = None
+    return env
+
+
+def fingerprint(env):
+    return hashlib.sha256(json.dumps(env, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def start_run(source, db=None, env=None, created_at=None, path=STORE_PATH):
+    """Register a new run and return its run_id."""
+    env = env if env is not None else environment(db)
+    created_at = created_at or datetime.now().isoformat(timespec="seconds")
+    run_id = f"{source}_{created_at.replace(':', '-')}_{uuid.uuid4().hex[:6]}"
+    with connect(path) as conn:
+        conn.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?)",
+                     (run_id, created_at, source, fingerprint(env), json.dumps(env, default=str)))
+    return run_id
+
+
+# -------------------------------------------------------------------
+# 2 — Ajout d'un résultat
+# -------------------------------------------------------------------
+def _phase_row(result_id, phase, metrics):
+    stages = metrics.get("planStages") or plan_stages(metrics.get("executionStages"))[0]
+    warm = metrics.get("warm") or {}
+    return (
+        result_id, phase,
+        metrics.get("executionTimeMillis"),
+        (metrics.get("cold") or {}).get("executionTimeMillis"),
+        warm.get("p95"),
+        metrics.get("totalKeysExamined"),
+        metrics.get("totalDocsExamined"),
+        metrics.get("nReturned"),
+        metrics.get("indexName"),
+        json.dumps(stages),
+        int(metrics["hasBlockingSort"]) if "hasBlockingSort" in metrics else int("SORT" in stages),
+        int(metrics["isCovered"]) if "isCovered" in metrics else None,
+        int(metrics["usedDisk"]) if "usedDisk" in metrics else None,
+        metrics.get("cacheMode"),
+        # Octets lus dans le cache WiredTiger par le run cold (None : run sans relevé)
+        ((metrics.get("cache") or {}).get("cold") or {}).get("bytesReadIntoCache"),
+    )
+
+
+def record_result(data, run_id, source_file=None, created_at=None, path=STORE_PATH):
+    """Append one before/after result document (save_metrics format) to the store."""
+    query_name = data.get("query_name") or os.path.splitext(os.path.basename(source_file or "unknown"))[0]
+    created_at = created_at or datetime.now().isoformat(timespec="seconds")
+    with connect(path) as conn:
+        cursor = conn.execute(
+            "INSERT INTO query_results (run_id, query_name, created_at, index_param, index_type, source_file, document) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run_id, query_name, created_at, json.dumps(data.get("index_param")), data.get("index_type"),
+             source_file and os.path.abspath(source_file), json.dumps(data, default=str)),
+        )
+        result_id = cursor.lastrowid
+        for phase, metrics in (data.get("results") or {}).items():
+            conn.execute(
+                "INSERT INTO phase_metrics (result_id, phase, execution_time_ms, cold_time_ms, p95_ms, keys_examined, "
+                "docs_examined, n_returned, index_name, plan_stages, has_blocking_sort, is_covered, used_disk, "
+                "cache_mode, cache_read_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                _phase_row(result_id, phase, metrics))
+            samples = (metrics.get("warm") or {}).get("samples") or []
+            conn.executemany("INSERT INTO trials VALUES (?, ?, ?, ?)",
+                             [(result_id, phase, i, s) for i, s in enumerate(samples)])
+    return result_id
+
+
+# -------------------------------------------------------------------
+# 3 — Import des fichiers JSON existants
+# -------------------------------------------------------------------
+def _file_time(path):
+    match = TIMESTAMP_RE.search(os.path.basename(path))
+    if match:
+        return datetime.strptime(match.group(1), "%Y-%m-%d_%H-%M-%S").isoformat()
+    return datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds")
+
+
+def import_json_results(sources=("benchmarking", "sharding"), root=RESULTS_ROOT, path=STORE_PATH):
+    """Import before/after JSON files not yet in the store; one run per source directory."""
+    imported = 0
+    with connect(path) as conn:
+        known = {row["source_file"] for row in conn.execute("SELECT source_file FROM query_results")}
+    for source in sources:
+        files = [f for f in sorted(glob.glob(os.path.join(root, source, "*.json")))
+                 if os.path.abspath(f) not in known]
+        documents = []
+        for file in files:
+            with open(file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # execution_time.json & co. : pas au format before / after
+            if isinstance(data, dict) and "results" in data:
+                documents.append((file, data))
+        if not documents:
+            continue
+        run_id = start_run(source, env={"imported_from": source}, created_at=min(_file_time(f) for f, _ in documents),
+                           path=path)
+        for file, data in documents:
+            record_result(data, run_id, source_file=file, created_at=_file_time(file), path=path)
+            imported += 1
+    return imported
+
+
+# -------------------------------------------------------------------
+# 4 — Lectures
+# -------------------------------------------------------------------
+def latest_result(query_prefix, path=STORE_PATH):
+    """Most recent result whose query name starts with `query_prefix`: (source_file, document) or None."""
+    if not os.path.exists(path):
+        return None
+    with connect(path, readonly=True) as conn:
+        # GLOB (sensible à la casse) peut utiliser l'index (query_name, created_at)
+        row = conn.execute(
+            "SELECT source_file, document FROM query_results WHERE query_name GLOB ? "
+            "ORDER BY created_at DESC LIMIT 1",
+            (query_prefix.replace("[", "[[]").replace("*", "[*]").replace("?", "[?]") + "*",),
+        ).fetchone()
+    return (row["source_file"], json.loads(row["document"])) if row else None
+
+
+def query_history(query_name, phase="after", path=STORE_PATH):
+    """[{created_at, run_id, execution_time_ms, ...}, ...] of one query, oldest first."""
+    with connect(path) as conn:
+        rows = conn.execute(
+            "SELECT r.created_at, r.run_id, u.env_fingerprint, p.* FROM query_results r "
+            "JOIN phase_metrics p ON p.result_id = r.result_id JOIN runs u ON u.run_id = r.run_id "
+            "WHERE r.query_name = ? AND p.phase = ? ORDER BY r.created_at",
+            (query_name, phase),
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def trial_samples(result_id, phase, path=STORE_PATH):
+    with connect(path) as conn:
+        rows = conn.execute("SELECT execution_time_ms FROM trials WHERE result_id = ? AND phase = ? ORDER BY trial",
+                            (result_id, phase)).fetchall()
+    return [row[0] for row in rows]
+
+
+if __name__ == "__main__":
+    # python -m src.benchmarks.results_store  → importe les JSON existants
+    count = import_json_results(sys.argv[1:] or ("benchmarking", "sharding"))
+    print(f"Imported {count} result files into {STORE_PATH}")
@@ -0,0 +1,255 @@
+"""
+Sampled-Subset Benchmark & Scaling Curves
+-----------------------------------------
+
+Un cycle before/after complet sur 16M de trips coûte plus d'une minute par
+COLLSCAN. Ce mode donne une estimation en quelques minutes :
+
+1. Matérialise des échantillons emboîtés de la collection (25 % → 5 % → 1 %) :
+   chaque échantillon est tiré ($rand + $out) dans le précédent, donc 1 % ⊂ 5 % ⊂ 25 %
+2. Crée les index du catalogue sur chaque échantillon (temps de build mesuré)
+3. Exécute SLOW_QUERY_CANDIDATES sur chaque taille : BEFORE en COLLSCAN (hint $natural),
+   AFTER avec l'index du candidat (hint)
+4. Ajuste une loi de puissance latence = a · n^b (régression en log-log)
+   et extrapole la latence sur la collection complète
+5. Classe chaque requête : constante, sous-linéaire, linéaire, sur-linéaire
+6. Sauvegarde le rapport et le graphique log-log dans results/scaling
+
+La collection complète (100 %) n'est mesurée qu'avec --full, pour vérifier l'extrapolation.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+import numpy as np
+import plotly.graph_objects as go
+from src.logger import logger
+from src.benchmarks.benchmarks_app import (
+    CACHE_MODE, SLOW_QUERY_CANDIDATES, benchmark_query, collection, ensure_index, restore_indexes,
+    snapshot_indexes,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.abspath(os.path.join(BASE_DIR, "../..", "results", "scaling"))
+
+SAMPLE_FRACTIONS = (0.01, 0.05, 0.25, 1.0)
+SCALING_WARMUP = 1
+SCALING_TRIALS = 3
+# Résolution d'explain : 1 ms ; un 0 ms est ramené à ce plancher avant le passage au log
+MIN_MILLIS = 0.5
+
+# Classement selon l'exposant b de latence ~ n^b
+CONSTANT_MAX_EXPONENT = 0.2
+SUBLINEAR_MAX_EXPONENT = 0.85
+LINEAR_MAX_EXPONENT = 1.15
+
+
+# -------------------------------------------------------------------
+# 1 — Échantillons emboîtés
+# -------------------------------------------------------------------
+def sample_name(coll, fraction):
+    return f"{coll.name}_sample_{fraction * 100:g}pct"
+
+
+def materialize_samples(coll=collection, fractions=SAMPLE_FRACTIONS, refresh=False):
+    """
+    Build the nested samples, largest first: each one is drawn from the previous one.
+    Returns {fraction: collection}; 1.0 is the collection itself. Existing samples are reused.
+    """
+    db = coll.database
+    samples, parent, parent_fraction = {}, coll, 1.0
+    for fraction in sorted(fractions, reverse=True):
+        if fraction >= 1.0:
+            samples[1.0] = coll
+            continue
+        name = sample_name(coll, fraction)
+        if refresh or name not in db.list_collection_names():
+            ratio = fraction / parent_fraction
+            start = time.perf_counter()
+            parent.aggregate([
+                {"$match": {"$expr": {"$lt": [{"$rand": {}}, ratio]}}},
+                {"$out": name},
+            ], allowDiskUse=True)
+            logger.info(f"🧪 Sample {name}: {ratio:.0%} of {parent.name} "
+                        f"({db[name].estimated_document_count()} docs) in {time.perf_counter() - start:.1f} s")
+        samples[fraction] = db[name]
+        parent, parent_fraction = db[name], fraction
+    return samples
+
+
+def drop_samples(coll=collection, fractions=SAMPLE_FRACTIONS):
+    for fraction in fractions:
+        if fraction < 1.0:
+            coll.database.drop_collection(sample_name(coll, fraction))
+
+
+# -------------------------------------------------------------------
+# 2 — Exécution du catalogue sur une taille
+# -------------------------------------------------------------------
+def _measure(candidate, coll, cache_mode):
+    result = benchmark_query(candidate, coll, warmup=SCALING_WARMUP, trials=SCALING_TRIALS,
+                             client_runs=0, cache_mode=cache_mode)
+    return {
+        "executionTimeMillis": result["executionTimeMillis"],
+        "totalDocsExamined": result["totalDocsExamined"],
+        "totalKeysExamined": result["totalKeysExamined"],
+        "nReturned": result["nReturned"],
+        "indexName": result["indexName"],
+    }
+
+
+def run_catalog(coll, candidates=SLOW_QUERY_CANDIDATES, cache_mode=CACHE_MODE):
+    """Before (COLLSCAN) / after (candidate index) of every query on one collection."""
+    n_docs = coll.estimated_document_count()
+    snapshot = snapshot_indexes(coll)
+    created, rows = [], []
+    try:
+        for candidate in candidates:
+            index_name, was_created, build_seconds = ensure_index(candidate["index"], coll)
+            if was_created:
+                created.append(index_name)
+            rows.append({
+                "query_name": candidate["name"],
+                "collection": coll.name,
+                "documents": n_docs,
+                "buildSeconds": build_seconds,
+                "before": _measure(dict(candidate, hint={"$natural": 1}), coll, cache_mode),
+                "after": _measure(dict(candidate, hint=candidate["index"]), coll, cache_mode),
+            })
+            logger.info(f"→ {coll.name} ({n_docs} docs) {candidate['name']}: "
+                        f"{rows[-1]['before']['executionTimeMillis']} → {rows[-1]['after']['executionTimeMillis']} ms")
+    finally:
+        restore_indexes(snapshot, created, coll)
+    return rows
+
+
+# -------------------------------------------------------------------
+# 3 — Ajustement latence ~ taille
+# -------------------------------------------------------------------
+def classify(exponent):
+    if exponent is None:
+        return None
+    if exponent < CONSTANT_MAX_EXPONENT:
+        return "constant"
+    if exponent < SUBLINEAR_MAX_EXPONENT:
+        return "sub-linear"
+    if exponent <= LINEAR_MAX_EXPONENT:
+        return "linear"
+    return "super-linear"
+
+
+def fit_power_law(sizes, latencies, predict_at=None):
+    """Fit latency = a * n^b by least squares on (log n, log latency)."""
+    points = [(n, max(t, MIN_MILLIS)) for n, t in zip(sizes, latencies) if n and t is not None]
+    if len(points) < 2 or len({n for n, _ in points}) < 2:
+        return {"a": None, "exponent": None, "r2": None, "scaling": None, "predictedMillis": None}
+    log_n = np.log([n for n, _ in points])
+    log_t = np.log([t for _, t in points])
+    exponent, intercept = np.polyfit(log_n, log_t, 1)
+    fitted = intercept + exponent * log_n
+    total = np.sum((log_t - log_t.mean()) ** 2)
+    r2 = 1 - np.sum((log_t - fitted) ** 2) / total if total else 1.0
+    return {
+        "a": float(np.exp(intercept)),
+        "exponent": float(exponent),
+        "r2": float(r2),
+        "scaling": classify(float(exponent)),
+        "predictedMillis": float(np.exp(intercept) * predict_at ** exponent) if predict_at else None,
+    }
+
+
+def scaling_curves(rows, full_size, fitted_sizes):
+    """Per query and phase: points, power-law fit from the samples, extrapolation to the full size."""
+    curves = {}
+    for query in dict.fromkeys(r["query_name"] for r in rows):
+        points = sorted((r for r in rows if r["query_name"] == query), key=lambda r: r["documents"])
+        curves[query] = {}
+        for phase in ("before", "after"):
+            used = [r for r in points if r["documents"] in fitted_sizes]
+            fit = fit_power_law([r["documents"] for r in used], [r[phase]["executionTimeMillis"] for r in used],
+                                predict_at=full_size)
+            measured_full = next((r[phase]["executionTimeMillis"] for r in points if r["documents"] == full_size), None)
+            if measured_full and fit["predictedMillis"]:
+                fit["predictionErrorPct"] = (fit["predictedMillis"] - measured_full) / measured_full * 100
+            curves[query][phase] = dict(fit, points=[[r["documents"], r[phase]["executionTimeMillis"]] for r in points],
+                                        measuredFullMillis=measured_full)
+        builds = [r for r in points if r["buildSeconds"] is not None]
+        curves[query]["indexBuild"] = fit_power_law([r["documents"] for r in builds],
+                                                    [r["buildSeconds"] * 1000 for r in builds], predict_at=full_size)
+    return curves
+
+
+def plot_scaling(curves, path):
+    """Log-log latency vs collection size: measured points and fitted curve per query and phase."""
+    fig = go.Figure()
+    for query, phases in curves.items():
+        for phase in ("before", "after"):
+            curve = phases[phase]
+            x = [n for n, _ in curve["points"]]
+            fig.add_trace(go.Scatter(x=x, y=[t for _, t in curve["points"]], mode="markers",
+                                     name=f"{query} {phase}", legendgroup=query))
+            if curve["exponent"] is not None:
+                grid = np.geomspace(min(x), max(x), 20)
+                fig.add_trace(go.Scatter(x=grid, y=curve["a"] * grid ** curve["exponent"], mode="lines",
+                                         name=f"{query} {phase} fit (b={curve['exponent']:.2f})",
+                                         legendgroup=query, line={"dash": "dot" if phase == "before" else "solid"}))
+    fig.update_layout(title="Latency vs collection size (nested samples)", xaxis_title="documents",
+                      yaxis_title="executionTimeMillis (warm median)", xaxis_type="log", yaxis_type="log")
+    fig.write_html(path)
+    return path
+
+
+def run_sample_scaling(coll=collection, fractions=SAMPLE_FRACTIONS, candidates=SLOW_QUERY_CANDIDATES,
+                       measure_full=False, refresh=False, cache_mode=CACHE_MODE):
+    """Run the catalog on the nested samples, fit the scaling curves and save the report."""
+    samples = materialize_samples(coll, fractions, refresh)
+    full_size = coll.estimated_document_count()
+
+    rows = []
+    for fraction in sorted(samples):
+        if fraction >= 1.0 and not measure_full:
+            continue
+        rows.extend(run_catalog(samples[fraction], candidates, cache_mode))
+
+    # L'ajustement n'utilise que les échantillons : la mesure complète (--full) sert à valider l'extrapolation
+    fitted_sizes = {r["documents"] for r in rows if r["collection"] != coll.name}
+    curves = scaling_curves(rows, full_size, fitted_sizes)
+    report = {
+        "collection": coll.name,
+        "fullSize": full_size,
+        "fractions": list(fractions),
+        "cacheMode": cache_mode,
+        "curves": curves,
+        "measurements": rows,
+    }
+    for query, phases in curves.items():
+        after, before = phases["after"], phases["before"]
+        logger.info(f"📈 {query}: before {before['scaling']} (b={before['exponent']}) → ~{before['predictedMillis']} ms, "
+                    f"after {after['scaling']} (b={after['exponent']}) → ~{after['predictedMillis']} ms at {full_size} docs")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = os.path.join(RESULTS_DIR, f"scaling_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, default=str)
+    chart = plot_scaling(curves, os.path.join(RESULTS_DIR, f"scaling_{timestamp}.html"))
+
+    logger.info(f"✔ Saved scaling report → {path} (chart → {chart})")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fast benchmark on nested samples with scaling curves.")
+    parser.add_argument("--full", action="store_true", help="also measure the full collection (validates the fit)")
+    parser.add_argument("--refresh", action="store_true", help="redraw the samples")
+    parser.add_argument("--drop", action="store_true", help="drop the sample collections at the end")
+    parser.add_argument("--cache-mode", default=CACHE_MODE, choices=["default", "warm", "cold"])
+    args = parser.parse_args()
+
+    logger.info("===== STARTING SAMPLE SCALING BENCHMARK =====")
+    run_sample_scaling(measure_full=args.full, refresh=args.refresh, cache_mode=args.cache_mode)
+    if args.drop:
+        drop_samples()
+    logger.info("===== FINISHED =====")
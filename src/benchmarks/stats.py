@@ -0,0 +1,75 @@
+"""
+Statistiques de latence sur des essais répétés
+----------------------------------------------
+
+Une seule mesure d'explain() est bruitée (cache froid, sélection de plan,
+activité du serveur). Ces fonctions résument une série d'essais :
+min / médiane / moyenne / p95 / p99 / écart-type, et un intervalle de
+confiance bootstrap de la médiane. mann_whitney_u compare deux séries
+(test de rang, sans hypothèse de normalité) pour les contrôles de régression.
+"""
+
+import math
+import numpy as np
+
+BOOTSTRAP_RESAMPLES = 2000
+CONFIDENCE = 0.95
+
+
+def bootstrap_ci(samples, statistic=np.median, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE, seed=0):
+    """Percentile bootstrap confidence interval of `statistic` (médiane par défaut)."""
+    values = np.asarray(samples, dtype=float)
+    if len(values) < 2:
+        return [float(values[0]), float(values[0])] if len(values) else [None, None]
+    rng = np.random.default_rng(seed)
+    resampled = rng.choice(values, size=(resamples, len(values)), replace=True)
+    estimates = statistic(resampled, axis=1)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(estimates, [alpha, 1 - alpha])
+    return [float(low), float(high)]
+
+
+def summarize(samples):
+    """Summary statistics of a list of latencies (ms)."""
+    values = np.asarray([s for s in samples if s is not None], dtype=float)
+    if not len(values):
+        return {"n": 0}
+    return {
+        "n": int(len(values)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": float(values.mean()),
+        "median": float(np.median(values)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "stddev": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+        "median_ci95": bootstrap_ci(values),
+    }
+
+
+def mann_whitney_u(current, baseline):
+    """
+    One-sided Mann-Whitney U test: is `current` stochastically greater (slower) than `baseline`?
+
+    Approximation normale avec correction de continuité et des ex aequo.
+    Renvoie {"u", "z", "p_value"} (p_value = 1.0 si le test est impossible).
+    """
+    x = np.asarray([v for v in current if v is not None], dtype=float)
+    y = np.asarray([v for v in baseline if v is not None], dtype=float)
+    n1, n2 = len(x), len(y)
+    if not n1 or not n2:
+        return {"u": None, "z": None, "p_value": 1.0}
+
+    combined = np.concatenate([x, y])
+    ordered = np.sort(combined)
+    # Rang moyen des ex aequo : (premier rang + dernier rang) / 2
+    ranks = (np.searchsorted(ordered, x, "left") + np.searchsorted(ordered, x, "right") + 1) / 2
+    u = float(ranks.sum() - n1 * (n1 + 1) / 2)
+
+    n = n1 + n2
+    _, ties = np.unique(combined, return_counts=True)
+    variance = n1 * n2 / 12 * ((n + 1) - float(np.sum(ties ** 3 - ties)) / (n * (n - 1)))
+    if variance <= 0:
+        return {"u": u, "z": 0.0, "p_value": 1.0}
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return {"u": u, "z": float(z), "p_value": 0.5 * math.erfc(z / math.sqrt(2))}
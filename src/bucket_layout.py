@@ -0,0 +1,175 @@
+"""
+Layout "bucket pattern" : un document par (PULocationID, heure de pickup)
+-------------------------------------------------------------------------
+
+Une requête comme q5_hashed_puloc (PULocationID: 132) renvoie 200k+ documents
+individuels. Ici les trips d'une même zone et d'une même heure sont regroupés
+dans un seul document :
+
+{
+    "_id": {"pl": 132, "h": ISODate("2021-10-01T08:00:00")},
+    "PULocationID": 132,
+    "hour": ISODate("2021-10-01T08:00:00"),
+    "count": 412, "sum_miles": 5120.3, "sum_fare": 20411.5,
+    "trips": [ {trip au format compact, sans PULocationID}, ... ]
+}
+
+Les trips sont écrits avec des upserts $push/$inc : un bucket peut être
+alimenté par plusieurs lots d'import. Les résumés (count, sum_miles, sum_fare)
+répondent aux comptages par zone/heure sans dérouler le tableau.
+"""
+
+from pymongo import ASCENDING, UpdateOne
+from src.logger import logger
+from src.compact_schema import (
+    to_compact_document, translate_pipeline_for_compact, COMPACT_FIELD_MAP, COMPACT_FLAG_BITS,
+    DATETIME_FIELDS,
+)
+from src.schema_mapping import (
+    translate_filter, translate_keys, parse_datetime, parse_filter_dates, rename_path,
+)
+
+TRIPS_FIELD = "trips"
+
+# Reconstruit un trip compact (avec sa zone) à partir d'un bucket
+UNWIND_STAGES = [
+    {"$unwind": f"${TRIPS_FIELD}"},
+    {"$replaceWith": {"$mergeObjects": [f"${TRIPS_FIELD}", {COMPACT_FIELD_MAP["PULocationID"]: "$PULocationID"}]}},
+]
+
+
+def _hour(value):
+    return parse_datetime(value).replace(minute=0, second=0, microsecond=0)
+
+
+def create_bucket_collection(db, collection_name):
+    """Create the (PULocationID, hour) index used by zone/time filters."""
+    collection = db[collection_name]
+    collection.create_index([("PULocationID", ASCENDING), ("hour", ASCENDING)])
+    logger.info(f"create_bucket_collection() : Bucket collection {collection_name} ready.")
+    return collection
+
+
+def to_bucket_updates(docs):
+    """Group a batch of flat trips by (PULocationID, pickup hour) into upserts."""
+    buckets = {}
+    for doc in docs:
+        pickup = doc.get("pickup_datetime")
+        if pickup is None:
+            continue
+        key = (doc.get("PULocationID"), _hour(pickup))
+        bucket = buckets.setdefault(key, {"count": 0, "sum_miles": 0.0, "sum_fare": 0.0, "trips": []})
+        bucket["count"] += 1
+        bucket["sum_miles"] += doc.get("trip_miles") or 0
+        bucket["sum_fare"] += doc.get("base_passenger_fare") or 0
+
+        record = to_compact_document(doc)
+        record.pop(COMPACT_FIELD_MAP["PULocationID"], None)
+        record.pop("_id", None)
+        bucket["trips"].append(record)
+
+    return [
+        UpdateOne(
+            {"_id": {"pl": pu, "h": hour}},
+            {
+                "$setOnInsert": {"PULocationID": pu, "hour": hour},
+                "$inc": {"count": b["count"], "sum_miles": b["sum_miles"], "sum_fare": b["sum_fare"]},
+                "$push": {TRIPS_FIELD: {"$each": b["trips"]}},
+            },
+            upsert=True,
+        )
+        for (pu, hour), b in buckets.items()
+    ]
+
+
+def write_buckets(collection, docs):
+    """Merge a batch of flat trips into the bucket collection."""
+    requests = to_bucket_updates(docs)
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+
+
+# -------------------------------------------------------------------
+# Adaptateur de requêtes
+# -------------------------------------------------------------------
+def split_bucket_filter(query):
+    """
+    Split a flat trip filter into:
+    - a bucket-level filter (PULocationID, plage horaire de pickup)
+    - a trip-level residual filter (toujours exprimé sur le schéma plat)
+    """
+    bucket, residual = {}, {}
+    for key, value in query.items():
+        if key == "PULocationID":
+            # La zone est exacte au niveau du bucket : pas de filtre résiduel
+            bucket["PULocationID"] = value
+            continue
+        if key == "pickup_datetime":
+            conditions = value if isinstance(value, dict) else {"$eq": value}
+            hour_filter = {}
+            for op, bound in conditions.items():
+                if op in ("$gte", "$gt"):
+                    hour_filter["$gte"] = _hour(bound)
+                elif op in ("$lt", "$lte"):
+                    hour_filter[op] = parse_datetime(bound)
+                elif op == "$eq":
+                    hour_filter["$eq"] = _hour(bound)
+            if hour_filter:
+                bucket["hour"] = hour_filter
+        # Les heures ne bornent qu'approximativement : le filtre exact reste au niveau trip
+        residual[key] = value
+    return bucket, residual
+
+
+def _trip_filter(residual):
+    return translate_filter(parse_filter_dates(residual, DATETIME_FIELDS), COMPACT_FIELD_MAP, COMPACT_FLAG_BITS)
+
+
+def translate_candidate_for_bucket(candidate):
+    """Turn a catalog find candidate into an aggregation on the bucket layout."""
+    bucket_match, residual = split_bucket_filter(candidate.get("query", {}))
+    if residual:
+        # Élimine les buckets sans aucun trip correspondant avant le $unwind
+        bucket_match[TRIPS_FIELD] = {"$elemMatch": _trip_filter(residual)}
+
+    pipeline = [{"$match": bucket_match}] if bucket_match else []
+    pipeline += UNWIND_STAGES
+    if residual:
+        pipeline.append({"$match": _trip_filter(residual)})
+    if candidate.get("sort"):
+        pipeline.append({"$sort": translate_keys(candidate["sort"], COMPACT_FIELD_MAP, COMPACT_FLAG_BITS)})
+    if candidate.get("projection"):
+        pipeline.append({"$project": translate_keys(candidate["projection"], COMPACT_FIELD_MAP, COMPACT_FLAG_BITS)})
+
+    translated = {k: v for k, v in candidate.items() if k not in ("query", "sort", "projection", "index")}
+    translated["pipeline"] = pipeline
+    return translated
+
+
+def translate_pipeline_for_bucket(pipeline):
+    """Adapt a dashboard aggregation pipeline: unwind the buckets, then use compact names."""
+    return UNWIND_STAGES + translate_pipeline_for_compact(pipeline)
+
+
+def translate_field_for_bucket(field):
+    if field == "PULocationID":
+        return field
+    return f"{TRIPS_FIELD}." + rename_path(field, COMPACT_FIELD_MAP, COMPACT_FLAG_BITS)
+
+
+def _hour_aligned(condition):
+    return (isinstance(condition, dict) and set(condition) <= {"$gte", "$lt"}
+            and all(parse_datetime(b) == _hour(b) for b in condition.values()))
+
+
+def count_trips(collection, query):
+    """Count trips, from the bucket summaries when the filter is zone/hour only."""
+    bucket_match, residual = split_bucket_filter(query)
+    pickup = residual.pop("pickup_datetime", None)
+    if residual or (pickup is not None and not _hour_aligned(pickup)):
+        # Filtre plus fin que le bucket : comptage exact après $unwind
+        pipeline = translate_candidate_for_bucket({"query": query})["pipeline"] + [{"$count": "n"}]
+    else:
+        pipeline = [{"$match": bucket_match}, {"$group": {"_id": None, "n": {"$sum": "$count"}}}]
+    result = list(collection.aggregate(pipeline, allowDiskUse=True))
+    return result[0]["n"] if result else 0
@@ -1,8 +1,27 @@
 import pandas as pd
 import os
 from src.logger import logger
+from src import metrics
 import pyarrow.parquet as pq
 
+def read_batches(parquet_file, batch_size, stage):
+    """
+    iter_batches() of a ParquetFile, counting BYTES_READ in bytes read from disk.
+
+    batch.nbytes est la taille décodée en mémoire (plusieurs fois le fichier) : on
+    compte la taille compressée des row groups, répartie au prorata des lignes.
+    """
+    meta = parquet_file.metadata
+    total_bytes = sum(meta.row_group(i).column(j).total_compressed_size
+                      for i in range(meta.num_row_groups) for j in range(meta.num_columns))
+    rows = counted = 0
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        rows += batch.num_rows
+        target = total_bytes * rows // meta.num_rows if meta.num_rows else 0
+        metrics.BYTES_READ.inc(target - counted, stage=stage)
+        counted = target
+        yield batch
+
 def load_data(file_path):
     if not os.path.exists(file_path):
         logger.warning(f"clean_data.py : The file {file_path} does not exist.")
@@ -10,8 +29,11 @@ def load_data(file_path):
     parquet_file = pq.ParquetFile(file_path)
     df_list = []
     batch_size = 500_000
-    for batch in parquet_file.iter_batches(batch_size=batch_size):
-        df_list.append(batch.to_pandas())
+    for batch in read_batches(parquet_file, batch_size, stage="clean"):
+        # Seule la conversion Arrow -> pandas est chronométrée ici : c'est une lecture
+        with metrics.BATCH_LATENCY.time(stage="read"):
+            df_list.append(batch.to_pandas())
+        metrics.ROWS_PROCESSED.inc(batch.num_rows, stage="clean")
     df = pd.concat(df_list, ignore_index=True)
 
     return df
@@ -48,17 +70,28 @@ def encode_flags(df, flag_cols):
     df[flag_cols]= df[flag_cols].replace({'N':0,'Y':1})
     return df
 
+def iter_batches(file_path, batch_size=500_000):
+    """Yield the Parquet file as pandas DataFrames of batch_size rows."""
+    parquet_file = pq.ParquetFile(file_path)
+    for batch in read_batches(parquet_file, batch_size, stage="read"):
+        yield batch.to_pandas()
+
+def clean_batch(df, columns_to_remove, columns_clean, flag_cols):
+    """Apply every cleaning step to one DataFrame (whole file or single batch)."""
+    df = remove_unnecessary_columns(df, columns_to_remove)
+    df = cast_column_float(df)
+    df = cast_column_int(df)
+    df = cast_column_datetime(df)
+    for col in columns_clean:
+        df = clean_string_columns(df, col)
+    df = encode_flags(df,flag_cols)
+    return df
+
 def run_cleaning_pipeline(input_path,columns_to_remove,columns_clean,flag_cols):
     try:
         df = load_data(input_path)
-        df = remove_unnecessary_columns(df, columns_to_remove)
-        df = cast_column_float(df)
-        df = cast_column_int(df)
-        df = cast_column_datetime(df)
-        for col in columns_clean:
-            df = clean_string_columns(df, col)
-        df = encode_flags(df,flag_cols)
-        return df
+        return clean_batch(df, columns_to_remove, columns_clean, flag_cols)
         
     except Exception as e:
+        metrics.ERRORS.inc(stage="clean")
         logger.error(f"clean_data.py :An error occurred: {e}")
@@ -0,0 +1,86 @@
+"""
+Schéma compact des trips
+------------------------
+
+Sur 16M de documents, les noms de champs longs répétés dans chaque document
+(base_passenger_fare, congestion_surcharge, ...) pèsent une part importante
+de la taille de la collection. Le layout compact :
+- utilise des clés courtes,
+- regroupe les 4 flags 0/1 dans un seul entier bitmask `fl`,
+- regroupe les montants dans un sous-document `f`,
+- stocke les dates en BSON date (8 octets) au lieu de chaînes ISO.
+"""
+
+from src.schema_mapping import translate_candidate, translate_pipeline, parse_datetime, parse_filter_dates
+
+FLAGS_FIELD = "fl"
+FARES_FIELD = "f"
+
+COMPACT_FIELD_MAP = {
+    "hvfhs_license_num": "lic",
+    "dispatching_base_num": "base",
+    "request_datetime": "rq",
+    "pickup_datetime": "pu",
+    "dropoff_datetime": "do",
+    "PULocationID": "pl",
+    "DOLocationID": "dl",
+    "trip_miles": "mi",
+    "trip_time": "tt",
+    "base_passenger_fare": f"{FARES_FIELD}.b",
+    "tolls": f"{FARES_FIELD}.t",
+    "bcf": f"{FARES_FIELD}.c",
+    "sales_tax": f"{FARES_FIELD}.s",
+    "congestion_surcharge": f"{FARES_FIELD}.cg",
+    "airport_fee": f"{FARES_FIELD}.a",
+    "tips": f"{FARES_FIELD}.tp",
+    "driver_pay": f"{FARES_FIELD}.d",
+}
+
+# flag -> (champ bitmask, bit)
+COMPACT_FLAG_BITS = {
+    "shared_request_flag": (FLAGS_FIELD, 1),
+    "shared_match_flag": (FLAGS_FIELD, 2),
+    "wav_request_flag": (FLAGS_FIELD, 4),
+    "wav_match_flag": (FLAGS_FIELD, 8),
+}
+
+DATETIME_FIELDS = ["request_datetime", "pickup_datetime", "dropoff_datetime"]
+
+
+def to_compact_document(doc):
+    """Convert one flat trip document into the compact layout."""
+    compact = {}
+    flags = 0
+    for field, value in doc.items():
+        if field in COMPACT_FLAG_BITS:
+            if value:
+                flags |= COMPACT_FLAG_BITS[field][1]
+            continue
+        if field in DATETIME_FIELDS:
+            value = parse_datetime(value)
+        path = COMPACT_FIELD_MAP.get(field, field)
+        parent, dot, child = path.partition(".")
+        if dot:
+            compact.setdefault(parent, {})[child] = value
+        else:
+            compact[path] = value
+    compact[FLAGS_FIELD] = flags
+    return compact
+
+
+def to_compact_documents(docs):
+    """Convert a batch of flat trip documents into the compact layout."""
+    return [to_compact_document(doc) for doc in docs]
+
+
+def translate_candidate_for_compact(candidate):
+    """Adapt a SLOW_QUERY_CANDIDATES entry to the compact layout."""
+    candidate = dict(candidate)
+    if "query" in candidate:
+        candidate["query"] = parse_filter_dates(candidate["query"], DATETIME_FIELDS)
+    return translate_candidate(candidate, COMPACT_FIELD_MAP, COMPACT_FLAG_BITS)
+
+
+def translate_pipeline_for_compact(pipeline):
+    """Adapt a dashboard aggregation pipeline to the compact layout."""
+    return translate_pipeline(pipeline, COMPACT_FIELD_MAP, COMPACT_FLAG_BITS)
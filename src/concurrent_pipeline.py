@@ -0,0 +1,231 @@
+"""
+Pipeline concurrent Parquet -> MongoDB
+--------------------------------------
+
+Au lieu de nettoyer tout le mois avant le premier insert, chaque lot traverse
+quatre étages reliés par des files bornées :
+
+    read (Parquet) -> clean -> serialize (documents) -> insert (MongoDB)
+
+Le mongod ingère le lot N pendant que le lot N+1 est nettoyé. Les files
+bornées limitent la mémoire à (queue_size + workers) lots par étage.
+
+Threads plutôt que processus : la lecture Parquet (Arrow), les opérations
+vectorisées pandas et les écritures réseau PyMongo relâchent le GIL, et les
+DataFrames n'ont pas à être sérialisés entre processus.
+
+Pour chaque étage on mesure le temps "busy" (travail) et "idle" (attente d'un
+lot en entrée ou d'une place dans la file de sortie) : l'étage le plus occupé
+est le goulot d'étranglement.
+
+Un lot perdu à n'importe quel étage, ou un nombre de trips stockés différent
+du nombre de lignes du Parquet, fait échouer le run (RuntimeError) après le
+rapport par étage.
+"""
+
+import json
+import queue
+import threading
+import time
+import pyarrow.parquet as pq
+from src.logger import logger
+from src import metrics
+from src.bucket_layout import count_trips
+from src.clean_data import iter_batches, clean_batch
+from src.mongo_import import connect_to_mongo, insert_data_to_collection
+from src.storage_layouts import get_layout
+from src.rollups import update_rollups
+
+_END = object()
+
+
+class StageStats:
+    """Busy / idle accounting of one pipeline stage."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.idle = 0.0
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, idle=0.0, rows=0, batches=0, errors=0):
+        with self._lock:
+            self.busy += busy
+            self.idle += idle
+            self.rows += rows
+            self.batches += batches
+            self.errors += errors
+
+    def to_dict(self):
+        total = self.busy + self.idle
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "busy_s": round(self.busy, 3),
+            "idle_s": round(self.idle, 3),
+            "utilization": round(self.busy / total, 3) if total else 0.0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "errors": self.errors,
+        }
+
+
+def _timed_put(q, item, stats, name):
+    start = time.perf_counter()
+    q.put(item)
+    stats.add(idle=time.perf_counter() - start)
+    metrics.QUEUE_DEPTH.set(q.qsize(), stage=name)
+
+
+def _source(name, iterable, out_q, stats):
+    """First stage: pull batches from an iterator (time spent in next() is busy time)."""
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            stats.add(busy=time.perf_counter() - start, rows=len(item), batches=1)
+            _timed_put(out_q, item, stats, name)
+    except Exception as e:
+        stats.add(errors=1)
+        metrics.ERRORS.inc(stage=name)
+        logger.error(f"concurrent_pipeline : stage {name} failed: {e}")
+    finally:
+        out_q.put(_END)
+
+
+def _worker(name, func, in_q, out_q, stats, done):
+    """Intermediate/final stage worker. The last worker to finish forwards the end marker."""
+    while True:
+        start = time.perf_counter()
+        item = in_q.get()
+        stats.add(idle=time.perf_counter() - start)
+        if item is _END:
+            in_q.put(_END)  # réveille les autres workers du même étage
+            break
+
+        start = time.perf_counter()
+        try:
+            result = func(item)
+        except Exception as e:
+            stats.add(busy=time.perf_counter() - start, errors=1)
+            metrics.ERRORS.inc(stage=name)
+            logger.error(f"concurrent_pipeline : stage {name} failed on a batch: {e}")
+            continue
+        stats.add(busy=time.perf_counter() - start, rows=len(item), batches=1)
+        if out_q is not None:
+            _timed_put(out_q, result, stats, name)
+
+    with done["lock"]:
+        done["count"] += 1
+        last = done["count"] == stats.workers
+    if last and out_q is not None:
+        out_q.put(_END)
+
+
+def run_stages(source, stages, queue_size=4):
+    """
+    Run source -> stages[0] -> ... -> stages[-1] concurrently.
+
+    source : (name, iterable)
+    stages : [(name, func, workers), ...], le résultat du dernier étage est ignoré
+    Returns the per-stage statistics.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    source_name, iterable = source
+    all_stats = [StageStats(source_name, 1)] + [StageStats(name, workers) for name, _, workers in stages]
+
+    threads = [threading.Thread(target=_source, name=source_name,
+                                args=(source_name, iterable, queues[0], all_stats[0]))]
+    for i, (name, func, workers) in enumerate(stages):
+        out_q = queues[i + 1] if i + 1 < len(stages) else None
+        done = {"count": 0, "lock": threading.Lock()}
+        for w in range(workers):
+            threads.append(threading.Thread(target=_worker, name=f"{name}-{w}",
+                                            args=(name, func, queues[i], out_q, all_stats[i + 1], done)))
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return [s.to_dict() for s in all_stats]
+
+
+def serialize_batch(df):
+    """DataFrame -> list of documents, identical to the NDJSON written by convert_parquet_to_json."""
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def count_ingested(db, collection_name, layout="flat"):
+    """Number of trips stored in a collection (a bucket holds many trips)."""
+    if layout == "bucket":
+        return count_trips(db[collection_name], {})
+    return db[collection_name].count_documents({})
+
+
+def check_pipeline_result(report, input_path, stored_before, stored_after):
+    """Raise when a stage lost batches or the collection did not grow by the source row count."""
+    failed = {s["stage"]: s["errors"] for s in report if s["errors"]}
+    if failed:
+        raise RuntimeError(f"batch(es) failed: {failed}")
+    source_rows = pq.ParquetFile(input_path).metadata.num_rows
+    if stored_after - stored_before != source_rows:
+        raise RuntimeError(f"{stored_after - stored_before} trips stored, expected {source_rows} from {input_path}")
+
+
+def run_concurrent_pipeline(input_path, db_name, collection_name, columns_to_remove, columns_clean,
+                            flag_cols, batch_size=100_000, queue_size=4, clean_workers=2,
+                            serialize_workers=2, insert_workers=2, layout="flat", rollups=False):
+    """Stream a Parquet file into MongoDB with overlapped read/clean/serialize/insert stages."""
+    db = connect_to_mongo(db_name)
+    storage_layout = get_layout(layout)
+    if storage_layout["prepare_collection"]:
+        storage_layout["prepare_collection"](db, collection_name)
+    collection = db[collection_name]
+
+    on_batch = (lambda batch: update_rollups(db, collection_name, batch)) if rollups else None
+    # La collection peut déjà contenir des trips : on vérifie l'écart, pas le total
+    stored_before = count_ingested(db, collection_name, layout)
+
+    def insert(docs):
+        inserted = insert_data_to_collection(collection, docs, transform=storage_layout["transform"],
+                                             on_batch=on_batch, write=storage_layout["write"])
+        # Lot partiellement perdu : compté comme une erreur de l'étage insert
+        if inserted != len(docs):
+            raise RuntimeError(f"only {inserted} of {len(docs)} documents inserted")
+
+    start = time.perf_counter()
+    report = run_stages(
+        ("read", iter_batches(input_path, batch_size)),
+        [
+            ("clean", lambda df: clean_batch(df, columns_to_remove, columns_clean, flag_cols), clean_workers),
+            ("serialize", serialize_batch, serialize_workers),
+            ("insert", insert, insert_workers),
+        ],
+        queue_size=queue_size,
+    )
+    elapsed = time.perf_counter() - start
+
+    log_stage_report(report, elapsed)
+    check_pipeline_result(report, input_path, stored_before, count_ingested(db, collection_name, layout))
+    return {"wall_s": elapsed, "stages": report}
+
+
+def log_stage_report(report, elapsed):
+    """Log per-stage busy/idle times and name the bottleneck stage."""
+    logger.info(f"concurrent_pipeline : finished in {elapsed:.1f}s")
+    for s in report:
+        logger.info(
+            f"  {s['stage']:<10} workers={s['workers']} busy={s['busy_s']:.1f}s idle={s['idle_s']:.1f}s "
+            f"utilization={s['utilization']:.0%} batches={s['batches']} rows={s['rows']} errors={s['errors']}"
+        )
+    # Goulot : l'étage dont chaque worker est le plus occupé
+    bottleneck = max(report, key=lambda s: s["busy_s"] / s["workers"])
+    logger.info(f"  bottleneck → {bottleneck['stage']}")
@@ -1,4 +1,5 @@
 import os
+from src import metrics
 
 # def convert_parquet_to_json(df, output_folder):
     # df.to_json(output_path, orient='records', lines=True)
@@ -10,7 +11,10 @@ def convert_parquet_to_json(df, output_folder):
     while i < len(df):
         batch = df.iloc[i:i+batch_size]
         json_path = os.path.join(output_folder, f"trips_{count}.json")
-        batch.to_json(json_path, orient='records', lines=True, date_format="iso")
+        with metrics.BATCH_LATENCY.time(stage="convert"):
+            batch.to_json(json_path, orient='records', lines=True, date_format="iso")
+        metrics.ROWS_PROCESSED.inc(len(batch), stage="convert")
+        metrics.BYTES_WRITTEN.inc(os.path.getsize(json_path), stage="convert")
         i += batch_size 
         count +=1
 
@@ -0,0 +1,34 @@
+"""
+Empreintes de fichiers
+----------------------
+
+Empreinte (taille, mtime, sha256) d'un fichier d'entrée, partagée par
+l'ordonnanceur d'ingestion (manifest) et le cache des étapes du pipeline.
+"""
+
+import hashlib
+import os
+
+
+def sha256_file(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_file(path, previous=None):
+    """
+    Fingerprint a file by size, mtime and sha256.
+
+    Le hash n'est recalculé que si la taille ou le mtime ont changé par rapport
+    à l'empreinte précédente : relancer l'ordonnanceur ne relit pas des Go de Parquet.
+    """
+    stat = os.stat(path)
+    fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+        fingerprint["sha256"] = previous.get("sha256")
+    else:
+        fingerprint["sha256"] = sha256_file(path)
+    return fingerprint
@@ -0,0 +1,265 @@
+"""
+Ordonnanceur d'ingestion multi-mois
+-----------------------------------
+
+Découvre tous les fichiers data/raw/fhvhv_tripdata_YYYY-MM.parquet et n'ingère
+que les mois nouveaux ou modifiés. Chaque fichier est identifié par une
+empreinte (taille, mtime, sha256) conservée dans un manifest JSON persistant :
+
+{
+    "2021-10": {
+        "file": "data/raw/fhvhv_tripdata_2021-10.parquet",
+        "fingerprint": {"size": ..., "mtime": ..., "sha256": "..."},
+        "collection": "fhvhv_trips_2021-10",
+        "status": "done",            # running / done / failed
+        "created_by_scheduler": true, # false : collection préexistante adoptée telle quelle
+        "rows": 14502817, "wall_s": 812.4,
+        "started_at": "...", "finished_at": "...", "error": null
+    },
+    ...
+}
+
+Plusieurs mois tournent en parallèle sous un budget global : coeurs CPU,
+mémoire estimée des lots en vol, et connexions MongoDB. Un mois ne démarre que
+lorsque sa part du budget est libre. Ajouter le mois suivant ne coûte donc
+que son propre temps d'ingestion.
+
+L'ordonnanceur ne supprime que les collections qu'il a lui-même créées
+(created_by_scheduler dans le manifest). Une collection déjà présente sans
+entrée de manifest (ex: fhvhv_trips_2021-10 importée à la main) est adoptée :
+son nombre de trips est relevé et le mois marqué done. La remplacer demande
+force=True (--force).
+"""
+
+import glob
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from src.logger import logger
+from src.concurrent_pipeline import count_ingested, run_concurrent_pipeline
+from src.fingerprint import fingerprint_file
+from src.mongo_import import connect_to_mongo
+from src.rollups import rollup_collection_name, DAY_COMPANY, COMPANY, OD_PAIR
+
+RAW_DIR = "data/raw"
+FILE_PATTERN = "fhvhv_tripdata_*.parquet"
+MONTH_RE = re.compile(r"fhvhv_tripdata_(\d{4}-\d{2})\.parquet$")
+MANIFEST_PATH = "data/ingest_manifest.json"
+COLLECTION_TEMPLATE = "fhvhv_trips_{month}"
+
+# Taille mémoire approximative d'un trip en vol (DataFrame + liste de dicts)
+ROW_BYTES_ESTIMATE = 1_000
+# Part de la mémoire disponible que l'ingestion peut utiliser
+MEMORY_FRACTION = 0.7
+MAX_CONNECTIONS = 16
+
+
+# -------------------------------------------------------------------
+# Découverte des mois
+# -------------------------------------------------------------------
+def discover_months(raw_dir=RAW_DIR):
+    """Return {month: path} for every monthly FHV Parquet file in raw_dir."""
+    months = {}
+    for path in sorted(glob.glob(os.path.join(raw_dir, FILE_PATTERN))):
+        match = MONTH_RE.search(os.path.basename(path))
+        if match:
+            months[match.group(1)] = path
+    return months
+
+
+# -------------------------------------------------------------------
+# Manifest
+# -------------------------------------------------------------------
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Write the manifest atomically (tmp file + rename) so a crash never leaves it half-written."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def plan_months(months, manifest):
+    """
+    Return (to_ingest, skipped): months whose file is new, changed, or whose last run did not finish.
+    to_ingest : {month: (path, fingerprint)}
+    """
+    to_ingest, skipped = {}, []
+    for month, path in months.items():
+        entry = manifest.get(month, {})
+        previous = entry.get("fingerprint")
+        fingerprint = fingerprint_file(path, previous)
+        unchanged = previous is not None and previous.get("sha256") == fingerprint["sha256"]
+        if unchanged and entry.get("status") == "done":
+            # Fichier "touché" mais identique : on garde le nouveau mtime pour ne pas le rehasher
+            entry["fingerprint"] = fingerprint
+            skipped.append(month)
+        else:
+            to_ingest[month] = (path, fingerprint)
+    return to_ingest, skipped
+
+
+# -------------------------------------------------------------------
+# Budget de ressources
+# -------------------------------------------------------------------
+def available_memory():
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 4 * 1024 ** 3
+
+
+class ResourceBudget:
+    """Global CPU / memory / connection budget shared by the concurrently ingested months."""
+
+    def __init__(self, cpus=None, memory_bytes=None, connections=MAX_CONNECTIONS):
+        self.capacity = {
+            "cpus": cpus or os.cpu_count() or 1,
+            "memory": memory_bytes or int(available_memory() * MEMORY_FRACTION),
+            "connections": connections,
+        }
+        self.used = {k: 0 for k in self.capacity}
+        self._cond = threading.Condition()
+
+    def _fits(self, request):
+        # Un mois seul passe toujours, même s'il dépasse le budget : sinon il ne démarrerait jamais
+        if not any(self.used.values()):
+            return True
+        return all(self.used[k] + request[k] <= self.capacity[k] for k in request)
+
+    def acquire(self, request):
+        with self._cond:
+            self._cond.wait_for(lambda: self._fits(request))
+            for k, v in request.items():
+                self.used[k] += v
+
+    def release(self, request):
+        with self._cond:
+            for k, v in request.items():
+                self.used[k] -= v
+            self._cond.notify_all()
+
+
+def month_requirements(options):
+    """Estimate the resources one month's concurrent pipeline needs."""
+    batch_size = options.get("batch_size", 100_000)
+    queue_size = options.get("queue_size", 4)
+    workers = [options.get(k, 2) for k in ("clean_workers", "serialize_workers", "insert_workers")]
+    # Lots en vol : une file bornée + un lot par worker pour chaque étage
+    in_flight = (len(workers) + 1) * queue_size + sum(workers) + 1
+    return {
+        "cpus": 1 + options.get("clean_workers", 2) + options.get("serialize_workers", 2),
+        "memory": in_flight * batch_size * ROW_BYTES_ESTIMATE,
+        "connections": options.get("insert_workers", 2) + 1,
+    }
+
+
+# -------------------------------------------------------------------
+# Ingestion
+# -------------------------------------------------------------------
+def drop_collection_with_rollups(db, collection_name, rollups):
+    """A changed input is re-ingested from scratch: drop the previous collection (and its rollups)."""
+    db.drop_collection(collection_name)
+    if rollups:
+        for rollup in (DAY_COMPANY, COMPANY, OD_PAIR):
+            db.drop_collection(rollup_collection_name(collection_name, rollup))
+
+
+def ingest_month(month, path, db_name, pipeline_kwargs, rollups=False):
+    """Ingest one month into its own collection (replaced if it exists) and return (rows, wall_s)."""
+    collection_name = COLLECTION_TEMPLATE.format(month=month)
+    db = connect_to_mongo(db_name)
+    drop_collection_with_rollups(db, collection_name, rollups)
+    # Lot perdu ou nombre de trips différent du Parquet : run_concurrent_pipeline lève une exception
+    result = run_concurrent_pipeline(path, db_name, collection_name, rollups=rollups, **pipeline_kwargs)
+    return result["stages"][-1]["rows"], result["wall_s"]
+
+
+def run_scheduler(db_name, columns_to_remove, columns_clean, flag_cols, raw_dir=RAW_DIR,
+                  manifest_path=MANIFEST_PATH, layout="flat", rollups=False, options=None, budget=None,
+                  force=False):
+    """
+    Ingest every new or changed month under a global resource budget and update the manifest.
+
+    force : remplace aussi les collections que l'ordonnanceur n'a pas créées
+    """
+    options = dict(options or {})
+    manifest = load_manifest(manifest_path)
+    months = discover_months(raw_dir)
+    to_ingest, skipped = plan_months(months, manifest)
+
+    logger.info(f"run_scheduler() : {len(months)} month(s) found, {len(skipped)} up to date, "
+                f"{len(to_ingest)} to ingest: {sorted(to_ingest)}")
+    if not to_ingest:
+        save_manifest(manifest, manifest_path)
+        return manifest
+
+    budget = budget or ResourceBudget()
+    request = month_requirements(options)
+    pipeline_kwargs = dict(options, columns_to_remove=columns_to_remove, columns_clean=columns_clean,
+                           flag_cols=flag_cols, layout=layout)
+    lock = threading.Lock()
+
+    def update(month, **fields):
+        with lock:
+            manifest.setdefault(month, {}).update(fields)
+            save_manifest(manifest, manifest_path)
+
+    db = connect_to_mongo(db_name)
+    existing = set(db.list_collection_names())
+
+    def job(month, path, fingerprint):
+        collection_name = COLLECTION_TEMPLATE.format(month=month)
+        with lock:
+            owned = manifest.get(month, {}).get("created_by_scheduler", False)
+            known = month in manifest
+        if collection_name in existing and not owned and not force:
+            if known:
+                # Collection adoptée dont le fichier a changé : on ne la remplace pas sans --force
+                update(month, fingerprint=fingerprint, status="failed", finished_at=datetime.now().isoformat(),
+                       error=f"{collection_name} was not created by the scheduler, rerun with force=True to replace it")
+                logger.error(f"run_scheduler() : ❌ {month} changed but {collection_name} is not ours (use --force)")
+                return
+            rows = count_ingested(db, collection_name, layout)
+            update(month, file=path, fingerprint=fingerprint, collection=collection_name, status="done",
+                   created_by_scheduler=False, rows=rows, wall_s=None, started_at=None,
+                   finished_at=datetime.now().isoformat(), error=None)
+            logger.info(f"run_scheduler() : ⚓ {month} adopted existing {collection_name} ({rows} trips)")
+            return
+
+        budget.acquire(request)
+        try:
+            update(month, file=path, fingerprint=fingerprint, collection=collection_name,
+                   created_by_scheduler=True, status="running", started_at=datetime.now().isoformat(),
+                   finished_at=None, error=None)
+            logger.info(f"run_scheduler() : ▶ {month} started")
+            rows, wall_s = ingest_month(month, path, db_name, pipeline_kwargs, rollups)
+            update(month, status="done", rows=rows, wall_s=round(wall_s, 2),
+                   finished_at=datetime.now().isoformat())
+            logger.info(f"run_scheduler() : ✔ {month} ingested ({rows} rows, {wall_s:.1f}s)")
+        except Exception as e:
+            update(month, status="failed", error=str(e), finished_at=datetime.now().isoformat())
+            logger.error(f"run_scheduler() : ❌ {month} failed: {e}")
+        finally:
+            budget.release(request)
+
+    start = time.perf_counter()
+    # Le budget limite la concurrence réelle ; le pool n'a qu'à couvrir tous les mois
+    with ThreadPoolExecutor(max_workers=len(to_ingest), thread_name_prefix="month") as executor:
+        for month in sorted(to_ingest):
+            path, fingerprint = to_ingest[month]
+            executor.submit(job, month, path, fingerprint)
+
+    logger.info(f"run_scheduler() : finished in {time.perf_counter() - start:.1f}s")
+    return manifest
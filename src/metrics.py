@@ -0,0 +1,166 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.logger import logger
+
+# Buckets (secondes) adaptés à des batchs insert_many de 10k à 100k documents
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value, quote=True):
+    # Format texte Prometheus : \\, \n (et \" dans les valeurs de label) doivent être échappés
+    value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quote else value
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + list(extra or [])
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, one value per label set."""
+    kind = "counter"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down (ex: profondeur de file d'attente)."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Cumulative histogram with Prometheus-style buckets, sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                for bound, count in zip(self.buckets, counts):
+                    out.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), count))
+                out.append((f"{self.name}_sum", key, total))
+                out.append((f"{self.name}_count", key, counts[-1]))
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+# -------------------------------------------------------------------
+# Métriques du pipeline clean -> convert -> import
+# -------------------------------------------------------------------
+ROWS_PROCESSED = Counter("fhv_pipeline_rows_processed_total", "Rows processed by pipeline stage.")
+BYTES_READ = Counter("fhv_pipeline_bytes_read_total", "Bytes read from disk by pipeline stage.")
+BYTES_WRITTEN = Counter("fhv_pipeline_bytes_written_total", "Bytes written to disk by pipeline stage.")
+BATCHES_INSERTED = Counter("fhv_import_batches_inserted_total", "insert_many batches acknowledged by MongoDB.")
+ERRORS = Counter("fhv_pipeline_errors_total", "Errors raised by pipeline stage.")
+QUEUE_DEPTH = Gauge("fhv_pipeline_queue_depth", "Batches waiting to be processed by a stage.")
+BATCH_LATENCY = Histogram("fhv_pipeline_batch_latency_seconds", "Latency of one batch by pipeline stage.")
+
+REGISTRY = [ROWS_PROCESSED, BYTES_READ, BYTES_WRITTEN, BATCHES_INSERTED, ERRORS, QUEUE_DEPTH, BATCH_LATENCY]
+
+
+def render_prometheus(registry=REGISTRY):
+    """Return all metrics in the Prometheus text exposition format (v0.0.4)."""
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {_escape(metric.documentation, quote=False)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample_name, key, value in metric.samples():
+            lines.append(f"{sample_name}{_format_labels(key)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Prometheus scrape toutes les 15s : on ne pollue pas project.log
+        pass
+
+
+def start_metrics_server(port=8000, host="127.0.0.1"):
+    """Serve /metrics on a daemon thread and return the HTTP server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info(f"start_metrics_server() : Prometheus metrics exposed on http://{host}:{port}/metrics")
+    return server
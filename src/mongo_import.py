@@ -1,6 +1,10 @@
 import json
+import time
 from pymongo import MongoClient
 from src.logger import logger
+from src import metrics
+from src.storage_layouts import get_layout
+from src.rollups import update_rollups
 
 def connect_to_mongo(db_name):
     """Connect to MongoDB and return the database object."""
@@ -19,51 +23,95 @@ def load_dictionary(file_path):
     try:
         logger.info(f"load_dictionary() : Lecture du fichier JSON Lines : {file_path}")
         docs = []
-        with open(file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
+        # Lecture binaire : BYTES_READ compte des octets, pas des caractères
+        with open(file_path, "rb") as f:
+            for raw_line in f:
+                metrics.BYTES_READ.inc(len(raw_line), stage="import")
+                line = raw_line.decode("utf-8").strip()
                 if line:                      # ignorer lignes vides
                     try:
                         docs.append(json.loads(line))
                     except json.JSONDecodeError as jde:
+                        metrics.ERRORS.inc(stage="import")
                         logger.error(f"load_dictionary() : Erreur de décodage JSON : {jde} dans la ligne: {line}")
 
         logger.info(f"load_dictionary() : {len(docs)} documents chargés.")
         return docs
     
     except Exception as e:
+        metrics.ERRORS.inc(stage="import")
         logger.error(f"load_dictionary() : An error occurred while loading JSON data: {e}")
 
-def insert_data_to_collection(collection, data, batch_size=50000):
-    """Insert data into the specified MongoDB collection."""
+def insert_data_to_collection(collection, data, batch_size=50000, transform=None, on_batch=None, write=None):
+    """Insert data into the specified MongoDB collection.
+
+    transform : conversion d'un lot de documents plats vers le layout de la collection
+    on_batch  : appelé avec le lot plat d'origine une fois l'insertion acquittée
+    write     : écriture spécifique au layout (ex: upserts de buckets) au lieu de insert_many
+    Returns the number of records inserted: a failed batch (insert or on_batch) is logged and
+    skipped, so callers that must not lose data compare it with len(data).
+    """
     logger.info(f"insert_data_to_collection() : Inserting {len(data)} records into the collection.")
 
     total = len(data)
+    inserted = 0
 
     try:
         for i in range(0, total, batch_size):
             batch = data[i:i + batch_size]
+            metrics.QUEUE_DEPTH.set(-(-(total - i) // batch_size), stage="import")
             try:
-                collection.insert_many(batch)
+                docs = transform(batch) if transform else batch
+                start = time.perf_counter()
+                if write:
+                    write(collection, docs)
+                else:
+                    collection.insert_many(docs)
+                metrics.BATCH_LATENCY.observe(time.perf_counter() - start, stage="import")
+                metrics.BATCHES_INSERTED.inc()
+                metrics.ROWS_PROCESSED.inc(len(batch), stage="import")
+                if on_batch:
+                    try:
+                        on_batch(batch)
+                    except Exception as e:
+                        # Lot inséré mais rollups incomplets : compté comme perdu pour que l'import échoue
+                        metrics.ERRORS.inc(stage="rollup")
+                        logger.error(f"insert_data_to_collection() : on_batch failed for the batch starting at record {i + 1}: {e}")
+                        continue
+                inserted += len(batch)
                 logger.info(f"insert_data_to_collection() : Inserted records {i + 1} to {min(i + batch_size, total)}")
             except Exception as e:
+                metrics.ERRORS.inc(stage="import")
                 logger.error(f"insert_data_to_collection() : An error occurred while inserting batch starting at record {i + 1}: {e}")
+        metrics.QUEUE_DEPTH.set(0, stage="import")
         logger.info(f"insert_data_to_collection() : Insertion terminée.")
 
     except Exception as e:
+        metrics.ERRORS.inc(stage="import")
         logger.error(f"insert_data_to_collection() :An error occurred while inserting data: {e}")
 
+    return inserted
 
-def import_json_to_mongodb(json_file_path, database_name, collection_name):
+
+def import_json_to_mongodb(json_file_path, database_name, collection_name, layout="flat", rollups=False):
 
     # Connect to MongoDB
     # Select the database and collection
     db = connect_to_mongo(database_name)
+    storage_layout = get_layout(layout)
+    if storage_layout["prepare_collection"]:
+        storage_layout["prepare_collection"](db, collection_name)
     collection = db[collection_name]
 
     # Load JSON data
     data = load_dictionary(json_file_path)
 
+    # Rollups du dashboard mis à jour lot par lot pendant l'import
+    on_batch = None
+    if rollups:
+        on_batch = lambda batch: update_rollups(db, collection_name, batch)
+
     # Insert data into MongoDB collection
-    insert_data_to_collection(collection, data)
+    insert_data_to_collection(collection, data, transform=storage_layout["transform"], on_batch=on_batch,
+                              write=storage_layout["write"])
     logger.info(f"insert_data_to_collection() : Import of {json_file_path} to MongoDB completed successfully!")   
\ No newline at end of file
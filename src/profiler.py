@@ -0,0 +1,358 @@
+"""
+Profil de cardinalité et de sélectivité des champs
+--------------------------------------------------
+
+Une seule passe en streaming, sur la collection MongoDB ou sur le Parquet
+source, en mémoire bornée :
+
+- nombre de valeurs distinctes (HyperLogLog)
+- top-k des valeurs et fréquences (count-min sketch), part de la valeur la plus fréquente
+- taux de nulls, min / max
+- monotonie : part des paires consécutives croissantes / décroissantes
+  (une clé monotone concentre les inserts sur un seul chunk)
+- histogrammes et corrélations deux à deux sur un échantillon réservoir de lignes
+- cardinalité des clés composées candidates au sharding
+
+Le profil est sauvegardé dans results/profile et réutilisé par l'index advisor
+(ordre des champs d'égalité, index hashed) et par rank_shard_keys().
+"""
+
+import json
+import math
+import os
+import sys
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from src.logger import logger
+from src.sketches import HyperLogLog, TopK, hash_values
+from src.clean_data import iter_batches
+from src.mongo_import import connect_to_mongo
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "results", "profile"))
+LATEST_PROFILE = os.path.join(PROFILE_DIR, "latest_profile.json")
+
+BATCH_SIZE = 200_000
+TOP_K = 20
+RESERVOIR_SIZE = 20_000
+HISTOGRAM_BINS = 20
+# Au-delà, un champ texte n'entre pas dans les corrélations (V de Cramér)
+MAX_CATEGORIES = 300
+
+# Clés de sharding candidates (step.md : PULocationID + hvfhs_license_num)
+SHARD_KEY_CANDIDATES = [
+    ("PULocationID",),
+    ("hvfhs_license_num",),
+    ("dispatching_base_num",),
+    ("pickup_datetime",),
+    ("PULocationID", "hvfhs_license_num"),
+    ("PULocationID", "DOLocationID"),
+    ("hvfhs_license_num", "pickup_datetime"),
+]
+
+
+# -------------------------------------------------------------------
+# 1 — Accumulateurs
+# -------------------------------------------------------------------
+class FieldProfile:
+    """Streaming statistics of one field."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.hll = HyperLogLog()
+        self.top = TopK(TOP_K)
+        self.min = None
+        self.max = None
+        self.increasing = 0
+        self.decreasing = 0
+        self.pairs = 0
+        self.last = None
+
+    def update(self, series):
+        self.count += len(series)
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        if not len(values):
+            return
+        self.hll.update(values)
+        self.top.update(values)
+
+        try:
+            batch_min, batch_max = values.min(), values.max()
+            self.min = batch_min if self.min is None else min(self.min, batch_min)
+            self.max = batch_max if self.max is None else max(self.max, batch_max)
+
+            # Monotonie : paires consécutives, y compris avec le dernier élément du lot précédent
+            array = values.to_numpy()
+            if self.last is not None:
+                array = np.concatenate([[self.last], array])
+            if len(array) > 1:
+                previous, current = array[:-1], array[1:]
+                self.increasing += int(np.count_nonzero(current > previous))
+                self.decreasing += int(np.count_nonzero(current < previous))
+                self.pairs += len(current)
+            self.last = array[-1]
+        except TypeError:
+            # Types mélangés dans la colonne : pas d'ordre total
+            pass
+
+    def to_dict(self):
+        top = self.top.top()
+        non_null = self.count - self.nulls
+        return {
+            "count": self.count,
+            "null_rate": self.nulls / self.count if self.count else 0.0,
+            "distinct": self.hll.count() if non_null else 0,
+            "top_k": [[_jsonable(v), int(n)] for v, n in top],
+            "top_share": top[0][1] / non_null if top and non_null else 0.0,
+            "min": _jsonable(self.min),
+            "max": _jsonable(self.max),
+            "increasing_ratio": self.increasing / self.pairs if self.pairs else None,
+            "decreasing_ratio": self.decreasing / self.pairs if self.pairs else None,
+        }
+
+
+class CompoundProfile:
+    """Distinct count and heaviest combination of a group of fields (clé composée)."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.hll = HyperLogLog()
+        self.top = TopK(1)
+        self.count = 0
+
+    def update(self, df):
+        if not set(self.fields) <= set(df.columns):
+            return
+        subset = df[list(self.fields)].dropna()
+        self.count += len(subset)
+        self.hll.update_hashes(hash_values(subset))
+        combined = subset.iloc[:, 0].astype(str)
+        for field in self.fields[1:]:
+            combined = combined + "|" + subset[field].astype(str)
+        self.top.update(combined)
+
+    def to_dict(self):
+        top = self.top.top()
+        return {
+            "fields": list(self.fields),
+            "count": self.count,
+            "distinct": self.hll.count() if self.count else 0,
+            "top_share": top[0][1] / self.count if top and self.count else 0.0,
+        }
+
+
+class RowReservoir:
+    """Uniform sample of whole rows (algorithm R, vectorized per batch)."""
+
+    def __init__(self, size=RESERVOIR_SIZE, seed=0):
+        self.size = size
+        self.seen = 0
+        self.rows = None
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, df):
+        df = df.reset_index(drop=True)
+        if self.rows is None:
+            self.rows = df.iloc[: self.size].copy()
+            start = len(self.rows)
+        else:
+            start = max(0, self.size - len(self.rows))
+            if start:
+                self.rows = pd.concat([self.rows, df.iloc[:start]], ignore_index=True)
+        seen_before = self.seen + start
+        remaining = df.iloc[start:]
+        if len(remaining):
+            positions = seen_before + np.arange(1, len(remaining) + 1)
+            slots = (self.rng.random(len(remaining)) * positions).astype(np.int64)
+            accepted = np.flatnonzero(slots < self.size)
+            # Plusieurs lignes sur le même slot : la dernière gagne, comme en séquentiel
+            slots, last = np.unique(slots[accepted][::-1], return_index=True)
+            rows = accepted[::-1][last]
+            replacement = remaining.iloc[rows].reindex(columns=self.rows.columns)
+            replacement.index = slots
+            self.rows.loc[slots] = replacement
+        self.seen += len(df)
+
+
+# -------------------------------------------------------------------
+# 2 — Statistiques sur l'échantillon
+# -------------------------------------------------------------------
+def _jsonable(value):
+    if value is None:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def histograms(sample):
+    """Equal-width histogram of every numeric column of the reservoir sample."""
+    result = {}
+    for column in sample.select_dtypes(include="number").columns:
+        values = sample[column].dropna().to_numpy(dtype=float)
+        if not len(values):
+            continue
+        counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+        result[column] = {
+            "edges": edges.tolist(),
+            "counts": counts.tolist(),
+            "quantiles": dict(zip(["p10", "p25", "p50", "p75", "p90", "p99"],
+                                  np.percentile(values, [10, 25, 50, 75, 90, 99]).tolist())),
+        }
+    return result
+
+
+def cramers_v(a, b):
+    table = pd.crosstab(a, b).to_numpy(dtype=float)
+    n = table.sum()
+    if n == 0 or min(table.shape) < 2:
+        return None
+    expected = table.sum(axis=1, keepdims=True) * table.sum(axis=0, keepdims=True) / n
+    chi2 = np.nansum((table - expected) ** 2 / expected)
+    return float(math.sqrt(chi2 / (n * (min(table.shape) - 1))))
+
+
+def correlations(sample):
+    """Pearson between numeric columns, Cramér's V between low-cardinality categorical columns."""
+    numeric = sample.select_dtypes(include="number")
+    pearson = numeric.corr().round(4)
+    result = {"pearson": {c: {k: (None if pd.isna(v) else float(v)) for k, v in row.items()}
+                          for c, row in pearson.to_dict().items()}}
+
+    categorical = [c for c in sample.columns
+                   if c not in numeric.columns and sample[c].nunique(dropna=True) <= MAX_CATEGORIES]
+    cramers = {}
+    for i, a in enumerate(categorical):
+        for b in categorical[i + 1:]:
+            cramers[f"{a}|{b}"] = cramers_v(sample[a], sample[b])
+    result["cramers_v"] = cramers
+    return result
+
+
+# -------------------------------------------------------------------
+# 3 — Passe de profilage
+# -------------------------------------------------------------------
+def collection_batches(db_name, collection_name, batch_size=BATCH_SIZE):
+    """Stream a collection as DataFrames (ordre naturel, sans _id)."""
+    cursor = connect_to_mongo(db_name)[collection_name].find({}, {"_id": 0}).batch_size(10_000)
+    docs = []
+    for doc in cursor:
+        docs.append(doc)
+        if len(docs) >= batch_size:
+            yield pd.DataFrame(docs)
+            docs = []
+    if docs:
+        yield pd.DataFrame(docs)
+
+
+def profile_batches(batches, source, compound_keys=SHARD_KEY_CANDIDATES):
+    """Build the profile from an iterator of DataFrames."""
+    fields, reservoir = {}, RowReservoir()
+    compounds = [CompoundProfile(k) for k in compound_keys if len(k) > 1]
+    rows = 0
+    for df in batches:
+        for column in df.columns:
+            fields.setdefault(column, FieldProfile(column)).update(df[column])
+        for compound in compounds:
+            compound.update(df)
+        reservoir.update(df)
+        rows += len(df)
+        logger.info(f"profile_batches() : {rows} rows profiled")
+
+    sample = reservoir.rows if reservoir.rows is not None else pd.DataFrame()
+    return {
+        "source": source,
+        "created_at": datetime.now().isoformat(),
+        "rows": rows,
+        "fields": {name: f.to_dict() for name, f in fields.items()},
+        "compound": {"|".join(c.fields): c.to_dict() for c in compounds},
+        "histograms": histograms(sample),
+        "correlations": correlations(sample),
+        "sample_size": len(sample),
+    }
+
+
+def profile_parquet(path, batch_size=BATCH_SIZE):
+    return profile_batches(iter_batches(path, batch_size), source=path)
+
+
+def profile_collection(db_name, collection_name, batch_size=BATCH_SIZE):
+    return profile_batches(collection_batches(db_name, collection_name, batch_size),
+                           source=f"{db_name}.{collection_name}")
+
+
+def save_profile(profile, profile_dir=PROFILE_DIR):
+    """Save a timestamped profile and refresh latest_profile.json."""
+    os.makedirs(profile_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    name = os.path.basename(profile["source"]).replace(".", "_")
+    path = os.path.join(profile_dir, f"profile_{name}_{timestamp}.json")
+    for target in (path, os.path.join(profile_dir, os.path.basename(LATEST_PROFILE))):
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=4, default=str)
+    logger.info(f"✔ Saved field profile → {path}")
+    return path
+
+
+def load_profile(path=LATEST_PROFILE):
+    """Latest saved profile, or None when no profile has been computed yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# -------------------------------------------------------------------
+# 4 — Classement des clés de sharding
+# -------------------------------------------------------------------
+def _key_stats(profile, fields):
+    if len(fields) == 1:
+        stats = profile["fields"].get(fields[0])
+        if stats is None:
+            return None
+        monotonic = max(stats["increasing_ratio"] or 0, stats["decreasing_ratio"] or 0)
+        return stats["distinct"], stats["top_share"], monotonic
+    stats = profile["compound"].get("|".join(fields))
+    if stats is None:
+        return None
+    # Une clé composée est monotone si son premier champ l'est
+    first = profile["fields"].get(fields[0], {})
+    monotonic = max(first.get("increasing_ratio") or 0, first.get("decreasing_ratio") or 0)
+    return stats["distinct"], stats["top_share"], monotonic
+
+
+def rank_shard_keys(profile, candidates=SHARD_KEY_CANDIDATES):
+    """
+    Score = log10(distinct) x (1 - part de la valeur la plus fréquente) x (1 - monotonie),
+    la monotonie étant ramenée de [0.5, 1] (ordre aléatoire -> trié) à [0, 1].
+    """
+    ranking = []
+    for fields in candidates:
+        stats = _key_stats(profile, fields)
+        if stats is None:
+            continue
+        distinct, top_share, monotonic = stats
+        monotonic_penalty = min(1.0, max(0.0, (monotonic - 0.5) * 2))
+        score = math.log10(distinct + 1) * (1 - top_share) * (1 - monotonic_penalty)
+        ranking.append({"key": list(fields), "distinct": distinct, "top_share": top_share,
+                        "monotonicity": monotonic, "score": score})
+    return sorted(ranking, key=lambda r: -r["score"])
+
+
+if __name__ == "__main__":
+    # python -m src.profiler data/raw/fhvhv_tripdata_2021-10.parquet
+    # python -m src.profiler trips_db fhvhv_trips_2021-10
+    logger.info("===== STARTING FIELD PROFILER =====")
+    if len(sys.argv) == 3:
+        profile = profile_collection(sys.argv[1], sys.argv[2])
+    else:
+        profile = profile_parquet(sys.argv[1] if len(sys.argv) > 1 else "data/raw/fhvhv_tripdata_2021-10.parquet")
+    profile["shard_key_ranking"] = rank_shard_keys(profile)
+    save_profile(profile)
+    logger.info("===== FINISHED =====")
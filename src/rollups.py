@@ -0,0 +1,182 @@
+"""
+Collections de rollup pré-agrégées
+----------------------------------
+
+Chaque pipeline du dashboard rescanne les 16M de trips. Pendant l'import,
+chaque lot est agrégé côté client puis fusionné dans trois petites collections
+par des upserts `$inc` en bulk :
+
+- <collection>_rollup_day_company : par (jour, compagnie)
+- <collection>_rollup_company     : par compagnie
+- <collection>_rollup_od          : par couple (PULocationID, DOLocationID)
+
+ROLLUP_PIPELINES lit ces collections et renvoie les mêmes colonnes que
+DASHBOARD_PIPELINES (dashboard/data/mongo_queries.py).
+"""
+
+import time
+from datetime import datetime
+from pymongo import UpdateOne
+from src.logger import logger
+from src import metrics
+
+DAY_COMPANY = "rollup_day_company"
+COMPANY = "rollup_company"
+OD_PAIR = "rollup_od"
+
+FARE_FIELDS = [
+    "base_passenger_fare",
+    "tolls",
+    "bcf",
+    "sales_tax",
+    "congestion_surcharge",
+    "airport_fee",
+    "tips",
+]
+
+
+def rollup_collection_name(collection_name, rollup):
+    return f"{collection_name}_{rollup}"
+
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+
+def _add(target, key, field, value):
+    if value is not None:
+        counters = target.setdefault(key, {})
+        counters[field] = counters.get(field, 0) + value
+
+
+def _add_measure(target, key, field, value):
+    """Sum of a measure and its own non-null count: $avg ignores the nulls, so does the rollup."""
+    if value is not None:
+        _add(target, key, f"sum_{field}", value)
+        _add(target, key, f"{field}_trips", 1)
+
+
+def _avg(field):
+    # Moyenne sur les seuls trips où le champ est renseigné (None si aucun)
+    return {"$cond": [{"$gt": [f"${field}_trips", 0]}, {"$divide": [f"$sum_{field}", f"${field}_trips"]}, None]}
+
+
+def compute_batch_rollups(docs):
+    """Aggregate one batch of flat trip documents client-side."""
+    day_company, company, od_pair = {}, {}, {}
+    for doc in docs:
+        license_num = doc.get("hvfhs_license_num")
+        miles = doc.get("trip_miles")
+        trip_time = doc.get("trip_time")
+        driver_pay = doc.get("driver_pay")
+
+        day_key = (_day(doc.get("pickup_datetime")), license_num)
+        _add(day_company, day_key, "trips", 1)
+        _add_measure(day_company, day_key, "miles", miles)
+
+        _add(company, license_num, "trips", 1)
+        _add_measure(company, license_num, "miles", miles)
+        _add_measure(company, license_num, "time", trip_time)
+        _add_measure(company, license_num, "driver_pay", driver_pay)
+        # Même sémantique que $add : un montant manquant rend le profit nul
+        fares = [doc.get(field) for field in FARE_FIELDS]
+        if driver_pay is not None and all(f is not None for f in fares):
+            _add(company, license_num, "sum_profit", sum(fares) - driver_pay)
+            _add(company, license_num, "profit_trips", 1)
+
+        _add(od_pair, (doc.get("PULocationID"), doc.get("DOLocationID")), "trips", 1)
+
+    return {
+        DAY_COMPANY: {
+            (("date", day), ("company", lic)): counters for (day, lic), counters in day_company.items()
+        },
+        COMPANY: company,
+        OD_PAIR: {
+            (("PULocationID", pu), ("DOLocationID", do)): counters for (pu, do), counters in od_pair.items()
+        },
+    }
+
+
+def _to_id(key):
+    # Les clés composées sont des tuples de paires : on les stocke en sous-document
+    if isinstance(key, tuple):
+        return dict(key)
+    return key
+
+
+def update_rollups(db, collection_name, docs):
+    """
+    Merge one batch into the rollup collections with unordered $inc upserts.
+
+    Les erreurs remontent à l'appelant : un bulk $inc partiellement appliqué ne peut
+    pas être rejoué, le lot doit faire échouer l'import (et les rollups être reconstruits).
+    """
+    start = time.perf_counter()
+    for rollup, groups in compute_batch_rollups(docs).items():
+        requests = [
+            UpdateOne({"_id": _to_id(key)}, {"$inc": counters}, upsert=True)
+            for key, counters in groups.items()
+        ]
+        if requests:
+            db[rollup_collection_name(collection_name, rollup)].bulk_write(requests, ordered=False)
+    metrics.BATCH_LATENCY.observe(time.perf_counter() - start, stage="rollup")
+
+
+def backfill_rollups(db, collection_name, batch_size=50000):
+    """Rebuild the rollups of an already imported (flat) collection."""
+    for rollup in (DAY_COMPANY, COMPANY, OD_PAIR):
+        db.drop_collection(rollup_collection_name(collection_name, rollup))
+
+    batch = []
+    for doc in db[collection_name].find({}, {"_id": 0}, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            update_rollups(db, collection_name, batch)
+            batch = []
+    if batch:
+        update_rollups(db, collection_name, batch)
+    logger.info(f"backfill_rollups() : Rollups of {collection_name} rebuilt.")
+
+
+# -------------------------------------------------------------------
+# Pipelines du dashboard sur les rollups : (rollup, pipeline)
+# -------------------------------------------------------------------
+ROLLUP_PIPELINES = {
+    "trips_per_day_by_company": (DAY_COMPANY, [
+        {"$project": {"_id": 0, "Date": "$_id.date", "Company": "$_id.company", "Trips": "$trips"}},
+        {"$sort": {"Date": 1, "Company": 1}},
+    ]),
+    "trips_distance_total_by_day": (DAY_COMPANY, [
+        {"$group": {"_id": "$_id.date", "sum_miles": {"$sum": "$sum_miles"}, "miles_trips": {"$sum": "$miles_trips"}}},
+        {"$project": {"_id": 0, "Date": "$_id", "AvgDistance": _avg("miles")}},
+        {"$sort": {"Date": 1}},
+    ]),
+    "trips_distance_time_by_company": (COMPANY, [
+        {"$project": {
+            "_id": 0,
+            "Company": "$_id",
+            "AvgDistance": _avg("miles"),
+            "AvgTime": _avg("time"),
+        }},
+        {"$sort": {"Company": 1}},
+    ]),
+    "total_profit_by_company": (COMPANY, [
+        {"$project": {
+            "total_profit": {"$ifNull": ["$sum_profit", 0]},
+            "avg_profit": _avg("profit"),
+            "trips": "$trips",
+        }},
+        {"$sort": {"total_profit": -1}},
+    ]),
+    "Average_Price_driver_company": (COMPANY, [
+        {"$project": {"AvgDriverPay": _avg("driver_pay")}},
+    ]),
+    "trips_locations": (OD_PAIR, [
+        {"$sort": {"trips": -1}},
+        {"$limit": 5000},
+        {"$project": {"_id": 0, "PULocationID": "$_id.PULocationID",
+                      "DOLocationID": "$_id.DOLocationID", "tripCount": "$trips"}},
+    ]),
+}
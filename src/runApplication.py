@@ -2,11 +2,18 @@ from src.clean_data import run_cleaning_pipeline
 from src.convert_parquet_to_json import convert_parquet_to_json
 from src.mongo_import import import_json_to_mongodb
 from src.logger import logger
+from src.metrics import start_metrics_server
+from src.concurrent_pipeline import run_concurrent_pipeline
+from src.ingest_scheduler import run_scheduler, drop_collection_with_rollups, MONTH_RE, COLLECTION_TEMPLATE
+from src.mongo_import import connect_to_mongo
+from src.stage_cache import StageCache, stage_key, CACHE_DIR
+from src.stage_report import PipelineReport, REPORT_DIR
+from src.storage_layouts import LAYOUTS
+import argparse
 import glob
+import os
+import pandas as pd
 INPUT_PATH = "data/raw/fhvhv_tripdata_2021-10.parquet"
-JSON_PATH = "data/processed/trips_.json"
-JSON_PATH_ALL = "data/processed/trips_*.json"
-JSON_FOLDER_PATH = "data/processed/"
 
 columns_to_remove =[
     'originating_base_num', 
@@ -29,20 +36,250 @@ flag_cols = [
 DB_NAME = "trips_db"
 COLLECTION_NAME = "fhvhv_trips_2021-10"
 
-def run_full_pipeline():
-    if not any(glob.glob(JSON_PATH_ALL)):
-        # Step 1: Clean the data and get a DataFrame
-        df = run_cleaning_pipeline(INPUT_PATH, columns_to_remove, columns_clean, flag_cols)
-        # Step 2: Convert the cleaned DataFrame to JSON Lines format
-        convert_parquet_to_json(df, JSON_FOLDER_PATH)
+# Layout de stockage : "flat" (un document par trip), "timeseries", "compact" ou "bucket"
+STORAGE_LAYOUT = "flat"
+
+# Maintenir les collections de rollup du dashboard pendant l'import
+MAINTAIN_ROLLUPS = False
+
+# Port de l'endpoint Prometheus /metrics (None = désactivé)
+METRICS_PORT = None
+
+# STAGED = False : les lots nettoyés sont insérés directement, sans fichier intermédiaire
+# STAGED = True  : ancien mode clean -> NDJSON -> import, chaque étape en cache dans data/cache (debug)
+STAGED = False
+DIRECT_OPTIONS = {
+    "batch_size": 100_000,
+    "queue_size": 4,
+    "clean_workers": 2,
+    "serialize_workers": 2,
+    "insert_workers": 2,
+}
+
+# ALL_MONTHS = True : ingère chaque data/raw/fhvhv_tripdata_YYYY-MM.parquet nouveau ou modifié
+# dans sa propre collection fhvhv_trips_YYYY-MM (suivi dans data/ingest_manifest.json)
+ALL_MONTHS = False
+
+STAGES = ("clean", "convert", "import")
+
+def _stage(report, name, metric_stage=None):
+    # Sans rapport, les étapes ne sont pas mesurées
+    return report.stage(name, metric_stage) if report else _NoStage()
+
+class _NoStage:
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+def _cached_stage(report, cache, name, key, build, config=None):
+    with _stage(report, name) as values:
+        path, meta, hit = cache.get_or_build(name, key, build, config)
+        if hit:
+            values.update(cached=True, rows=meta.get("rows", 0))
+        values["bytes_out"] = 0 if hit else meta["bytes"]
+    return path
+
+def run_staged_pipeline(input_path=INPUT_PATH, collection_name=COLLECTION_NAME, cache=None, until="import",
+                        db_name=DB_NAME, layout=STORAGE_LAYOUT, rollups=MAINTAIN_ROLLUPS, report=None):
+    """
+    clean -> convert -> import, each stage cached under a key derived from its input and config:
+    only the stages downstream of a change are rebuilt. `until` stops after the given stage.
+    """
+    cache = cache or StageCache(CACHE_DIR)
+
+    # Step 1: Clean the data (cleaned.parquet)
+    clean_config = {"columns_to_remove": columns_to_remove, "columns_clean": columns_clean, "flag_cols": flag_cols}
+    clean_key = stage_key("clean", cache.input_key(input_path), clean_config)
+
+    def build_clean(output_dir):
+        df = run_cleaning_pipeline(input_path, columns_to_remove, columns_clean, flag_cols)
+        df.to_parquet(os.path.join(output_dir, "cleaned.parquet"), index=False)
+        return {"rows": len(df)}
+
+    clean_dir = _cached_stage(report, cache, "clean", clean_key, build_clean, clean_config)
+    if until == "clean":
+        return clean_dir
+
+    # Step 2: Convert the cleaned DataFrame to JSON Lines format (trips_*.json)
+    convert_key = stage_key("convert", clean_key)
+
+    def build_convert(output_dir):
+        df = pd.read_parquet(os.path.join(clean_dir, "cleaned.parquet"))
+        convert_parquet_to_json(df, output_dir)
+        return {"rows": len(df)}
+
+    json_dir = _cached_stage(report, cache, "convert", convert_key, build_convert)
+    if until == "convert":
+        return json_dir
 
     # Step 3: Import the JSON Lines data into MongoDB
-    # import_json_to_mongodb(JSON_PATH, DB_NAME, COLLECTION_NAME)
-    json_files = sorted(glob.glob(JSON_PATH_ALL))
-    for json_file in json_files:
-        print(f"Importing {json_file} to MongoDB...")
-        import_json_to_mongodb(json_file, DB_NAME, COLLECTION_NAME)
+    import_config = {"db": db_name, "collection": collection_name, "layout": layout, "rollups": rollups}
+    import_key = stage_key("import", convert_key, import_config)
+    db = connect_to_mongo(db_name)
+
+    def load():
+        for json_file in sorted(glob.glob(os.path.join(json_dir, "trips_*.json"))):
+            print(f"Importing {json_file} to MongoDB...")
+            import_json_to_mongodb(json_file, db_name, collection_name, layout=layout, rollups=rollups)
+
+    with _stage(report, "import") as values:
+        if replace_collection(cache, db, "import", import_key, import_config, collection_name, rollups, load) is None:
+            values["cached"] = True
+        values["bytes_out"] = 0
+    return json_dir
+
+def replace_collection(cache, db, stage, key, config, collection_name, rollups, load):
+    """
+    Drop-or-skip shared by the staged and direct modes: skip when the cache entry of `key`
+    still matches the collection, otherwise drop it (and its rollups) and run load().
+    Returns load()'s result, or None when the import was skipped.
+
+    L'entrée de cache ne contient que son _meta.json : elle n'est valide que si la
+    collection contient toujours le nombre de documents importés.
+    """
+    imported = cache.lookup(stage, key)
+    if imported and cache.read_meta(imported)["documents"] == db[collection_name].estimated_document_count():
+        logger.info(f"replace_collection() : {collection_name} already up to date, {stage} skipped.")
+        return None
+    # Clé inchangée mais collection modifiée entre-temps : on réimporte
+    if imported:
+        os.remove(os.path.join(imported, "_meta.json"))
+
+    result = {}
+
+    def build(output_dir):
+        drop_collection_with_rollups(db, collection_name, rollups)
+        result["value"] = load()
+        return {"documents": db[collection_name].estimated_document_count()}
+
+    cache.get_or_build(stage, key, build, config)
+    return result["value"]
+
+def run_direct_pipeline(input_path=INPUT_PATH, collection_name=COLLECTION_NAME, db_name=DB_NAME,
+                        layout=STORAGE_LAYOUT, rollups=MAINTAIN_ROLLUPS, options=None, report=None, cache=None):
+    """Parquet -> MongoDB without intermediate files; replaces the collection like the staged import."""
+    cache = cache or StageCache(CACHE_DIR)
+    clean_config = {"columns_to_remove": columns_to_remove, "columns_clean": columns_clean, "flag_cols": flag_cols}
+    direct_config = {"db": db_name, "collection": collection_name, "layout": layout, "rollups": rollups}
+    direct_key = stage_key("direct", stage_key("clean", cache.input_key(input_path), clean_config), direct_config)
+    db = connect_to_mongo(db_name)
+
+    def load():
+        return run_concurrent_pipeline(input_path, db_name, collection_name, columns_to_remove, columns_clean,
+                                       flag_cols, layout=layout, rollups=rollups, **(options or DIRECT_OPTIONS))
+
+    # Les étages se chevauchent : une seule entrée "direct" dans le rapport, détail par étage en annexe
+    with _stage(report, "direct", metric_stage="read") as values:
+        result = replace_collection(cache, db, "direct", direct_key, direct_config, collection_name, rollups, load)
+        if result is None:
+            values["cached"] = True
+        else:
+            values.update(rows=result["stages"][-1]["rows"], concurrent_stages=result["stages"])
+    return result
+
+def run_all_months(db_name=DB_NAME, layout=STORAGE_LAYOUT, rollups=MAINTAIN_ROLLUPS, options=None, force=False):
+    return run_scheduler(db_name, columns_to_remove, columns_clean, flag_cols,
+                         layout=layout, rollups=rollups, options=options or DIRECT_OPTIONS, force=force)
+
+def run_full_pipeline(staged=STAGED, all_months=ALL_MONTHS):
+    if all_months:
+        run_all_months()
+    elif staged:
+        run_staged_pipeline()
+    else:
+        run_direct_pipeline()
+
+# -------------------------------------------------------------------
+# Ligne de commande
+# -------------------------------------------------------------------
+def expand_inputs(patterns):
+    """Expand input globs into a sorted list of existing Parquet files."""
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if not paths:
+        raise SystemExit(f"No input file matches {patterns}")
+    return paths
+
+def collection_for(input_path, args, n_inputs):
+    """--collection for a single input, one fhvhv_trips_YYYY-MM collection per month otherwise."""
+    if n_inputs == 1 or not MONTH_RE.search(os.path.basename(input_path)):
+        return args.collection
+    return COLLECTION_TEMPLATE.format(month=MONTH_RE.search(os.path.basename(input_path)).group(1))
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m src.runApplication",
+                                     description="FHV trips pipeline: Parquet -> cleaning -> MongoDB.")
+    parser.add_argument("command", nargs="?", default="all", choices=STAGES + ("all", "bench"),
+                        help="clean / convert / import : mode staged jusqu'à cette étape ; "
+                             "all : pipeline complet ; bench : staged vs direct")
+    parser.add_argument("-i", "--input", nargs="+", default=[INPUT_PATH], help="Parquet file(s) or glob(s)")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("-c", "--collection", default=COLLECTION_NAME,
+                        help="target collection (one fhvhv_trips_YYYY-MM per month when several inputs)")
+    parser.add_argument("--layout", default=STORAGE_LAYOUT, choices=sorted(LAYOUTS))
+    parser.add_argument("--rollups", action="store_true", default=MAINTAIN_ROLLUPS,
+                        help="maintain the dashboard rollup collections during import")
+    parser.add_argument("--staged", action="store_true", default=STAGED,
+                        help="all : clean -> NDJSON -> import with the stage cache instead of direct mode")
+    parser.add_argument("--all-months", action="store_true", default=ALL_MONTHS,
+                        help="all : ingest every new/changed month of data/raw (manifest based)")
+    parser.add_argument("--force", action="store_true",
+                        help="--all-months : also replace month collections the scheduler did not create")
+    parser.add_argument("--batch-size", type=int, default=DIRECT_OPTIONS["batch_size"])
+    parser.add_argument("--queue-size", type=int, default=DIRECT_OPTIONS["queue_size"])
+    parser.add_argument("--clean-workers", type=int, default=DIRECT_OPTIONS["clean_workers"])
+    parser.add_argument("--serialize-workers", type=int, default=DIRECT_OPTIONS["serialize_workers"])
+    parser.add_argument("--insert-workers", type=int, default=DIRECT_OPTIONS["insert_workers"])
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT)
+    parser.add_argument("--report-dir", default=REPORT_DIR)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    options = {
+        "batch_size": args.batch_size,
+        "queue_size": args.queue_size,
+        "clean_workers": args.clean_workers,
+        "serialize_workers": args.serialize_workers,
+        "insert_workers": args.insert_workers,
+    }
+
+    if args.command == "bench":
+        from src.benchmarks.pipeline_benchmark import compare_pipeline_modes
+        inputs = expand_inputs(args.input)
+        # Collections de test dérivées de --collection (une par mois si plusieurs entrées)
+        for input_path in inputs:
+            compare_pipeline_modes(input_path, args.db, collection_for(input_path, args, len(inputs)), args.layout,
+                                   args.rollups, options)
+        return
+
+    report = PipelineReport(args.command, {k: v for k, v in vars(args).items() if k != "report_dir"})
+    try:
+        if args.command == "all" and args.all_months:
+            with report.stage("all_months", metric_stage="read"):
+                run_all_months(args.db, args.layout, args.rollups, options, args.force)
+            return
+
+        inputs = expand_inputs(args.input)
+        for input_path in inputs:
+            collection_name = collection_for(input_path, args, len(inputs))
+            logger.info(f"runApplication.py : {args.command} {input_path} -> {args.db}.{collection_name}")
+            if args.command == "all" and not args.staged:
+                run_direct_pipeline(input_path, collection_name, args.db, args.layout, args.rollups, options, report,
+                                    StageCache(args.cache_dir))
+            else:
+                until = "import" if args.command == "all" else args.command
+                run_staged_pipeline(input_path, collection_name, StageCache(args.cache_dir), until,
+                                    args.db, args.layout, args.rollups, report)
+    finally:
+        report.log()
+        report.save(args.report_dir)
 
 if __name__ == "__main__":
-    run_full_pipeline()
-    logger.info(f"runApplication.py : Full pipeline from Parquet to MongoDB completed successfully!")
+    main()
+    logger.info(f"runApplication.py : Pipeline run completed successfully!")
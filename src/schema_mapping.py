@@ -0,0 +1,186 @@
+"""
+Traduction des requêtes vers un autre schéma de document
+---------------------------------------------------------
+
+Les layouts alternatifs (time-series, schéma compact, ...) renomment ou
+déplacent des champs. Ce module réécrit les filtres find, les sort/projection
+et les pipelines d'agrégation écrits pour le schéma plat d'origine afin que
+les benchmarks et le dashboard restent utilisables sans modification.
+
+`mapping` est un dict {ancien_champ: nouveau_chemin}, ex:
+{"hvfhs_license_num": "meta.license"}.
+
+`flag_bits` (optionnel) décrit les flags 0/1 regroupés dans un entier bitmask :
+{ancien_flag: (champ_bitmask, masque)}, ex: {"shared_request_flag": ("fl", 1)}.
+"""
+
+from datetime import datetime
+
+# Étapes après lesquelles les documents ne sont plus des trips :
+# les noms de champs qui suivent sont des noms de sortie, pas des champs source.
+_RESHAPING_STAGES = {"$group", "$replaceRoot", "$replaceWith", "$count",
+                     "$bucket", "$bucketAuto", "$facet", "$sortByCount"}
+
+_LOGICAL_OPERATORS = {"$and", "$or", "$nor"}
+_COMPARISON_OPERATORS = {"$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in"}
+
+
+def rename_path(path, mapping, flag_bits=None):
+    """Rename the first segment of a dotted path if it is mapped."""
+    if flag_bits and path in flag_bits:
+        return flag_bits[path][0]
+    head, dot, rest = path.partition(".")
+    if head in mapping:
+        return mapping[head] + dot + rest
+    return path
+
+
+def translate_expression(expr, mapping, flag_bits=None):
+    """Rewrite "$field" references inside an aggregation expression."""
+    if isinstance(expr, str):
+        if expr.startswith("$") and not expr.startswith("$$"):
+            if flag_bits and expr[1:] in flag_bits:
+                # Extrait le bit : 1 si positionné, sinon 0
+                field, mask = flag_bits[expr[1:]]
+                return {"$cond": [{"$gt": [{"$bitAnd": ["$" + field, mask]}, 0]}, 1, 0]}
+            return "$" + rename_path(expr[1:], mapping)
+        return expr
+    if isinstance(expr, list):
+        return [translate_expression(e, mapping, flag_bits) for e in expr]
+    if isinstance(expr, dict):
+        return {k: translate_expression(v, mapping, flag_bits) for k, v in expr.items()}
+    return expr
+
+
+def _flag_condition(value):
+    """Return True/False for a flag predicate, None if it cannot be expressed as bits."""
+    if isinstance(value, dict):
+        if set(value) == {"$eq"}:
+            value = value["$eq"]
+        elif set(value) == {"$ne"}:
+            value = 1 - value["$ne"] if value["$ne"] in (0, 1) else None
+        else:
+            return None
+    if value in (0, 1):
+        return bool(value)
+    return None
+
+
+def _flag_expression(key, value, mapping, flag_bits):
+    expr = translate_expression("$" + key, mapping, flag_bits)
+    if not isinstance(value, dict):
+        return {"$eq": [expr, value]}
+    unsupported = set(value) - _COMPARISON_OPERATORS
+    if unsupported:
+        raise ValueError(f"Unsupported operators on packed flag {key}: {sorted(unsupported)}")
+    return {"$and": [{op: [expr, v]} for op, v in value.items()]}
+
+
+def translate_filter(query, mapping, flag_bits=None):
+    """Rewrite the field names of a find / $match filter."""
+    translated = {}
+    bits = {}  # champ bitmask -> {"$bitsAllSet": masque, "$bitsAllClear": masque}
+    fallbacks = []  # prédicats $expr ajoutés au $and après la boucle (un $and utilisateur les écraserait)
+    for key, value in query.items():
+        if key in _LOGICAL_OPERATORS:
+            translated[key] = [translate_filter(q, mapping, flag_bits) for q in value]
+        elif key == "$expr":
+            translated[key] = translate_expression(value, mapping, flag_bits)
+        elif key.startswith("$"):
+            translated[key] = value
+        elif flag_bits and key in flag_bits:
+            field, mask = flag_bits[key]
+            is_set = _flag_condition(value)
+            if is_set is None:
+                # Prédicat non exprimable en bits ($in, $gt, ...) : repli sur $expr
+                fallbacks.append({"$expr": _flag_expression(key, value, mapping, flag_bits)})
+                continue
+            op = "$bitsAllSet" if is_set else "$bitsAllClear"
+            field_bits = bits.setdefault(field, {})
+            field_bits[op] = field_bits.get(op, 0) | mask
+        else:
+            translated[rename_path(key, mapping)] = value
+    translated.update(bits)
+    if fallbacks:
+        translated["$and"] = translated.get("$and", []) + fallbacks
+    return translated
+
+
+def translate_keys(spec, mapping, flag_bits=None):
+    """Rewrite the keys of a sort, projection or index specification."""
+    if spec is None:
+        return None
+    return {rename_path(k, mapping, flag_bits): v for k, v in spec.items()}
+
+
+def _translate_projection_stage(spec, mapping, flag_bits=None):
+    translated = {}
+    for key, value in spec.items():
+        # Inclusion/exclusion d'un champ source : on renomme la clé
+        if isinstance(value, (bool, int)) and not isinstance(value, float):
+            translated[rename_path(key, mapping, flag_bits)] = value
+        # Champ calculé : la clé est un nom de sortie, seule l'expression change
+        else:
+            translated[key] = translate_expression(value, mapping, flag_bits)
+    return translated
+
+
+def parse_datetime(value):
+    """Parse the ISO strings written by convert_parquet_to_json into datetime."""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value
+
+
+def parse_filter_dates(query, datetime_fields):
+    """Convert ISO string values of datetime fields in a filter into datetime."""
+    parsed = {}
+    for key, value in query.items():
+        if key in _LOGICAL_OPERATORS:
+            parsed[key] = [parse_filter_dates(q, datetime_fields) for q in value]
+        elif key in datetime_fields and isinstance(value, dict):
+            parsed[key] = {op: parse_datetime(v) for op, v in value.items()}
+        elif key in datetime_fields:
+            parsed[key] = parse_datetime(value)
+        else:
+            parsed[key] = value
+    return parsed
+
+
+def translate_pipeline(pipeline, mapping, flag_bits=None):
+    """Rewrite an aggregation pipeline written for the flat trip schema."""
+    translated = []
+    reshaped = False
+    for stage in pipeline:
+        name, spec = next(iter(stage.items()))
+        if reshaped:
+            translated.append(stage)
+            continue
+
+        if name == "$match":
+            spec = translate_filter(spec, mapping, flag_bits)
+        elif name == "$sort":
+            spec = translate_keys(spec, mapping, flag_bits)
+        elif name in ("$project", "$addFields", "$set"):
+            spec = _translate_projection_stage(spec, mapping, flag_bits)
+        elif name in ("$group", "$bucket", "$bucketAuto", "$replaceRoot",
+                      "$replaceWith", "$sortByCount", "$unwind"):
+            spec = translate_expression(spec, mapping, flag_bits)
+
+        translated.append({name: spec})
+        if name in _RESHAPING_STAGES:
+            reshaped = True
+    return translated
+
+
+def translate_candidate(candidate, mapping, flag_bits=None):
+    """Return a copy of a benchmark candidate (query, sort, projection, index) for another schema."""
+    translated = dict(candidate)
+    if "query" in candidate:
+        translated["query"] = translate_filter(candidate["query"], mapping, flag_bits)
+    if "pipeline" in candidate:
+        translated["pipeline"] = translate_pipeline(candidate["pipeline"], mapping, flag_bits)
+    for key in ("sort", "projection", "index"):
+        if candidate.get(key) is not None:
+            translated[key] = translate_keys(candidate[key], mapping, flag_bits)
+    return translated
@@ -0,0 +1,133 @@
+"""
+Sketches probabilistes en mémoire bornée
+----------------------------------------
+
+- HyperLogLog     : nombre de valeurs distinctes (erreur ~1.04 / sqrt(2^p))
+- CountMinSketch  : fréquence d'une valeur (surestimation bornée par eps * N)
+- TopK            : valeurs les plus fréquentes (candidats exacts par lot,
+                    fréquences estimées par le count-min)
+
+Les mises à jour sont vectorisées : une colonne pandas entière est hachée
+(pd.util.hash_array, 64 bits) puis agrégée avec numpy, sans boucle Python
+par valeur. 16M de trips se profilent donc en une passe.
+"""
+
+import numpy as np
+import pandas as pd
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def hash_values(values):
+    """64-bit hashes of a pandas Series / array (nulls must be removed beforehand)."""
+    if isinstance(values, pd.DataFrame):
+        return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+    array = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values)
+    if array.dtype.kind == "M":
+        return pd.util.hash_array(array.view("i8"))
+    if array.dtype.kind in "iub":
+        # Un entier et le même entier en float (lot contenant des NaN) ont le même hash
+        array = array.astype(np.float64)
+    return pd.util.hash_array(array)
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2^p one-byte registers."""
+
+    def __init__(self, p=14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update_hashes(self, hashes):
+        if not len(hashes):
+            return
+        hashes = hashes.astype(np.uint64)
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Rang = position du premier bit à 1 dans les 64-p bits restants
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, 64 - self.p + 1, 64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def update(self, values):
+        self.update_hashes(hash_values(values))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # Petites cardinalités : comptage linéaire
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """Frequency sketch: depth rows of width counters, one hash per row."""
+
+    def __init__(self, width=2 ** 16, depth=4, seed=0):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        rng = np.random.default_rng(seed)
+        # Hachage par ligne : (a * h + b) mod 2^64, puis mod width (a impair)
+        self.a = rng.integers(1, 2 ** 63, size=depth, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=depth, dtype=np.uint64)
+        self.total = 0
+
+    def _columns(self, hashes, row):
+        with np.errstate(over="ignore"):
+            mixed = (hashes * self.a[row] + self.b[row]) & _MASK64
+        return (mixed >> np.uint64(32)) % np.uint64(self.width)
+
+    def update_hashes(self, hashes, counts=None):
+        hashes = hashes.astype(np.uint64)
+        counts = np.ones(len(hashes), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        for row in range(self.depth):
+            np.add.at(self.table[row], self._columns(hashes, row).astype(np.int64), counts)
+        self.total += int(counts.sum())
+
+    def update(self, values):
+        self.update_hashes(hash_values(values))
+
+    def estimate_hashes(self, hashes):
+        hashes = hashes.astype(np.uint64)
+        rows = [self.table[row][self._columns(hashes, row).astype(np.int64)] for row in range(self.depth)]
+        return np.min(rows, axis=0)
+
+    def estimate(self, values):
+        return self.estimate_hashes(hash_values(values))
+
+
+class TopK:
+    """Heavy hitters: exact per-batch candidates, frequencies read from a count-min sketch."""
+
+    def __init__(self, k=20, candidates=1000, sketch=None):
+        self.k = k
+        self.max_candidates = candidates
+        self.sketch = sketch or CountMinSketch()
+        self.candidates = {}
+        self.dtype = None
+
+    def update(self, series):
+        self.dtype = self.dtype or series.dtype
+        counts = series.value_counts()
+        self.sketch.update_hashes(hash_values(counts.index.to_series()), counts.to_numpy())
+        for value, n in counts.head(self.k).items():
+            self.candidates[value] = self.candidates.get(value, 0) + int(n)
+        if len(self.candidates) > self.max_candidates:
+            # On ne garde que les candidats les plus fréquents : mémoire bornée
+            kept = sorted(self.candidates.items(), key=lambda item: -item[1])[: self.max_candidates // 2]
+            self.candidates = dict(kept)
+
+    def top(self):
+        if not self.candidates:
+            return []
+        values = list(self.candidates)
+        estimates = self.sketch.estimate_hashes(hash_values(pd.Series(values, dtype=self.dtype)))
+        ranked = sorted(zip(values, estimates.tolist()), key=lambda item: -item[1])
+        return ranked[: self.k]
@@ -0,0 +1,158 @@
+"""
+Cache adressé par contenu pour les étapes du pipeline
+-----------------------------------------------------
+
+La clé d'une étape est le hash de :
+- la clé de l'étape amont (ou l'empreinte sha256 du fichier d'entrée pour la première)
+- le nom de l'étape
+- sa configuration (columns_to_remove, columns_clean, flag_cols, ...)
+
+Changer le fichier Parquet ou une liste de colonnes change donc la clé de
+l'étape concernée et, par chaînage, celles de toutes les étapes en aval ;
+les étapes amont inchangées sont réutilisées.
+
+Chaque entrée est un dossier data/cache/<stage>-<clé>/ contenant les
+artefacts et un _meta.json. Le dossier est construit sous un nom temporaire
+puis renommé : une entrée présente est toujours complète. Au-delà de
+MAX_CACHE_BYTES, les entrées les moins récemment utilisées sont supprimées.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from src.logger import logger
+from src.fingerprint import fingerprint_file
+
+CACHE_DIR = "data/cache"
+MAX_CACHE_BYTES = 20 * 1024 ** 3
+META_FILE = "_meta.json"
+FINGERPRINTS_FILE = "fingerprints.json"
+
+
+def hash_config(config):
+    """Stable hash of a JSON-serializable configuration."""
+    payload = json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def stage_key(stage, upstream_key, config=None):
+    """Key of a stage = hash(stage name, upstream key, stage configuration)."""
+    return hash_config({"stage": stage, "upstream": upstream_key, "config": config or {}})
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class StageCache:
+    """Directory of content-addressed stage outputs with size-based LRU eviction."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---------------------------------------------------------------
+    # Clés
+    # ---------------------------------------------------------------
+    def input_key(self, path):
+        """sha256 of an input file, re-hashed only when its size or mtime changed."""
+        index_path = os.path.join(self.cache_dir, FINGERPRINTS_FILE)
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        absolute = os.path.abspath(path)
+        fingerprint = fingerprint_file(path, index.get(absolute))
+        index[absolute] = fingerprint
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=4)
+        return fingerprint["sha256"]
+
+    # ---------------------------------------------------------------
+    # Entrées
+    # ---------------------------------------------------------------
+    def entry_dir(self, stage, key):
+        return os.path.join(self.cache_dir, f"{stage}-{key[:16]}")
+
+    def lookup(self, stage, key):
+        """Return the entry directory if the stage output is cached, else None."""
+        path = self.entry_dir(stage, key)
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        # mtime du _meta.json = date de dernière utilisation (LRU)
+        os.utime(meta_path)
+        return path
+
+    def latest(self, stage):
+        """Most recently used entry directory of a stage, or None."""
+        candidates = [e for e in self.entries() if os.path.basename(e[2]).startswith(f"{stage}-")]
+        return max(candidates)[2] if candidates else None
+
+    def read_meta(self, path):
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def get_or_build(self, stage, key, build, config=None):
+        """
+        Return (entry_dir, meta, hit). On a miss, build(tmp_dir) writes the artifacts
+        into tmp_dir and returns a dict of extra metadata (rows, ...).
+        """
+        path = self.lookup(stage, key)
+        if path:
+            logger.info(f"StageCache : ✔ {stage} cache hit ({key[:16]})")
+            return path, self.read_meta(path), True
+
+        logger.info(f"StageCache : ▶ {stage} cache miss ({key[:16]}), building...")
+        path = self.entry_dir(stage, key)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        start = time.perf_counter()
+        try:
+            extra = build(tmp_path) or {}
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        meta = dict(extra, stage=stage, key=key, config=config, build_s=round(time.perf_counter() - start, 2),
+                    bytes=_dir_size(tmp_path))
+        with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=4, default=str)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return path, meta, False
+
+    # ---------------------------------------------------------------
+    # Éviction
+    # ---------------------------------------------------------------
+    def entries(self):
+        """[(last_used, size, path)] for every complete entry."""
+        result = []
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, META_FILE)
+            if os.path.exists(meta_path):
+                path = os.path.join(self.cache_dir, name)
+                result.append((os.path.getmtime(meta_path), _dir_size(path), path))
+        return result
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.info(f"StageCache : evicted {path} ({size / 1e6:.1f} MB)")
@@ -0,0 +1,132 @@
+"""
+Rapport par étape d'une exécution du pipeline
+---------------------------------------------
+
+Pour chaque étape : temps mur, temps CPU (tous threads du processus), lignes,
+lignes/s, octets lus/écrits (compteurs de src.metrics pour ce label de stage)
+et pic de RSS.
+
+Le pic de RSS est remis à zéro au début de chaque étape quand le noyau le
+permet (/proc/self/clear_refs) ; sinon c'est le pic depuis le début du processus.
+"""
+
+import json
+import os
+import resource
+import time
+from datetime import datetime
+from src.logger import logger
+from src import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "results", "pipeline"))
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes():
+    """Peak resident set size (VmHWM), falling back to getrusage."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss est en Ko sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _counters(stage):
+    return {
+        "rows": metrics.ROWS_PROCESSED.value(stage=stage),
+        "bytes_in": metrics.BYTES_READ.value(stage=stage),
+        "bytes_out": metrics.BYTES_WRITTEN.value(stage=stage),
+    }
+
+
+class _Stage:
+    def __init__(self, report, name, metric_stage):
+        self.report = report
+        self.name = name
+        self.metric_stage = metric_stage or name
+        # Champs qu'une étape peut renseigner elle-même (ex : lignes d'une entrée de cache)
+        self.values = {}
+
+    def __enter__(self):
+        self.peak_reset = _reset_peak_rss()
+        self.counters = _counters(self.metric_stage)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self.values
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        after = _counters(self.metric_stage)
+        entry = {k: after[k] - self.counters[k] for k in after}
+        entry.update(self.values)
+        entry.update({
+            "stage": self.name,
+            "status": "failed" if exc_type else "ok",
+            "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3),
+            # Une étape servie par le cache n'a rien traité : pas de débit
+            "rows_per_s": round(entry["rows"] / wall, 1) if wall and not entry.get("cached") else 0.0,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "peak_rss_scope": "stage" if self.peak_reset else "process",
+        })
+        self.report.stages.append(entry)
+        return False
+
+
+class PipelineReport:
+    """Collects per-stage measurements of one pipeline run."""
+
+    def __init__(self, command, options=None):
+        self.command = command
+        self.options = options or {}
+        self.started_at = datetime.now()
+        self.stages = []
+
+    def stage(self, name, metric_stage=None):
+        """Context manager measuring one stage; yields a dict for extra fields (rows, cached, ...)."""
+        return _Stage(self, name, metric_stage)
+
+    def to_dict(self):
+        return {
+            "command": self.command,
+            "started_at": self.started_at.isoformat(),
+            "options": self.options,
+            "stages": self.stages,
+        }
+
+    def log(self):
+        logger.info(f"PipelineReport : {self.command}")
+        header = f"{'stage':<18}{'wall s':>9}{'cpu s':>9}{'rows':>12}{'rows/s':>11}{'MB in':>9}{'MB out':>9}{'peak MB':>9}"
+        lines = [header]
+        for s in self.stages:
+            lines.append(
+                f"{s['stage']:<18}{s['wall_s']:>9.1f}{s['cpu_s']:>9.1f}{s['rows']:>12}{s['rows_per_s']:>11.0f}"
+                f"{s['bytes_in'] / 1e6:>9.1f}{s['bytes_out'] / 1e6:>9.1f}{s['peak_rss_bytes'] / 1e6:>9.0f}"
+                + ("  (cached)" if s.get("cached") else "") + ("  FAILED" if s["status"] == "failed" else "")
+            )
+        for line in lines:
+            logger.info(f"  {line}")
+        print("\n".join(lines))
+
+    def save(self, report_dir=REPORT_DIR):
+        os.makedirs(report_dir, exist_ok=True)
+        timestamp = self.started_at.strftime("%Y-%m-%d_%H-%M-%S")
+        path = os.path.join(report_dir, f"run_{self.command}_{timestamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=4, default=str)
+        logger.info(f"✔ Saved pipeline report → {path}")
+        return path
@@ -0,0 +1,72 @@
+"""
+Registre des layouts de stockage des trips.
+
+Chaque layout décrit :
+- prepare_collection(db, name) : création spécifique de la collection (ou None)
+- transform(docs)              : conversion d'un lot de documents plats (ou None)
+- translate_candidate(c)       : adaptation d'une requête du catalogue de benchmark
+- translate_pipeline(p)        : adaptation d'un pipeline d'agrégation
+- translate_field(name)        : nom du champ dans ce layout (distinct, index, ...)
+- write(collection, docs)      : écriture spécifique d'un lot transformé (défaut : insert_many)
+
+Pour le layout "bucket", translate_candidate renvoie un candidat avec une clé
+"pipeline" (agrégation) au lieu de "query".
+"""
+
+from src.schema_mapping import rename_path
+from src.timeseries_collection import (
+    create_timeseries_collection, to_timeseries_documents,
+    translate_candidate_for_timeseries, translate_pipeline_for_timeseries, TIMESERIES_FIELD_MAP,
+)
+from src.compact_schema import (
+    to_compact_documents, translate_candidate_for_compact, translate_pipeline_for_compact,
+    COMPACT_FIELD_MAP, COMPACT_FLAG_BITS,
+)
+from src.bucket_layout import (
+    create_bucket_collection, write_buckets, translate_candidate_for_bucket,
+    translate_pipeline_for_bucket, translate_field_for_bucket,
+)
+
+LAYOUTS = {
+    "flat": {
+        "prepare_collection": None,
+        "transform": None,
+        "translate_candidate": lambda candidate: candidate,
+        "translate_pipeline": lambda pipeline: pipeline,
+        "translate_field": lambda field: field,
+        "write": None,
+    },
+    "timeseries": {
+        "prepare_collection": create_timeseries_collection,
+        "transform": to_timeseries_documents,
+        "translate_candidate": translate_candidate_for_timeseries,
+        "translate_pipeline": translate_pipeline_for_timeseries,
+        "translate_field": lambda field: rename_path(field, TIMESERIES_FIELD_MAP),
+        "write": None,
+    },
+    "compact": {
+        "prepare_collection": None,
+        "transform": to_compact_documents,
+        "translate_candidate": translate_candidate_for_compact,
+        "translate_pipeline": translate_pipeline_for_compact,
+        "translate_field": lambda field: rename_path(field, COMPACT_FIELD_MAP, COMPACT_FLAG_BITS),
+        "write": None,
+    },
+    "bucket": {
+        "prepare_collection": create_bucket_collection,
+        # Les trips plats sont regroupés par write_buckets
+        "transform": None,
+        "translate_candidate": translate_candidate_for_bucket,
+        "translate_pipeline": translate_pipeline_for_bucket,
+        "translate_field": translate_field_for_bucket,
+        "write": write_buckets,
+    },
+}
+
+
+def get_layout(name):
+    """Return the layout description, raising a clear error for unknown names."""
+    try:
+        return LAYOUTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown storage layout '{name}'. Available: {sorted(LAYOUTS)}")
@@ -0,0 +1,442 @@
+"""
+Synthetic FHV Trip Generator
+----------------------------
+
+Génère des fichiers Parquet au schéma exact des fichiers fhvhv_tripdata_*.parquet
+pour tester le pipeline et SLOW_QUERY_CANDIDATES à l'échelle (10k à 1B lignes)
+sans télécharger les 16M de lignes réelles.
+
+- Les distributions viennent d'un résumé statistique (summarize_parquet) d'un
+  vrai fichier, ou de DEFAULT_STATS (ordres de grandeur d'octobre 2021).
+- Tout est vectorisé avec NumPy, par blocs de `chunk_size` lignes écrits
+  comme row groups : la mémoire reste bornée quel que soit le nombre de lignes.
+- Le résultat est déterministe pour une graine et un chunk_size donnés
+  (indépendamment du nombre de threads).
+
+Usage :
+    python -m src.synthetic_data --rows 1000000 --seed 42
+    python -m src.synthetic_data --summarize data/raw/fhvhv_tripdata_2021-10.parquet --stats-out data/raw/stats_2021-10.json
+"""
+
+import argparse
+import calendar
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.logger import logger
+
+N_ZONES = 265  # LocationID 1..265 (264/265 = Unknown)
+
+FHV_SCHEMA = pa.schema([
+    ("hvfhs_license_num", pa.string()),
+    ("dispatching_base_num", pa.string()),
+    ("originating_base_num", pa.string()),
+    ("request_datetime", pa.timestamp("us")),
+    ("on_scene_datetime", pa.timestamp("us")),
+    ("pickup_datetime", pa.timestamp("us")),
+    ("dropoff_datetime", pa.timestamp("us")),
+    ("PULocationID", pa.int64()),
+    ("DOLocationID", pa.int64()),
+    ("trip_miles", pa.float64()),
+    ("trip_time", pa.int64()),
+    ("base_passenger_fare", pa.float64()),
+    ("tolls", pa.float64()),
+    ("bcf", pa.float64()),
+    ("sales_tax", pa.float64()),
+    ("congestion_surcharge", pa.float64()),
+    ("airport_fee", pa.float64()),
+    ("tips", pa.float64()),
+    ("driver_pay", pa.float64()),
+    ("shared_request_flag", pa.string()),
+    ("shared_match_flag", pa.string()),
+    ("access_a_ride_flag", pa.string()),
+    ("wav_request_flag", pa.string()),
+    ("wav_match_flag", pa.string()),
+])
+
+# Montants optionnels : taux de null, taux de valeur non nulle, moyenne/écart-type si non nul
+OPTIONAL_AMOUNTS = ["tolls", "congestion_surcharge", "airport_fee", "tips"]
+# Montants proportionnels au tarif de base : ratio moyen et écart-type
+FARE_RATIOS = ["bcf", "sales_tax", "driver_pay"]
+FLAGS = ["shared_request_flag", "shared_match_flag", "access_a_ride_flag", "wav_request_flag", "wav_match_flag"]
+
+
+def _default_zone_weights():
+    # Popularité des zones en loi de Zipf, permutation fixe pour ne pas favoriser les petits IDs
+    rng = np.random.default_rng(2021)
+    weights = 1.0 / np.arange(1, N_ZONES + 1) ** 0.9
+    return weights[rng.permutation(N_ZONES)].tolist()
+
+
+DEFAULT_STATS = {
+    "month": "2021-10",
+    "licenses": {"HV0003": 0.72, "HV0005": 0.28},
+    "bases": {
+        "HV0003": {"B02764": 0.30, "B02872": 0.12, "B02875": 0.12, "B02765": 0.10, "B02869": 0.09,
+                   "B02887": 0.08, "B02871": 0.07, "B02882": 0.06, "B02800": 0.02, "B02617": 0.04},
+        "HV0005": {"B02510": 1.0},
+    },
+    # Poids du pickup (marginal) et du dropoff : la matrice OD = produit extérieur
+    "pu_weights": _default_zone_weights(),
+    "do_weights": _default_zone_weights(),
+    "od_counts": None,
+    "hour_weights": [3.5, 2.5, 1.8, 1.5, 1.6, 2.0, 3.0, 4.0, 4.5, 4.2, 4.1, 4.2,
+                     4.4, 4.5, 4.8, 5.0, 5.2, 5.5, 5.8, 5.7, 5.3, 5.2, 5.0, 4.4],
+    # log(trip_miles) ~ N(mu, sigma)
+    "log_miles": {"mu": 1.15, "sigma": 0.85},
+    # log(trip_time) = a + b * log(trip_miles) + N(0, sigma)
+    "log_time": {"a": 6.05, "b": 0.62, "sigma": 0.35},
+    # log(délai demande -> pickup en secondes) ~ N(mu, sigma)
+    "log_wait": {"mu": 5.4, "sigma": 0.7},
+    # base_passenger_fare = c0 + c_mile * miles + c_min * minutes + N(0, sigma)
+    "base_fare": {"c0": 2.8, "c_mile": 1.55, "c_min": 0.55, "sigma": 4.0, "min": 0.0},
+    "optional_amounts": {
+        "tolls": {"null_rate": 0.0, "nonzero_rate": 0.06, "mean": 7.5, "std": 3.0},
+        "congestion_surcharge": {"null_rate": 0.0, "nonzero_rate": 0.45, "mean": 2.75, "std": 0.0},
+        "airport_fee": {"null_rate": 1.0, "nonzero_rate": 0.0, "mean": 0.0, "std": 0.0},
+        "tips": {"null_rate": 0.0, "nonzero_rate": 0.12, "mean": 3.9, "std": 3.0},
+    },
+    "fare_ratios": {
+        "bcf": {"mean": 0.028, "std": 0.004},
+        "sales_tax": {"mean": 0.0887, "std": 0.003},
+        "driver_pay": {"mean": 0.76, "std": 0.15},
+    },
+    "flag_rates": {
+        "shared_request_flag": 0.012,
+        "shared_match_flag": 0.004,
+        "access_a_ride_flag": 0.0,
+        "wav_request_flag": 0.001,
+        "wav_match_flag": 0.06,
+    },
+}
+
+
+# -------------------------------------------------------------------
+# 1 — Résumé statistique d'un vrai fichier Parquet
+# -------------------------------------------------------------------
+def summarize_parquet(path, batch_size=1_000_000):
+    """Stream a real fhvhv Parquet file and return generator statistics."""
+    parquet_file = pq.ParquetFile(path)
+    od = np.zeros((N_ZONES + 1, N_ZONES + 1), dtype=np.int64)
+    hours = np.zeros(24, dtype=np.int64)
+    licenses, bases = {}, {}
+    flags = {f: 0 for f in FLAGS}
+    amounts = {c: {"null": 0, "nonzero": 0, "sum": 0.0, "sumsq": 0.0} for c in OPTIONAL_AMOUNTS}
+    ratios = {c: {"n": 0, "sum": 0.0, "sumsq": 0.0} for c in FARE_RATIOS}
+    # Sommes pour les moindres carrés (log_time ~ log_miles, fare ~ miles + minutes)
+    lm = {"n": 0, "x": 0.0, "xx": 0.0, "y": 0.0, "yy": 0.0, "xy": 0.0}
+    wait = {"n": 0, "sum": 0.0, "sumsq": 0.0}
+    xtx, xty, fare_sq = np.zeros((3, 3)), np.zeros(3), 0.0
+    total = 0
+    month = None
+
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        df = batch.to_pandas()
+        total += len(df)
+        pu = df["PULocationID"].to_numpy(dtype=np.int64)
+        do = df["DOLocationID"].to_numpy(dtype=np.int64)
+        np.add.at(od, (np.clip(pu, 0, N_ZONES), np.clip(do, 0, N_ZONES)), 1)
+
+        pickup = df["pickup_datetime"]
+        hours += np.bincount(pickup.dt.hour.to_numpy(), minlength=24)
+        if month is None:
+            month = pickup.iloc[len(pickup) // 2].strftime("%Y-%m")
+
+        for lic, count in df["hvfhs_license_num"].value_counts().items():
+            licenses[lic] = licenses.get(lic, 0) + int(count)
+        for (lic, base), count in df.groupby(["hvfhs_license_num", "dispatching_base_num"]).size().items():
+            bases.setdefault(lic, {})
+            bases[lic][base] = bases[lic].get(base, 0) + int(count)
+
+        for flag in FLAGS:
+            flags[flag] += int((df[flag] == "Y").sum())
+
+        miles = df["trip_miles"].to_numpy(dtype=float)
+        trip_time = df["trip_time"].to_numpy(dtype=float)
+        ok = (miles > 0) & (trip_time > 0)
+        x, y = np.log(miles[ok]), np.log(trip_time[ok])
+        lm["n"] += len(x)
+        lm["x"] += x.sum()
+        lm["xx"] += (x * x).sum()
+        lm["y"] += y.sum()
+        lm["yy"] += (y * y).sum()
+        lm["xy"] += (x * y).sum()
+
+        waits = (pickup - df["request_datetime"]).dt.total_seconds().to_numpy()
+        waits = np.log(waits[waits > 0])
+        wait["n"] += len(waits)
+        wait["sum"] += waits.sum()
+        wait["sumsq"] += (waits * waits).sum()
+
+        fare = df["base_passenger_fare"].to_numpy(dtype=float)
+        design = np.column_stack([np.ones(len(fare)), miles, trip_time / 60])
+        valid = ~np.isnan(fare)
+        xtx += design[valid].T @ design[valid]
+        xty += design[valid].T @ fare[valid]
+        fare_sq += (fare[valid] ** 2).sum()
+
+        for col in OPTIONAL_AMOUNTS:
+            values = df[col].to_numpy(dtype=float)
+            nulls = np.isnan(values)
+            nonzero = values[~nulls & (values != 0)]
+            amounts[col]["null"] += int(nulls.sum())
+            amounts[col]["nonzero"] += len(nonzero)
+            amounts[col]["sum"] += nonzero.sum()
+            amounts[col]["sumsq"] += (nonzero * nonzero).sum()
+
+        positive = fare > 0
+        for col in FARE_RATIOS:
+            r = df[col].to_numpy(dtype=float)[positive] / fare[positive]
+            r = r[~np.isnan(r)]
+            ratios[col]["n"] += len(r)
+            ratios[col]["sum"] += r.sum()
+            ratios[col]["sumsq"] += (r * r).sum()
+
+    def mean_std(n, s, sq):
+        if not n:
+            return 0.0, 0.0
+        mean = s / n
+        return float(mean), float(np.sqrt(max(sq / n - mean * mean, 0.0)))
+
+    b = (lm["n"] * lm["xy"] - lm["x"] * lm["y"]) / (lm["n"] * lm["xx"] - lm["x"] ** 2)
+    a = (lm["y"] - b * lm["x"]) / lm["n"]
+    resid = (lm["yy"] - 2 * a * lm["y"] - 2 * b * lm["xy"] + lm["n"] * a * a
+             + 2 * a * b * lm["x"] + b * b * lm["xx"]) / lm["n"]
+    miles_mu, miles_sigma = mean_std(lm["n"], lm["x"], lm["xx"])
+    wait_mu, wait_sigma = mean_std(wait["n"], wait["sum"], wait["sumsq"])
+    coef = np.linalg.solve(xtx, xty)
+    fare_resid = (fare_sq - coef @ xty) / xtx[0, 0]
+
+    stats = {
+        "month": month,
+        "rows": total,
+        "licenses": {k: v / total for k, v in licenses.items()},
+        "bases": {lic: {b_: c / sum(d.values()) for b_, c in d.items()} for lic, d in bases.items()},
+        "pu_weights": od[1:, 1:].sum(axis=1).tolist(),
+        "do_weights": od[1:, 1:].sum(axis=0).tolist(),
+        "od_counts": od[1:, 1:].tolist(),
+        "hour_weights": hours.tolist(),
+        "log_miles": {"mu": miles_mu, "sigma": miles_sigma},
+        "log_time": {"a": float(a), "b": float(b), "sigma": float(np.sqrt(max(resid, 0.0)))},
+        "log_wait": {"mu": wait_mu, "sigma": wait_sigma},
+        "base_fare": {"c0": float(coef[0]), "c_mile": float(coef[1]), "c_min": float(coef[2]),
+                      "sigma": float(np.sqrt(max(fare_resid, 0.0))), "min": 0.0},
+        "optional_amounts": {},
+        "fare_ratios": {},
+        "flag_rates": {f: c / total for f, c in flags.items()},
+    }
+    for col, acc in amounts.items():
+        mean, std = mean_std(acc["nonzero"], acc["sum"], acc["sumsq"])
+        non_null = total - acc["null"]
+        stats["optional_amounts"][col] = {
+            "null_rate": acc["null"] / total,
+            "nonzero_rate": acc["nonzero"] / non_null if non_null else 0.0,
+            "mean": mean,
+            "std": std,
+        }
+    for col, acc in ratios.items():
+        mean, std = mean_std(acc["n"], acc["sum"], acc["sumsq"])
+        stats["fare_ratios"][col] = {"mean": mean, "std": std}
+
+    logger.info(f"summarize_parquet() : Summarized {total} rows of {path}")
+    return stats
+
+
+# -------------------------------------------------------------------
+# 2 — Génération vectorisée
+# -------------------------------------------------------------------
+def _cumulative(weights):
+    w = np.asarray(weights, dtype=float).ravel()
+    cdf = np.cumsum(w)
+    return cdf / cdf[-1]
+
+
+def _choice(rng, cdf, n):
+    # Équivalent vectorisé de rng.choice(p=...) avec une CDF précalculée
+    return np.searchsorted(cdf, rng.random(n), side="right")
+
+
+class _Sampler:
+    """Pre-computed CDFs and dictionaries for one set of statistics."""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.licenses = list(stats["licenses"])
+        self.license_cdf = _cumulative(list(stats["licenses"].values()))
+
+        self.bases = sorted({b for d in stats["bases"].values() for b in d})
+        base_index = {b: i for i, b in enumerate(self.bases)}
+        self.base_cdfs, self.base_ids = [], []
+        for lic in self.licenses:
+            lic_bases = stats["bases"].get(lic) or {"B00000": 1.0}
+            for b in lic_bases:
+                if b not in base_index:
+                    base_index[b] = len(self.bases)
+                    self.bases.append(b)
+            self.base_ids.append(np.array([base_index[b] for b in lic_bases]))
+            self.base_cdfs.append(_cumulative(list(lic_bases.values())))
+
+        if stats.get("od_counts"):
+            joint = np.asarray(stats["od_counts"], dtype=float)
+        else:
+            joint = np.outer(stats["pu_weights"], stats["do_weights"])
+        self.od_cdf = _cumulative(joint)
+        self.hour_cdf = _cumulative(stats["hour_weights"])
+
+        self.base_strings = pa.array(self.bases, type=pa.string())
+        self.license_strings = pa.array(self.licenses, type=pa.string())
+        self.yes_no = pa.array(["N", "Y"], type=pa.string())
+
+
+def _month_bounds(month):
+    year, mon = (int(p) for p in month.split("-"))
+    start = np.datetime64(f"{year:04d}-{mon:02d}-01T00:00:00", "us")
+    return start, calendar.monthrange(year, mon)[1]
+
+
+def generate_chunk(sampler, n, rng):
+    """Generate one pyarrow Table of n synthetic trips."""
+    s = sampler.stats
+
+    lic_idx = _choice(rng, sampler.license_cdf, n)
+    base_idx = np.empty(n, dtype=np.int64)
+    for i, cdf in enumerate(sampler.base_cdfs):
+        mask = lic_idx == i
+        base_idx[mask] = sampler.base_ids[i][_choice(rng, cdf, int(mask.sum()))]
+
+    od = _choice(rng, sampler.od_cdf, n)
+    pu, do = od // N_ZONES + 1, od % N_ZONES + 1
+
+    # Horodatages : jour uniforme, heure selon le profil horaire, secondes uniformes
+    start, n_days = _month_bounds(s["month"])
+    day = rng.integers(0, n_days, n)
+    hour = _choice(rng, sampler.hour_cdf, n)
+    offset_us = ((day * 24 + hour) * 3600 + rng.integers(0, 3600, n)) * 1_000_000
+    pickup = start.astype(np.int64) + offset_us
+
+    miles = np.round(np.exp(rng.normal(s["log_miles"]["mu"], s["log_miles"]["sigma"], n)), 2)
+    lt = s["log_time"]
+    trip_time = np.maximum(
+        np.exp(lt["a"] + lt["b"] * np.log(np.maximum(miles, 0.01)) + rng.normal(0, lt["sigma"], n)), 1
+    ).astype(np.int64)
+    wait_s = np.exp(rng.normal(s["log_wait"]["mu"], s["log_wait"]["sigma"], n)).astype(np.int64)
+    request = pickup - wait_s * 1_000_000
+    dropoff = pickup + trip_time * 1_000_000
+    # on_scene : chauffeur sur place avant le pickup, renseigné seulement pour HV0003
+    on_scene = pickup - (rng.random(n) * np.minimum(wait_s, 300) * 1_000_000).astype(np.int64)
+    on_scene_null = np.array([lic != "HV0003" for lic in sampler.licenses])[lic_idx]
+
+    bf = s["base_fare"]
+    fare = bf["c0"] + bf["c_mile"] * miles + bf["c_min"] * trip_time / 60 + rng.normal(0, bf["sigma"], n)
+    fare = np.round(np.maximum(fare, bf["min"]), 2)
+
+    columns = {
+        "hvfhs_license_num": sampler.license_strings.take(pa.array(lic_idx)),
+        "dispatching_base_num": sampler.base_strings.take(pa.array(base_idx)),
+        # Indices nuls -> valeurs nulles (HV0005 n'a pas de base d'origine)
+        "originating_base_num": sampler.base_strings.take(pa.array(base_idx, mask=on_scene_null)),
+        "request_datetime": pa.array(request, type=pa.timestamp("us")),
+        "on_scene_datetime": pa.array(on_scene, mask=on_scene_null, type=pa.timestamp("us")),
+        "pickup_datetime": pa.array(pickup, type=pa.timestamp("us")),
+        "dropoff_datetime": pa.array(dropoff, type=pa.timestamp("us")),
+        "PULocationID": pa.array(pu, type=pa.int64()),
+        "DOLocationID": pa.array(do, type=pa.int64()),
+        "trip_miles": pa.array(miles),
+        "trip_time": pa.array(trip_time),
+        "base_passenger_fare": pa.array(fare),
+    }
+
+    for col in OPTIONAL_AMOUNTS:
+        p = s["optional_amounts"][col]
+        values = np.where(rng.random(n) < p["nonzero_rate"],
+                          np.round(np.maximum(rng.normal(p["mean"], p["std"], n), 0), 2), 0.0)
+        columns[col] = pa.array(values, mask=rng.random(n) < p["null_rate"])
+
+    for col in FARE_RATIOS:
+        r = s["fare_ratios"][col]
+        columns[col] = pa.array(np.round(fare * np.maximum(rng.normal(r["mean"], r["std"], n), 0), 2))
+
+    for flag in FLAGS:
+        columns[flag] = sampler.yes_no.take(pa.array((rng.random(n) < s["flag_rates"][flag]).astype(np.int8)))
+
+    return pa.Table.from_pydict({name: columns[name] for name in FHV_SCHEMA.names}, schema=FHV_SCHEMA)
+
+
+def _generate_seeded_chunk(sampler, n, seed, chunk_index):
+    # Une graine par bloc : reproductible quel que soit l'ordre d'exécution des threads
+    rng = np.random.default_rng(np.random.SeedSequence([seed, chunk_index]))
+    return generate_chunk(sampler, n, rng)
+
+
+def generate_parquet(output_path, rows, seed=0, stats=None, chunk_size=1_000_000,
+                     schema_from=None, workers=None):
+    """Write `rows` synthetic trips to output_path and return the throughput.
+
+    Les blocs sont générés par un pool de threads (NumPy et Arrow relâchent le GIL)
+    et écrits dans l'ordre : au plus 2 * workers blocs sont en mémoire.
+    """
+    stats = stats or DEFAULT_STATS
+    sampler = _Sampler(stats)
+    schema = pq.read_schema(schema_from) if schema_from else FHV_SCHEMA
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    sizes = [min(chunk_size, rows - start) for start in range(0, rows, chunk_size)]
+    start = time.perf_counter()
+    written = 0
+    with pq.ParquetWriter(output_path, schema) as writer, ThreadPoolExecutor(workers) as pool:
+        pending = deque()
+
+        def write_next():
+            nonlocal written
+            table = pending.popleft().result()
+            writer.write_table(table.cast(schema) if schema_from else table)
+            written += table.num_rows
+            logger.info(f"generate_parquet() : {written}/{rows} rows written to {output_path}")
+
+        for chunk_index, n in enumerate(sizes):
+            pending.append(pool.submit(_generate_seeded_chunk, sampler, n, seed, chunk_index))
+            if len(pending) >= 2 * workers:
+                write_next()
+        while pending:
+            write_next()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"generate_parquet() : {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    return {"rows": rows, "seconds": elapsed, "rows_per_second": rows / elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic fhvhv_tripdata Parquet generator")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="number of trips (10k to 1B)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, help="generator threads (default: CPU count)")
+    parser.add_argument("--stats", help="JSON statistics produced by --summarize")
+    parser.add_argument("--summarize", help="real fhvhv Parquet file to summarize")
+    parser.add_argument("--stats-out", help="where to save the statistics of --summarize")
+    parser.add_argument("--schema-from", help="copy the exact Arrow schema of a real Parquet file")
+    parser.add_argument("--output", help="output Parquet path")
+    args = parser.parse_args()
+
+    stats = None
+    if args.summarize:
+        stats = summarize_parquet(args.summarize)
+        if args.stats_out:
+            with open(args.stats_out, "w", encoding="utf-8") as f:
+                json.dump(stats, f)
+            logger.info(f"✔ Statistics saved → {args.stats_out}")
+    elif args.stats:
+        with open(args.stats, encoding="utf-8") as f:
+            stats = json.load(f)
+
+    if not args.summarize or args.output:
+        month = (stats or DEFAULT_STATS)["month"]
+        output = args.output or f"data/raw/synthetic/fhvhv_tripdata_{month}.parquet"
+        generate_parquet(output, args.rows, seed=args.seed, stats=stats,
+                         chunk_size=args.chunk_size, schema_from=args.schema_from, workers=args.workers)
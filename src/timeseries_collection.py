@@ -0,0 +1,76 @@
+"""
+Stockage des trips dans une collection time-series MongoDB
+-----------------------------------------------------------
+
+- timeField : pickup_datetime (doit être un vrai BSON date)
+- metaField : meta = {license, PULocationID}
+
+MongoDB regroupe en interne les mesures qui partagent le même meta dans des
+buckets compressés, ce qui réduit fortement le stockage et accélère les
+agrégations par jour.
+"""
+
+from pymongo.errors import CollectionInvalid
+from src.logger import logger
+from src.schema_mapping import translate_candidate, translate_pipeline, parse_datetime, parse_filter_dates
+
+TIME_FIELD = "pickup_datetime"
+META_FIELD = "meta"
+
+# Champs du schéma plat déplacés dans le metaField
+TIMESERIES_FIELD_MAP = {
+    "hvfhs_license_num": f"{META_FIELD}.license",
+    "PULocationID": f"{META_FIELD}.PULocationID",
+}
+
+DATETIME_FIELDS = [
+    "request_datetime",
+    "pickup_datetime",
+    "dropoff_datetime",
+]
+
+
+def create_timeseries_collection(db, collection_name, granularity="minutes"):
+    """Create the time-series collection if it does not exist yet."""
+    try:
+        db.create_collection(
+            collection_name,
+            timeseries={
+                "timeField": TIME_FIELD,
+                "metaField": META_FIELD,
+                "granularity": granularity,
+            },
+        )
+        logger.info(f"create_timeseries_collection() : Created time-series collection {collection_name}")
+    except CollectionInvalid:
+        logger.info(f"create_timeseries_collection() : Collection {collection_name} already exists.")
+    return db[collection_name]
+
+
+def to_timeseries_documents(docs):
+    """Move license / PULocationID into the metaField and parse datetime fields."""
+    out = []
+    for doc in docs:
+        doc = dict(doc)
+        for field in DATETIME_FIELDS:
+            if doc.get(field) is not None:
+                doc[field] = parse_datetime(doc[field])
+        doc[META_FIELD] = {
+            "license": doc.pop("hvfhs_license_num", None),
+            "PULocationID": doc.pop("PULocationID", None),
+        }
+        out.append(doc)
+    return out
+
+
+def translate_candidate_for_timeseries(candidate):
+    """Adapt a SLOW_QUERY_CANDIDATES entry to the time-series layout."""
+    translated = translate_candidate(candidate, TIMESERIES_FIELD_MAP)
+    if "query" in translated:
+        translated["query"] = parse_filter_dates(translated["query"], DATETIME_FIELDS)
+    return translated
+
+
+def translate_pipeline_for_timeseries(pipeline):
+    """Adapt a dashboard aggregation pipeline to the time-series layout."""
+    return translate_pipeline(pipeline, TIMESERIES_FIELD_MAP)